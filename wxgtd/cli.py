@@ -94,6 +94,8 @@ def _parse_opt():
 	group = optparse.OptionGroup(optp, "Options")
 	group.add_option('--sync', action="store_true", dest="sync",
 			help='sync data on startup and exit')
+	group.add_option('--restore-backup', dest="restore_backup",
+			help='restore database from backup file and exit')
 	optp.add_option_group(group)
 
 	group = optparse.OptionGroup(optp, "Debug options")
@@ -106,7 +108,7 @@ def _parse_opt():
 	optp.add_option_group(group)
 	options, args = optp.parse_args()
 	if not any((options.quick_task_title, options.query_group >= 0,
-			options.sync, options.shell)):
+			options.sync, options.shell, options.restore_backup)):
 		optp.print_help()
 		exit(0)
 	return options, args
@@ -137,8 +139,12 @@ def run():
 	# database
 	from wxgtd.model import db
 	db_filename = db.find_db_file(config)
+	if options.restore_backup:
+		_restore_backup(options.restore_backup, db_filename, options.debug_sql)
+		exit(0)
 	# connect to databse
-	db.connect(db_filename, options.debug_sql)
+	db.connect(db_filename, options.debug_sql,
+			config.get('database', 'profile'))
 
 	if options.sync:
 		_sync(config, True)
@@ -199,6 +205,24 @@ def _sync(config, load_only):
 		sync.sync(last_sync_file, load_only, notify_cb=_log_sync_cb)
 
 
+def _restore_backup(filename, db_filename, debug_sql):
+	from wxgtd.model import db
+	from wxgtd.model import sync
+	if sync.is_snapshot_backup(filename):
+		try:
+			sync.restore_snapshot(filename, db_filename)
+		except sync.BackupError as err:
+			print >> sys.stderr, err
+			exit(1)
+		# upgrade schema & check indexes
+		db.connect(db_filename, debug_sql)
+	else:
+		from wxgtd.model import loader
+		db.connect(db_filename, debug_sql)
+		loader.load_from_file(filename, _log_sync_cb, force=True)
+	print >> sys.stderr, "Restored"
+
+
 def _shell():
 	# starting interactive shell
 	from IPython.terminal import ipapp
@@ -21,6 +21,7 @@ import wx.lib.dialogs
 from wxgtd.lib.appconfig import AppConfig
 from wxgtd.wxtools import wxresources
 from wxgtd.wxtools import iconprovider
+from wxgtd.wxtools.scheduler import RefreshScheduler
 
 _ = gettext.gettext
 _LOG = logging.getLogger(__name__)
@@ -111,6 +112,8 @@ class BaseFrame(object):
 		appconfig = self._appconfig
 		appconfig.set(self._window_name, 'size', self.wnd.GetSizeTuple())
 		appconfig.set(self._window_name, 'position', self.wnd.GetPositionTuple())
+		# skip refreshes requested for closed window
+		RefreshScheduler().cancel(self)
 		self.wnd.Destroy()
 
 
@@ -20,6 +20,7 @@ import wx.gizmos
 from wx.lib.mixins import treemixin
 
 from wxgtd.wxtools.wxpub import publisher
+from wxgtd.wxtools.scheduler import RefreshScheduler
 from wxgtd.model import objects as OBJ
 from wxgtd.model import enums
 from wxgtd.lib import appconfig
@@ -195,8 +196,8 @@ class FilterTreeCtrl(treemixin.VirtualTree, treemixin.ExpansionState,
 				id=self._menu_show_only_id)
 		self.Bind(wx.EVT_MENU, self._on_menu_show_except,
 				id=self._menu_show_except_id)
-		publisher.subscribe(self._reload_items, ('dict', 'update'))
-		publisher.subscribe(self._reload_items, ('dict', 'delete'))
+		publisher.subscribe(self._on_dict_update, ('dict', 'update'))
+		publisher.subscribe(self._on_dict_update, ('dict', 'delete'))
 		wx.CallAfter(self.refresh)
 
 	@property
@@ -252,10 +253,13 @@ class FilterTreeCtrl(treemixin.VirtualTree, treemixin.ExpansionState,
 		tags = self._model.checked_items_by_parent("TAGS")
 		appcfg.set('last_filter', 'tags', ','.join(map(str, tags)))
 
-	def _reload_items(self, *_args):
+	def _on_dict_update(self, *_args):
+		RefreshScheduler().request(self, self._reload_items)
+
+	def _reload_items(self, _items=None):
 		self.save_last_settings()
 		self._model.load()
-		wx.CallAfter(self.refresh)
+		self.refresh()
 
 	def _on_right_up(self, evt):
 		item = self.GetSelection()
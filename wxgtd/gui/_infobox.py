@@ -58,7 +58,7 @@ def draw_info(mdc, task, overdue, cache):
 
 	Args:
 		mdc: DC canvas
-		task: task to render
+		task: task to render (TaskListItem)
 		overdue: is task overdue
 	"""
 	main_icon_y_offset = (SETTINGS['line_height'] - 32) / 2
@@ -102,8 +102,8 @@ def _draw_info_task_status(mdc, cache, task, x_off, y_off):
 
 def _draw_info_task_context(mdc, cache, task, x_off, y_off):
 	task_context = cache.get('task_context')
-	if task_context is None and task.context:
-		task_context = task.context.title
+	if task_context is None and task.context_title:
+		task_context = task.context_title
 		if not task_context.startswith('@'):
 			task_context = '@' + task_context
 		cache['task_context'] = task_context
@@ -116,13 +116,8 @@ def _draw_info_task_context(mdc, cache, task, x_off, y_off):
 
 def _draw_info_task_parent(mdc, cache, task, x_off, y_off):
 	task_parent = cache.get('task_parent')
-	if task_parent is None and task.parent:
-		task_parents = []
-		while task.parent:
-			task_parents.insert(0, task.parent.title)
-			task = task.parent
-		task_parent = '/'.join(task_parents)
-		cache['task_parent'] = task_parent
+	if task_parent is None and task.parent_path:
+		cache['task_parent'] = task_parent = task.parent_path
 		cache['task_parent_x_off'] = mdc.GetTextExtent(task_parent)[0] + 10
 	if task_parent:
 		mdc.DrawBitmap(iconprovider.get_image('project_small'), x_off,
@@ -135,8 +130,8 @@ def _draw_info_task_parent(mdc, cache, task, x_off, y_off):
 
 def _draw_info_task_goal(mdc, cache, task, x_off, y_off):
 	task_goal = cache.get('task_goal')
-	if task_goal is None and task.goal:
-		cache['task_goal'] = task_goal = task.goal.title
+	if task_goal is None and task.goal_title:
+		cache['task_goal'] = task_goal = task.goal_title
 		cache['task_goal_x_off'] = mdc.GetTextExtent(task_goal)[0] + 10
 	if task_goal:
 		mdc.DrawBitmap(iconprovider.get_image('goal_small'), x_off,
@@ -149,8 +144,8 @@ def _draw_info_task_goal(mdc, cache, task, x_off, y_off):
 
 def _draw_info_task_folder(mdc, cache, task, x_off, y_off):
 	task_folder = cache.get('task_folder')
-	if task_folder is None and task.folder:
-		cache['task_folder'] = task_folder = task.folder.title
+	if task_folder is None and task.folder_title:
+		cache['task_folder'] = task_folder = task.folder_title
 		cache['task_folder_x_off'] = mdc.GetTextExtent(task_folder)[0] + 10
 	if task_folder:
 		mdc.DrawBitmap(iconprovider.get_image('folder_small'), x_off,
@@ -164,8 +159,7 @@ def _draw_info_task_folder(mdc, cache, task, x_off, y_off):
 def _draw_info_task_tags(mdc, cache, task, x_off, y_off):
 	task_tags = cache.get('task_tags')
 	if task_tags is None and task.tags:
-		cache['task_tags'] = task_tags = ",".join(
-				tag.title for tag in task.tags)
+		cache['task_tags'] = task_tags = ",".join(task.tags)
 	if task_tags:
 		mdc.DrawBitmap(iconprovider.get_image('tag_small'), x_off,
 				y_off, False)
@@ -191,7 +185,7 @@ def draw_icons(mdc, task, overdue, active_only, cache):
 
 	Args:
 		mdc: DC canvas
-		task: task to render
+		task: task to render (TaskListItem)
 		overdue: is task overdue
 		active_only: showing information only active subtask.
 	"""
@@ -200,18 +194,13 @@ def draw_icons(mdc, task, overdue, active_only, cache):
 	if task.starred:
 		mdc.DrawBitmap(iconprovider.get_image('starred_small'), 0, 7, False)
 
-	child_count = cache.get('child_count')
-	if child_count is None:
-		child_count = task.active_child_count if active_only else \
-				task.child_count
-		cache['child_count'] = child_count
+	child_count = task.active_child_count if active_only else task.child_count
 	if child_count > 0:
 		info = cache.get('info')
 		if info is None:
 			info = ''
-			overdue = cache.get('overdue')
-			if overdue > 0:
-				info += "%d / " % overdue
+			if task.child_overdue > 0:
+				info += "%d / " % task.child_overdue
 			info += "%d" % child_count
 			cache['info'] = info
 		mdc.DrawText(info, 16, 7)
@@ -221,7 +210,7 @@ def draw_icons(mdc, task, overdue, active_only, cache):
 	if task.repeat_pattern and task.repeat_pattern != 'Norepeat':
 		mdc.DrawBitmap(iconprovider.get_image('repeat_small'), 16, y_off,
 				False)
-	if task.note:
+	if task.has_note:
 		mdc.DrawBitmap(iconprovider.get_image('note_small'), 32, y_off,
 				False)
 
@@ -238,6 +227,7 @@ class TaskInfoPanel(wx.Panel):
 		self.Bind(wx.EVT_PAINT, self._on_paint)
 
 	def set_task(self, task):
+		""" Set task to show (TaskListItem or None). """
 		self.task = task
 		self._values_cache.clear()
 
@@ -264,6 +254,7 @@ class TaskIconsPanel(wx.Panel):
 		self.Bind(wx.EVT_PAINT, self._on_paint)
 
 	def set_task(self, task):
+		""" Set task to show (TaskListItem or None). """
 		self.task = task
 		self._values_cache.clear()
 
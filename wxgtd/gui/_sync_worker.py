@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+""" Running synchronisation in background thread.
+
+Copyright (c) Karol Będkowski, 2013
+
+This file is part of wxGTD
+Licence: GPLv2+
+"""
+
+__author__ = "Karol Będkowski"
+__copyright__ = "Copyright (c) Karol Będkowski, 2013"
+__version__ = "2013-06-02"
+
+import logging
+import threading
+
+import wx
+
+from wxgtd.model import objects as OBJ
+from wxgtd.model import sync
+from wxgtd.model import dbsync
+
+_LOG = logging.getLogger(__name__)
+
+
+class SyncWorker(object):
+	""" Run synchronisation in background thread.
+
+	Sync use own sessions; while running other threads can't flush changes
+	(objects.SyncRunningError is raised; see objects.WRITE_LOCK).
+	Callbacks are called in gui thread.
+
+	Args:
+		progress_cb: function called with (progress, message)
+		finish_cb: function called after sync with exception or None when
+			sync finished successfully.
+	"""
+
+	def __init__(self, progress_cb, finish_cb):
+		self._progress_cb = progress_cb
+		self._finish_cb = finish_cb
+		self._cancelled = threading.Event()
+		self._thread = None
+
+	@property
+	def running(self):
+		return self._thread is not None and self._thread.is_alive()
+
+	def start(self, use_dropbox, sync_file, load_only):
+		""" Start synchronisation.
+
+		Args:
+			use_dropbox: sync via dropbox api
+			sync_file: path to sync file (when not use dropbox)
+			load_only: only load data
+		"""
+		self._cancelled.clear()
+		self._thread = threading.Thread(target=self._run,
+				args=(use_dropbox, sync_file, load_only), name="sync")
+		self._thread.start()
+
+	def cancel(self):
+		""" Request cancel; sync is interrupted on next progress update. """
+		_LOG.info("SyncWorker.cancel")
+		self._cancelled.set()
+
+	def wait(self):
+		""" Wait for sync finish; process gui events in meantime. """
+		while self.running:
+			self._thread.join(0.1)
+			wx.YieldIfNeeded()
+		# deliver pending callbacks
+		wx.YieldIfNeeded()
+
+	def _notify(self, progress, msg):
+		if self._cancelled.is_set():
+			raise sync.SyncCancelledError()
+		wx.CallAfter(self._progress_cb, progress, msg)
+
+	def _run(self, use_dropbox, sync_file, load_only):
+		error = None
+		try:
+			with OBJ.WRITE_LOCK:
+				if use_dropbox:
+					dbsync.sync(load_only=load_only, notify_cb=self._notify)
+				else:
+					sync.sync(sync_file, load_only=load_only,
+							notify_cb=self._notify)
+		except Exception as err:  # pylint: disable=W0703
+			error = err
+		wx.CallAfter(self._finish_cb, error)
@@ -15,6 +15,7 @@ __version__ = "2011-03-29"
 import sys
 import gettext
 import logging
+from collections import OrderedDict
 
 import wx
 import wx.lib.newevent
@@ -22,9 +23,13 @@ from wx.lib.agw import ultimatelistctrl as ULC
 import wx.lib.mixins.listctrl as listmix
 
 from wxgtd.model import enums
+from wxgtd.model import objects as OBJ
+from wxgtd.model import tasklist
 from wxgtd.lib import fmt
+from wxgtd.lib.appconfig import AppConfig
 from wxgtd.gui import _infobox as infobox
 from wxgtd.wxtools import iconprovider
+from wxgtd.wxtools.wxpub import publisher
 
 _ = gettext.gettext
 _LOG = logging.getLogger(__name__)
@@ -58,13 +63,9 @@ class _ListItemRenderer(object):
 		self._values_cache = {}
 
 	def DrawSubItem(self, dc, rect, _line, _highlighted, _enabled):
-		canvas = wx.EmptyBitmap(rect.width, rect.height)
-		mdc = wx.MemoryDC()
-		mdc.SelectObject(canvas)
-		mdc.Clear()
-		infobox.draw_info(mdc, self._task, self._overdue,
-				cache=self._values_cache)
-		dc.Blit(rect.x + 3, rect.y, rect.width - 6, rect.height, mdc, 0, 0)
+		_draw_cached(dc, rect, _info_key(self._task, self._overdue),
+				self._task.uuid, lambda mdc: infobox.draw_info(mdc,
+					self._task, self._overdue, cache=self._values_cache))
 
 	def GetLineHeight(self):  # pylint: disable=R0201
 		return infobox.SETTINGS['line_height']
@@ -80,6 +81,7 @@ class _ListItemRendererIcons(object):
 		parent: parent windows (TaskListControl)
 		task: task to disiplay
 		overdue: task or any child of it are overdue.
+		active_only: show/count only active subtasks.
 
 	+-----------+-----------------------+------+---------------+
 	| completed | title                 | due  | star, type    |
@@ -94,13 +96,10 @@ class _ListItemRendererIcons(object):
 		self._values_cache = {}
 
 	def DrawSubItem(self, dc, rect, _line, _highlighted, _enabled):
-		canvas = wx.EmptyBitmap(rect.width, rect.height)
-		mdc = wx.MemoryDC()
-		mdc.SelectObject(canvas)
-		mdc.Clear()
-		infobox.draw_icons(mdc, self._task, self._overdue, self._active_only,
-				self._values_cache)
-		dc.Blit(rect.x + 3, rect.y, rect.width - 6, rect.height, mdc, 0, 0)
+		_draw_cached(dc, rect, _icons_key(self._task, self._overdue,
+				self._active_only), self._task.uuid,
+				lambda mdc: infobox.draw_icons(mdc, self._task, self._overdue,
+					self._active_only, self._values_cache))
 
 	def GetLineHeight(self):  # pylint: disable=R0201
 		return infobox.SETTINGS['line_height']
@@ -113,13 +112,15 @@ class TaskListControl(ULC.UltimateListCtrl, listmix.ColumnSorterMixin):
 	""" TaskList Control based on wxListCtrl. """
 	# pylint: disable=R0901
 
+	_ROW_HEIGHT_STYLE = ULC.ULC_HAS_VARIABLE_ROW_HEIGHT
+
 	def __init__(self, parent, wid=wx.ID_ANY,  # pylint: disable=R0913
 			pos=wx.DefaultPosition, size=wx.DefaultSize, style=0, agwStyle=0,
 			buttons=0):
 		# configure infobox
 		infobox.configure()
 		agwStyle = agwStyle | wx.LC_REPORT | wx.BORDER_SUNKEN | wx.LC_HRULES \
-				| ULC.ULC_HAS_VARIABLE_ROW_HEIGHT
+				| self._ROW_HEIGHT_STYLE
 		ULC.UltimateListCtrl.__init__(self, parent, wid, pos, size, style,
 				agwStyle)
 		listmix.ColumnSorterMixin.__init__(self, 4)
@@ -162,7 +163,7 @@ class TaskListControl(ULC.UltimateListCtrl, listmix.ColumnSorterMixin):
 			idx = self.selected
 			if idx < 0:
 				return None
-		return self._items[self.GetItemData(idx)][0]
+		return self._get_item_info(idx)[0]
 
 	def get_item_type(self, idx):
 		""" Get given or selected (when idx is None) task type. """
@@ -170,7 +171,7 @@ class TaskListControl(ULC.UltimateListCtrl, listmix.ColumnSorterMixin):
 			idx = self.selected
 			if idx < 0:
 				return None
-		return self._items[self.GetItemData(idx)][1]
+		return self._get_item_info(idx)[1]
 
 	def get_selected_items_type(self):
 		""" Get selected tasks type. """
@@ -179,7 +180,7 @@ class TaskListControl(ULC.UltimateListCtrl, listmix.ColumnSorterMixin):
 			idx = self.GetNextItem(idx, wx.LIST_NEXT_ALL, wx.LIST_STATE_SELECTED)
 			if idx < 0:
 				break
-			yield self._items[self.GetItemData(idx)][1]
+			yield self._get_item_info(idx)[1]
 
 	def get_selected_items_uuid(self):
 		""" Get selected tasks uuid. """
@@ -188,13 +189,13 @@ class TaskListControl(ULC.UltimateListCtrl, listmix.ColumnSorterMixin):
 			idx = self.GetNextItem(idx, wx.LIST_NEXT_ALL, wx.LIST_STATE_SELECTED)
 			if idx < 0:
 				break
-			yield self._items[self.GetItemData(idx)][0]
+			yield self._get_item_info(idx)[0]
 
 	def fill(self, tasks, active_only=False):
 		""" Fill the list with tasks.
 
 		Args:
-			task: list of tasks
+			tasks: list of tasks (TaskListItem; see model.tasklist)
 			active_only: boolean - show/count only active tasks.
 		"""
 		# pylint: disable=R0915
@@ -215,24 +216,18 @@ class TaskListControl(ULC.UltimateListCtrl, listmix.ColumnSorterMixin):
 				3: self._icons.get_image_index('prio3')}
 		index = -1
 		for task in tasks:
-			child_count = task.active_child_count if active_only else \
-					task.child_count
+			child_count = (task.active_child_count if active_only
+					else task.child_count)
 			if active_only and child_count == 0 and task.completed:
 				continue
-			task_is_overdue = task.overdue or (child_count > 0 and task.child_overdue)
+			task_is_overdue = task.overdue or (child_count > 0 and
+					task.child_overdue > 0)
 			icon = icon_completed if task.completed else prio_icon[task.priority]
 			index = self.InsertImageStringItem(sys.maxint, "", icon)
 			self.SetStringItem(index, 1, "")
 			self.SetItemCustomRenderer(index, 1, _ListItemRenderer(self,
 				task, task_is_overdue))
-			if task.type == enums.TYPE_CHECKLIST_ITEM:
-				self.SetStringItem(index, 2, str(task.importance + 1))
-			elif task.type == enums.TYPE_PROJECT:
-				self.SetStringItem(index, 2, fmt.format_timestamp(task.due_date_project,
-						False).replace(' ', '\n'))
-			else:
-				self.SetStringItem(index, 2, fmt.format_timestamp(task.due_date,
-						task.due_time_set).replace(' ', '\n'))
+			self.SetStringItem(index, 2, _format_task_due(task))
 			self.SetItemCustomRenderer(index, 3, _ListItemRendererIcons(self,
 				task, task_is_overdue, active_only))
 			self.SetItemData(index, index)
@@ -264,6 +259,10 @@ class TaskListControl(ULC.UltimateListCtrl, listmix.ColumnSorterMixin):
 		self.Thaw()
 		self.Update()
 
+	def _get_item_info(self, idx):
+		""" Get (uuid, type) of task showed in row `idx`. """
+		return self._items[self.GetItemData(idx)]
+
 	def _setup_columns(self):
 		info = ULC.UltimateListItem()
 		info.SetMask(wx.LIST_MASK_TEXT | wx.LIST_MASK_FORMAT)
@@ -322,7 +321,7 @@ class TaskListControl(ULC.UltimateListCtrl, listmix.ColumnSorterMixin):
 	def _on_begin_drag(self, evt):
 		self._drag_item_start = None
 		item_index = evt.GetIndex()
-		_item_uuid, item_type = self._items[item_index]
+		_item_uuid, item_type = self._get_item_info(item_index)
 		if item_type != enums.TYPE_CHECKLIST_ITEM:
 			return  # veto don't work
 		else:
@@ -337,6 +336,445 @@ class TaskListControl(ULC.UltimateListCtrl, listmix.ColumnSorterMixin):
 		self._drag_item_start = None
 
 
+class _VirtualItemRenderer(object):
+	""" Renderer for custom columns of VirtualTaskListControl.
+
+	Args:
+		parent: VirtualTaskListControl
+		draw_func: function(mdc, row) drawing given row on DC
+		key_func: function(row) returning key for bitmap cache
+		width: column width
+	"""
+
+	def __init__(self, parent, draw_func, key_func, width):
+		self._parent = parent
+		self._draw_func = draw_func
+		self._key_func = key_func
+		self._width = width
+
+	def DrawSubItem(self, dc, rect, line, _highlighted, _enabled):
+		row = self._parent.get_row(line)
+		if row is None:
+			return
+		_draw_cached(dc, rect, self._key_func(row), row.task.uuid,
+				lambda mdc: self._draw_func(mdc, row))
+
+	def GetLineHeight(self):  # pylint: disable=R0201
+		return infobox.SETTINGS['line_height']
+
+	def GetSubItemWidth(self):
+		return self._width
+
+
+class _VirtualRow(object):
+	""" Data of one row materialised by VirtualTaskListControl. """
+	# pylint: disable=R0903
+
+	__slots__ = ('task', 'overdue', 'info_cache', 'icons_cache')
+
+	def __init__(self, task, active_only):
+		self.task = task
+		child_count = (task.active_child_count if active_only
+				else task.child_count)
+		self.overdue = task.overdue or (child_count > 0 and
+				task.child_overdue > 0)
+		self.info_cache = {}
+		self.icons_cache = {}
+
+
+class VirtualTaskListControl(TaskListControl):
+	""" Task list working in virtual mode.
+
+	On load only uuids and sort keys of all tasks are read; full rows are
+	loaded in windows (visible rows + margin) when control needs them.
+	Selection and scroll position are kept when list is reloaded.
+	"""
+	# pylint: disable=R0901, R0904
+
+	# all rows have the same height; variable height is not supported in
+	# virtual mode
+	_ROW_HEIGHT_STYLE = ULC.ULC_USER_ROW_HEIGHT
+	# number of rows loaded before and after visible rows
+	PREFETCH_MARGIN = 50
+	# max number of materialised rows kept in memory
+	CACHE_LIMIT = 1000
+
+	def __init__(self, parent, wid=wx.ID_ANY,  # pylint: disable=R0913
+			pos=wx.DefaultPosition, size=wx.DefaultSize, style=0,
+			agwStyle=0):
+		TaskListControl.__init__(self, parent, wid, pos, size, style,
+				agwStyle | ULC.ULC_VIRTUAL)
+		self.SetUserLineHeight(infobox.SETTINGS['line_height'])
+		self._session = None
+		self._active_only = False
+		self._keys = []  # list of (uuid, type, sort info)
+		self._rows = {}  # uuid -> _VirtualRow
+		self._renderers = {
+				1: _VirtualItemRenderer(self, self._draw_info,
+					lambda row: _info_key(row.task, row.overdue), 500),
+				3: _VirtualItemRenderer(self, self._draw_icons,
+					lambda row: _icons_key(row.task, row.overdue,
+						self._active_only), 72)}
+		self._icon_completed = self._icons.get_image_index('task_done')
+		self._prio_icon = dict((prio, self._icons.get_image_index(
+				'prio%d' % prio)) for prio in (-1, 0, 1, 2, 3))
+		self.Bind(ULC.EVT_LIST_CACHE_HINT, self._on_cache_hint)
+
+	@property
+	def items(self):
+		""" Get items showed in control.
+
+		Returns:
+			List of (task.uuid, task.type) for each row.
+		"""
+		return [key[:2] for key in self._keys]
+
+	def load(self, query, session, active_only=False):
+		""" Load tasks selected by query.
+
+		Args:
+			query: sqlalchemy query for Task objects
+			session: sqlalchemy session used for loading rows
+			active_only: boolean - show/count only active tasks.
+		"""
+		self.set_keys(load_keys(query), session, active_only)
+
+	def set_keys(self, keys, session, active_only=False):
+		""" Show tasks loaded by `load_keys`.
+
+		Args:
+			keys: result of `load_keys`
+			session: sqlalchemy session used for loading rows
+			active_only: boolean - show/count only active tasks.
+		"""
+		top_uuid = self._get_key_uuid(self.GetTopItem())
+		selected = set(self.get_selected_items_uuid())
+		self._session = session
+		self._active_only = active_only
+		self._rows.clear()
+		self._drag_item_start = None
+		self._keys = keys
+		_LOG.debug('VirtualTaskListControl.load: %d items', len(self._keys))
+		self.Freeze()
+		self._mainWin.HideWindows()
+		self.SetItemCount(len(self._keys))
+		self._mainWin.HighlightAll(False)
+		sort_col, sort_asc = self.GetSortState()
+		if sort_col == -1:
+			sort_col, sort_asc = 2, 1
+		self.SortListItems(sort_col, sort_asc)
+		self._restore_position(top_uuid, selected)
+		self.Thaw()
+		self.Refresh()
+
+	def update_tasks(self, query, uuids):
+		""" Update rows for given tasks only.
+
+		Tasks matching query are added or updated; other are removed from
+		list.  Rows of parents and descendants of given tasks are also
+		reloaded.
+
+		Args:
+			query: sqlalchemy query for Task objects (the same as used in
+				`load`)
+			uuids: list of changed tasks uuid
+		"""
+		uuids = set(uuids)
+		top_uuid = self._get_key_uuid(self.GetTopItem())
+		selected = set(self.get_selected_items_uuid())
+		# invalidate changed tasks, its old and new parents and descendants
+		# (parent path)
+		to_reload = tasklist.find_affected_uuids(uuids, self._session)
+		for uuid in uuids:
+			row = self._rows.get(uuid)
+			if row and row.task.parent_uuid:
+				to_reload.add(row.task.parent_uuid)
+		new_keys = []
+		uuids_list = list(uuids)
+		for idx in xrange(0, len(uuids_list), OBJ.MAX_IN_VALUES):
+			chunk = uuids_list[idx:idx + OBJ.MAX_IN_VALUES]
+			new_keys.extend(load_keys(query.filter(OBJ.Task.uuid.in_(chunk))))
+		_LOG.debug('VirtualTaskListControl.update_tasks(%r): %d in list',
+				uuids, len(new_keys))
+		for uuid in to_reload:
+			self._rows.pop(uuid, None)
+		self._keys = [key for key in self._keys if key[0] not in uuids]
+		self._keys.extend(new_keys)
+		self.Freeze()
+		self.SetItemCount(len(self._keys))
+		self._sort_keys()
+		self._restore_position(top_uuid, selected)
+		self.Thaw()
+		self.Refresh()
+
+	def clear(self):
+		""" Remove all items. """
+		self._keys = []
+		self._rows.clear()
+		self._drag_item_start = None
+		self._mainWin.HideWindows()
+		self.SetItemCount(0)
+		self.Refresh()
+
+	def get_row(self, idx):
+		""" Get _VirtualRow for row `idx`; load it when necessary. """
+		if idx < 0 or idx >= len(self._keys):
+			return None
+		row = self._rows.get(self._keys[idx][0])
+		if row is None:
+			self._load_rows(idx - self.PREFETCH_MARGIN,
+					idx + self.PREFETCH_MARGIN)
+			row = self._rows.get(self._keys[idx][0])
+		return row
+
+	def OnGetItemText(self, item, col):
+		if col == 2:
+			row = self.get_row(item)
+			if row:
+				return _format_task_due(row.task)
+		return ""
+
+	def OnGetItemToolTip(self, _item, _col):  # pylint: disable=R0201
+		return None
+
+	def OnGetItemTextColour(self, item, _col):
+		row = self.get_row(item)
+		return wx.RED if row and row.overdue else None
+
+	def OnGetItemColumnImage(self, item, column=0):
+		if column != 0:
+			return []
+		row = self.get_row(item)
+		if not row:
+			return []
+		task = row.task
+		if task.completed:
+			return [self._icon_completed]
+		return [self._prio_icon[task.priority]]
+
+	def OnGetItemAttr(self, _item):
+		# ULC don't ask for renderers in virtual mode - set it on the line
+		# used to draw all rows.
+		line_items = self._mainWin.GetDummyLine()._items  # pylint: disable=W0212
+		for col, renderer in self._renderers.iteritems():
+			if line_items[col].GetCustomRenderer() is not renderer:
+				line_items[col].SetCustomRenderer(renderer)
+		return None
+
+	def SortItems(self, _sorter=None):
+		""" Sort items by current sort column (used by ColumnSorterMixin). """
+		selected = set(self.get_selected_items_uuid())
+		self._sort_keys()
+		self._restore_position(None, selected)
+		self.Refresh()
+
+	def _sort_keys(self):
+		col, ascending = self.GetSortState()
+		if col >= 0:
+			self._keys.sort(key=lambda key: key[2][col], reverse=not ascending)
+
+	def _get_item_info(self, idx):
+		return self._keys[idx][:2]
+
+	def _get_key_uuid(self, idx):
+		if 0 <= idx < len(self._keys):
+			return self._keys[idx][0]
+		return None
+
+	def _restore_position(self, top_uuid, selected):
+		""" Select rows with given uuids and scroll to `top_uuid` row (or
+		first selected row when top_uuid is not given). """
+		self._mainWin.HighlightAll(False)
+		new_top = first_selected = None
+		for idx, key in enumerate(self._keys):
+			if key[0] in selected:
+				self.Select(idx)
+				if first_selected is None:
+					first_selected = idx
+			if key[0] == top_uuid:
+				new_top = idx
+		if new_top is not None:
+			self.ScrollList(0, (new_top - self.GetTopItem()) *
+					infobox.SETTINGS['line_height'])
+		elif first_selected is not None:
+			self.EnsureVisible(first_selected)
+
+	def _load_rows(self, idx_from, idx_to):
+		""" Materialise rows in given range. """
+		idx_from = max(idx_from, 0)
+		idx_to = min(idx_to, len(self._keys) - 1)
+		uuids = [key[0] for key in self._keys[idx_from:idx_to + 1]
+				if key[0] not in self._rows]
+		if not uuids:
+			return
+		if len(self._rows) + len(uuids) > self.CACHE_LIMIT:
+			self._rows.clear()
+			uuids = [key[0] for key in self._keys[idx_from:idx_to + 1]]
+		_LOG.debug('VirtualTaskListControl._load_rows(%d, %d): %d tasks',
+				idx_from, idx_to, len(uuids))
+		for task in tasklist.load_items_by_uuids(uuids, self._session):
+			self._rows[task.uuid] = _VirtualRow(task, self._active_only)
+
+	def _on_cache_hint(self, evt):
+		self._load_rows(evt.GetCacheFrom() - self.PREFETCH_MARGIN,
+				evt.GetCacheTo() + self.PREFETCH_MARGIN)
+
+	def _draw_info(self, mdc, row):
+		infobox.draw_info(mdc, row.task, row.overdue, row.info_cache)
+
+	def _draw_icons(self, mdc, row):
+		infobox.draw_icons(mdc, row.task, row.overdue, self._active_only,
+				row.icons_cache)
+
+
+class _BitmapCache(object):
+	""" LRU cache for rendered list cells.
+
+	Args:
+		max_size: max size of all cached bitmaps in bytes
+	"""
+
+	def __init__(self, max_size):
+		self._max_size = max_size
+		self._size = 0
+		self._bitmaps = OrderedDict()  # key -> (task uuid, bitmap, size)
+		self._keys_by_uuid = {}
+		publisher.subscribe(self._on_tasks_update, ('task', 'update'))
+		publisher.subscribe(self._on_tasks_update, ('task', 'delete'))
+		publisher.subscribe(self._on_dict_update, ('dict', 'update'))
+
+	def get(self, key):
+		""" Get bitmap for key; return None if not found. """
+		entry = self._bitmaps.pop(key, None)
+		if entry is None:
+			return None
+		self._bitmaps[key] = entry  # move to end
+		return entry[1]
+
+	def put(self, key, task_uuid, bitmap):
+		""" Add bitmap to cache; remove least recently used when cache is
+		full. """
+		self._remove(key)
+		size = bitmap.GetWidth() * bitmap.GetHeight() * 4
+		if size > self._max_size:
+			return
+		self._bitmaps[key] = (task_uuid, bitmap, size)
+		self._keys_by_uuid.setdefault(task_uuid, set()).add(key)
+		self._size += size
+		while self._size > self._max_size:
+			self._remove(next(iter(self._bitmaps)))
+
+	def invalidate(self, task_uuid=None):
+		""" Remove bitmaps for given task or all (when task_uuid is None). """
+		if task_uuid is None:
+			self._bitmaps.clear()
+			self._keys_by_uuid.clear()
+			self._size = 0
+			return
+		for key in list(self._keys_by_uuid.get(task_uuid, ())):
+			self._remove(key)
+
+	def _remove(self, key):
+		entry = self._bitmaps.pop(key, None)
+		if entry is None:
+			return
+		task_uuid, _bitmap, size = entry
+		self._size -= size
+		keys = self._keys_by_uuid.get(task_uuid)
+		if keys is not None:
+			keys.discard(key)
+			if not keys:
+				del self._keys_by_uuid[task_uuid]
+
+	def _on_tasks_update(self, args):
+		data = args.data
+		self.invalidate(data.get('task_uuid') if data else None)
+
+	def _on_dict_update(self, _args):
+		self.invalidate()
+
+
+_BITMAP_CACHE = []
+
+
+def _get_bitmap_cache():
+	if not _BITMAP_CACHE:
+		size = AppConfig().get('gui', 'tasklist_cache_size', 16)
+		_LOG.debug('_get_bitmap_cache: size=%rMB', size)
+		_BITMAP_CACHE.append(_BitmapCache(size * 1024 * 1024))
+	return _BITMAP_CACHE[0]
+
+
+def _theme_key():
+	return (wx.SystemSettings.GetColour(wx.SYS_COLOUR_WINDOW).Get(),
+			wx.SystemSettings.GetColour(wx.SYS_COLOUR_WINDOWTEXT).Get())
+
+
+def _info_key(task, overdue):
+	""" Key for cached "info" cell; contains all values showed in cell. """
+	return ('info', task.uuid, task.modified, task.title, task.type,
+			bool(task.completed), overdue, task.status, task.context_title,
+			task.parent_path, task.goal_title, task.folder_title,
+			tuple(task.tags))
+
+
+def _icons_key(task, overdue, active_only):
+	""" Key for cached "icons" cell; contains all values showed in cell. """
+	return ('icons', task.uuid, task.modified, overdue, active_only,
+			task.starred, task.child_count, task.active_child_count,
+			task.child_overdue, bool(task.alarm), task.repeat_pattern,
+			task.has_note)
+
+
+def _draw_cached(dc, rect, key, task_uuid, draw_func):
+	""" Draw cell using cached bitmap; render and cache it when
+	not found. """
+	width, height = rect.width - 6, rect.height
+	if width <= 0 or height <= 0:
+		return
+	key = key + (width, height, _theme_key())
+	cache = _get_bitmap_cache()
+	bitmap = cache.get(key)
+	if bitmap is None:
+		bitmap = wx.EmptyBitmap(width, height)
+		mdc = wx.MemoryDC()
+		mdc.SelectObject(bitmap)
+		mdc.Clear()
+		draw_func(mdc)
+		mdc.SelectObject(wx.NullBitmap)
+		cache.put(key, task_uuid, bitmap)
+	dc.DrawBitmap(bitmap, rect.x + 3, rect.y, False)
+
+
+def load_keys(query):
+	""" Load uuid, type and sort info for tasks selected by query.
+
+	Result contains only plain values, so it may be loaded in other thread
+	and passed to `VirtualTaskListControl.set_keys`.
+	"""
+	query = query.with_entities(OBJ.Task.uuid, OBJ.Task.type,
+			OBJ.Task.title, OBJ.Task.priority, OBJ.Task.importance,
+			OBJ.Task.starred, OBJ.Task.due_date)
+	return [make_key(row) for row in query]
+
+
+def make_key(row):
+	""" Build key for `VirtualTaskListControl.set_keys` from row containing
+	uuid, type, title, priority, importance, starred and due_date. """
+	return (row.uuid, row.type, tuple(_get_sort_info_for_task(row)))
+
+
+def _format_task_due(task):
+	""" Format text for "due" column. """
+	if task.type == enums.TYPE_CHECKLIST_ITEM:
+		return str(task.importance + 1)
+	if task.type == enums.TYPE_PROJECT:
+		return fmt.format_timestamp(task.due_date_project,
+				False).replace(' ', '\n')
+	return fmt.format_timestamp(task.due_date,
+			task.due_time_set).replace(' ', '\n')
+
+
 def _get_sort_info_for_task(task):
 	""" Wartośći sortowań kolejnych kolumn dla danego zadania """
 	due = tuple(task.due_date.timetuple()) if task.due_date else (9999, )
@@ -18,6 +18,7 @@ import wx
 
 from wxgtd.model import objects as OBJ
 from wxgtd.model import enums
+from wxgtd.model import hierarchy
 from wxgtd.wxtools import iconprovider
 
 from ._base_dialog import BaseDialog
@@ -74,17 +75,15 @@ class DlgProjectTree(BaseDialog):
 		icon_project_idx = self._icons.get_image_index('project_small')
 		icon_checklist_idx = self._icons.get_image_index('checklist_small')
 
-		def add_item(root, task):
-			child = tc_tree.AppendItem(root, task.title)
-			tc_tree.SetPyData(child, task.uuid)
-			icon = (icon_project_idx if task.type == enums.TYPE_PROJECT
+		tree_items = {None: tree_root}
+		for uuid, parent_uuid, title, task_type in hierarchy.projects_tree(
+				self._session):
+			child = tc_tree.AppendItem(tree_items[parent_uuid], title)
+			tc_tree.SetPyData(child, uuid)
+			icon = (icon_project_idx if task_type == enums.TYPE_PROJECT
 					else icon_checklist_idx)
 			tc_tree.SetItemImage(child, icon, wx.TreeItemIcon_Normal)
 			tc_tree.SetItemImage(child, icon, wx.TreeItemIcon_Expanded)
-			for subtask in task.sub_project_or_checklists:
-				add_item(child, subtask)
-
-		for obj in OBJ.Task.root_projects_checklists(self._session):
-			add_item(tree_root, obj)
+			tree_items[uuid] = child
 
 		tc_tree.ExpandAll()
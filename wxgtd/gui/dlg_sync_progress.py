@@ -12,6 +12,7 @@ __copyright__ = "Copyright (c) Karol Będkowski, 2013"
 __version__ = "2013-04-28"
 
 import logging
+import gettext
 
 import wx
 from wxgtd.wxtools.wxpub import publisher
@@ -19,6 +20,7 @@ from wxgtd.wxtools.wxpub import publisher
 from ._base_dialog import BaseDialog
 
 _LOG = logging.getLogger(__name__)
+_ = gettext.gettext
 
 
 class DlgSyncProggress(BaseDialog):
@@ -30,6 +32,7 @@ class DlgSyncProggress(BaseDialog):
 	def __init__(self, parent):
 		self._g_progress = None
 		self._tc_progress = None
+		self._cancel_handler = None
 		BaseDialog.__init__(self, parent, 'dlg_sync_progress', save_pos=False)
 		self._setup()
 
@@ -44,7 +47,7 @@ class DlgSyncProggress(BaseDialog):
 		self._g_progress.SetValue(max(min(int(progress), 100), 0))
 		self._tc_progress.AppendText(msg + '\n')
 		self._wnd.Update()
-		wx.Yield()
+		wx.YieldIfNeeded()
 
 	def mark_finished(self, autoclose=-1):
 		""" Set progress finished.
@@ -53,12 +56,21 @@ class DlgSyncProggress(BaseDialog):
 			autoclose: if > 0 dialog will be closed after given second.
 		"""
 		self._g_progress.SetValue(100)
+		self._cancel_handler = None
+		self[wx.ID_CLOSE].SetLabel(_("Close"))
 		self[wx.ID_CLOSE].Enable(True)
 		if autoclose == 0:
 			self._wnd.Close()
 		elif autoclose > 0:
 			wx.CallLater(autoclose * 1000, self._wnd.Close)
 
+	def set_cancel_handler(self, handler):
+		""" Enable cancelling; `handler` is called when user press Cancel.
+		"""
+		self._cancel_handler = handler
+		self[wx.ID_CLOSE].SetLabel(_("Cancel"))
+		self[wx.ID_CLOSE].Enable(True)
+
 	def run(self, *_args, **_kwargs):
 		self._wnd.Show()
 		wx.Yield()
@@ -74,3 +86,23 @@ class DlgSyncProggress(BaseDialog):
 
 	def _on_update_message(self, args):
 		self.update(*args.data)
+
+	def _on_cancel(self, evt):
+		if self._cancel_handler:
+			self._cancel()
+			return
+		BaseDialog._on_cancel(self, evt)
+
+	def _on_close(self, evt):
+		if self._cancel_handler:
+			# can't close window while sync is running
+			self._cancel()
+			if evt.CanVeto():
+				evt.Veto()
+				return
+		BaseDialog._on_close(self, evt)
+
+	def _cancel(self):
+		self[wx.ID_CLOSE].Enable(False)
+		self._tc_progress.AppendText(_("Cancelling...") + '\n')
+		self._cancel_handler()
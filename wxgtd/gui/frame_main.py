@@ -14,6 +14,7 @@ __version__ = "2013-04-28"
 import os
 import gettext
 import logging
+import datetime
 
 import wx
 import wx.lib.customtreectrl as CT
@@ -21,6 +22,8 @@ import wx.lib.dialogs
 
 from wxgtd.wxtools import iconprovider
 from wxgtd.wxtools.wxpub import publisher
+from wxgtd.wxtools.scheduler import RefreshScheduler
+from wxgtd.wxtools.worker import BackgroundWorker
 from wxgtd.model import objects as OBJ
 from wxgtd.model import loader
 from wxgtd.model import exporter
@@ -28,7 +31,10 @@ from wxgtd.model import sync
 from wxgtd.model import enums
 from wxgtd.model import queries
 from wxgtd.model import dbsync
+from wxgtd.model import counter
+from wxgtd.model import tasklist
 from wxgtd.logic import task as task_logic
+from wxgtd.logic import alarms
 from wxgtd.lib import fmt
 from wxgtd.gui import dlg_about
 from wxgtd.gui import _infobox as infobox
@@ -40,6 +46,7 @@ from wxgtd.gui._filtertreectrl import FilterTreeCtrl
 from wxgtd.gui._taskbaricon import TaskBarIcon
 from wxgtd.gui.dlg_preferences import DlgPreferences
 from wxgtd.gui.dlg_sync_progress import DlgSyncProggress
+from wxgtd.gui._sync_worker import SyncWorker
 from wxgtd.gui.dlg_tags import DlgTags
 from wxgtd.gui.dlg_goals import DlgGoals
 from wxgtd.gui.dlg_folders import DlgFolders
@@ -54,6 +61,32 @@ _ = gettext.gettext
 ngettext = gettext.ngettext  # pylint: disable=C0103
 _LOG = logging.getLogger(__name__)
 
+# max number of changed tasks updated without reloading whole list
+_MAX_DELTA_UPDATE = 50
+# max time between alarms timer wakeups [s] (timer may be late after system
+# suspend)
+_MAX_ALARM_TIMER_DELAY = 3600
+# interval of showing not acknowledged alarms [s]
+_DUE_ALARMS_INTERVAL = 30
+
+
+def _load_list_data(params, groups_params):
+	""" Load tasks list and groups counters; called in background thread.
+
+	Use own session; return only plain data.
+
+	Returns:
+		(list keys, params, groups counters)
+	"""
+	session = OBJ.Session()
+	try:
+		tasks = OBJ.Task.select_by_filters(params, session=session)
+		keys = TLC.load_keys(tasks)
+		counts = counter.count_tasks(groups_params, session=session)
+	finally:
+		session.close()
+	return keys, params, counts
+
 
 class FrameMain(BaseFrame):
 	""" Main window class. """
@@ -73,14 +106,20 @@ class FrameMain(BaseFrame):
 		self._session = OBJ.Session()
 		self._items_path = []
 		self._last_reminders_check = None
+		self._sync_worker = None
+		self._sync_disabler = None
 		self._filter_tree_ctrl.RefreshItems()
 		self._tbicon = TaskBarIcon(self.wnd)  # pylint: disable=W0201
 		self['rb_show_selection'].SetSelection(self._appconfig.get('main',
 			'selected_group', 0))
 		if self._appconfig.get('sync', 'sync_on_startup'):
 			wx.CallAfter(self._autosync)
+		self._alarms = alarms.AlarmQueue()
+		self._alarms.load(self._session)
 		self._reminders_timer = wx.Timer(self.wnd)
-		self._reminders_timer.Start(30 * 1000)  # 30 sec
+		self._start_reminders_timer()
+		self._list_worker = BackgroundWorker('tasklist',
+				self._on_list_worker_busy, self._on_list_worker_error)
 
 	def _load_controls(self):
 		# pylint: disable=W0201
@@ -93,7 +132,7 @@ class FrameMain(BaseFrame):
 		# tasklist
 		tasklist_panel = self['tasklist_panel']
 		box = wx.BoxSizer(wx.HORIZONTAL)
-		self._items_list_ctrl = TLC.TaskListControl(tasklist_panel)
+		self._items_list_ctrl = TLC.VirtualTaskListControl(tasklist_panel)
 		box.Add(self._items_list_ctrl, 1, wx.EXPAND)
 		tasklist_panel.SetSizer(box)
 		ppinfo = self['panel_parent_info']
@@ -319,9 +358,14 @@ class FrameMain(BaseFrame):
 		self._refresh_list()
 
 	def _on_close(self, event):
+		self._list_worker.cancel()
 		appconfig = self._appconfig
+		if self._sync_worker and self._sync_worker.running:
+			self._sync_worker.wait()
 		if appconfig.get('sync', 'sync_on_exit'):
 			self._autosync(False)
+			if self._sync_worker:
+				self._sync_worker.wait()
 		appconfig.set('main', 'show_finished', self._btn_show_finished.GetValue())
 		appconfig.set('main', 'show_subtask', self._btn_show_subtasks.GetValue())
 		appconfig.set('main', 'show_hide_until', self._btn_hide_until.GetValue())
@@ -389,8 +433,6 @@ class FrameMain(BaseFrame):
 
 	def _on_menu_file_sync(self, _evt):
 		self._synchronize(False)
-		publisher.sendMessage('task.update')
-		publisher.sendMessage('dict.update')
 
 	def _on_menu_sett_preferences(self, _evt):
 		if DlgPreferences(self.wnd).run(True):
@@ -582,7 +624,7 @@ class FrameMain(BaseFrame):
 		evt.Skip()
 
 	def _on_items_list_activated(self, evt):
-		task_uuid, task_type = self._items_list_ctrl.items[evt.GetData()]
+		task_uuid, task_type = self._items_list_ctrl.items[evt.GetIndex()]
 		if task_type in (enums.TYPE_PROJECT, enums.TYPE_CHECKLIST):
 			task = OBJ.Task.get(self._session, uuid=task_uuid)
 			self._items_path.append(task)
@@ -635,8 +677,14 @@ class FrameMain(BaseFrame):
 			self._items_path.pop(-1)
 			self._refresh_list()
 
-	def _on_tasks_update(self, _args):
-		self._refresh_list()
+	def _on_tasks_update(self, args):
+		# many messages may come in short time (i.e. when editing task);
+		# collect them and update list once
+		data = args.data
+		uuids = None
+		if args.topic == ('task', 'update') and data and data.get('task_uuid'):
+			uuids = data.get('changed_uuids') or [data['task_uuid']]
+		RefreshScheduler().request(self, self._apply_tasks_update, uuids)
 
 	def _on_frame_messsage(self, args):
 		if args.topic == ('gui', 'frame_main', 'raise'):
@@ -685,31 +733,97 @@ class FrameMain(BaseFrame):
 			self._refresh_list()
 
 	def _on_timer(self, _evt, _force_show=False):
-		if self._appconfig.get('notification', 'popup_alarms'):
-			_LOG.debug('FrameMain._on_timer: check reminders')
+		# due alarms are kept until user dismiss/snooze them, so reminders
+		# are shown again (also when popups are enabled later)
+		due = self._alarms.check_due()
+		if due and self._appconfig.get('notification', 'popup_alarms'):
+			_LOG.debug('FrameMain._on_timer: check reminders %r', due)
 			FrameReminders.check(self.wnd, self._session)
+		self._start_reminders_timer()
+
+	def _start_reminders_timer(self):
+		""" Start one-shot timer for next alarm (or re-check of due alarms).
+		"""
+		self._reminders_timer.Stop()
+		next_alarm = self._alarms.next_alarm()
+		has_due = bool(self._alarms.due)
+		if next_alarm is None and not has_due:
+			return
+		delay = _DUE_ALARMS_INTERVAL if has_due else _MAX_ALARM_TIMER_DELAY
+		if next_alarm is not None:
+			delay = min(max((next_alarm - datetime.datetime.utcnow())
+					.total_seconds(), 1), delay)
+		_LOG.debug('FrameMain._start_reminders_timer: next=%r, delay=%r',
+				next_alarm, delay)
+		self._reminders_timer.Start(int(delay * 1000), wx.TIMER_ONE_SHOT)
 
 	def _on_window_iconze(self, evt):
 		if evt.Iconized() and self._appconfig.get('gui', 'min_to_tray'):
 			self.wnd.Show(False)
 
 	def _refresh_list(self):
+		""" Load list in background; previous not finished loading is
+		cancelled. """
 		if not self._all_loaded:
 			return
-		wx.SetCursor(wx.HOURGLASS_CURSOR)
-		self.wnd.Freeze()
 		params = self._get_params_for_list()
 		_LOG.debug("FrameMain._refresh_list; params=%r", params)
+		self._list_worker.submit(_load_list_data, self._on_list_loaded,
+				params, self._get_groups_params())
+
+	def _on_list_loaded(self, result):
+		keys, params, groups_counts = result
+		self.wnd.Freeze()
 		self._session.expire_all()  # pylint: disable=E1101
-		tasks = OBJ.Task.select_by_filters(params, session=self._session)
 		active_only = params['finished'] is not None and not params['finished']
-		self._items_list_ctrl.fill(tasks, active_only=active_only)
+		self._items_list_ctrl.set_keys(keys, self._session,
+				active_only=active_only)
 		showed = self._items_list_ctrl.GetItemCount()
 		self.wnd.SetStatusText(ngettext("%d item", "%d items", showed) % showed, 1)
 		self._show_parent_info(active_only)
-		self._refresh_groups()
+		self._set_groups_counts(groups_counts)
 		self.wnd.Thaw()
-		wx.SetCursor(wx.STANDARD_CURSOR)
+
+	def _on_list_worker_busy(self, busy):
+		if busy:
+			self.wnd.SetStatusText(_("Loading..."), 1)
+
+	def _on_list_worker_error(self, error):
+		self.wnd.SetStatusText(_("Loading error"), 1)
+		mbox.message_box_error_ex(self.wnd, _("Error loading tasks list."),
+				str(error))
+
+	def _apply_tasks_update(self, uuids):
+		if uuids is None:
+			self._alarms.load(self._session)
+		else:
+			self._alarms.update(uuids, self._session)
+		self._start_reminders_timer()
+		if uuids is None or len(uuids) > _MAX_DELTA_UPDATE:
+			self._refresh_list()
+		else:
+			self._update_tasks(uuids)
+
+	def _update_tasks(self, uuids):
+		""" Update only rows of given tasks. """
+		if not self._all_loaded:
+			return
+		if self._list_worker.busy:
+			# list is loading; loaded data may not contain changes
+			self._refresh_list()
+			return
+		params = self._get_params_for_list()
+		_LOG.debug("FrameMain._update_tasks(%r); params=%r", uuids, params)
+		self._session.expire_all()  # pylint: disable=E1101
+		tasks = OBJ.Task.select_by_filters(params, session=self._session)
+		self._items_list_ctrl.update_tasks(tasks, uuids)
+		showed = self._items_list_ctrl.GetItemCount()
+		self.wnd.SetStatusText(ngettext("%d item", "%d items", showed) % showed, 1)
+		if self._items_path:
+			# subtasks counters may change
+			self._show_parent_info(params['finished'] is not None and
+					not params['finished'])
+		self._refresh_groups()
 
 	def _autosync(self, on_load=True):
 		if not self._appconfig.get('sync', 'use_dropbox'):
@@ -717,9 +831,6 @@ class FrameMain(BaseFrame):
 			if not self._appconfig.get('files', 'last_sync_file'):
 				return
 		self._synchronize(on_load, autoclose=True)
-		if on_load:
-			publisher.sendMessage('task.update')
-			publisher.sendMessage('dict.update')
 
 	def _delete_selected_task(self, permanently=False):
 		tasks_uuid = list(self._items_list_ctrl.get_selected_items_uuid())
@@ -783,8 +894,9 @@ class FrameMain(BaseFrame):
 			self['btn_parent_edit'].Enable(True)
 			self.wnd.FindWindowById(wx.ID_UP).Enable(True)
 			parent = self._items_path[-1]
-			panel_parent_info.set_task(parent)
-			panel_parent_icons.set_task(parent)
+			parent_item = tasklist.load_item(parent.uuid, self._session)
+			panel_parent_info.set_task(parent_item)
+			panel_parent_icons.set_task(parent_item)
 			if parent.type == enums.TYPE_PROJECT:
 				self['l_parent_due'].SetLabel(fmt.format_timestamp(
 					parent.due_date_project, parent.due_time_set).replace(' ', '\n'))
@@ -849,23 +961,32 @@ class FrameMain(BaseFrame):
 		return None
 
 	def _refresh_groups(self):
+		self._set_groups_counts(counter.count_tasks(self._get_groups_params(),
+				session=self._session))
+
+	def _get_groups_params(self):
+		return [self._get_params_for_list(group, True, True)
+				for group in xrange(queries.QUERY_TRASH)]  # trash is not counted
+
+	def _set_groups_counts(self, counts):
 		rb_show_selection = self['rb_show_selection']
-		for group, label in enumerate((_("All (%d)"), _("Hotlist (%d)"),
-				_("Today (%d)"),
+		labels = (_("All (%d)"), _("Hotlist (%d)"), _("Today (%d)"),
 				_("Starred (%d)"), _("Basket (%d)"), _("Finished (%d)"),
 				_("Projects (%d)"), _("Checklists (%d)"),
-				_("Active Alarms (%d)"))):
-			cnt = OBJ.Task.select_by_filters(self._get_params_for_list(group,
-					True, True), session=self._session).count()
+				_("Active Alarms (%d)"))
+		for group, (label, cnt) in enumerate(zip(labels, counts)):
 			rb_show_selection.SetItemLabel(group, label % cnt)
 
 	def _synchronize(self, on_load=True, autoclose=False):
-		""" Synchronize data.
+		""" Synchronize data in background.
 
 		Attr:
 			on_load: if true only read data.
 			autoclose: close progress dialog after sync (if no errors)
 		"""
+		if self._sync_worker and self._sync_worker.running:
+			return
+		last_sync_file = None
 		use_dropbox = (self._appconfig.get('sync', 'use_dropbox') and
 				dbsync.is_available())
 		if not use_dropbox:
@@ -886,28 +1007,40 @@ class FrameMain(BaseFrame):
 				return
 		dlg = DlgSyncProggress(self.wnd)
 		dlg.run()
-		try:
-			if use_dropbox:
-				dbsync.sync(load_only=on_load)
-			else:
-				sync.sync(last_sync_file, load_only=on_load)
-		except sync.SyncLockedError:
+		# data can't be modified during sync; disable all windows except
+		# progress dialog
+		self._sync_disabler = wx.WindowDisabler(dlg.wnd)
+
+		def on_finish(error):
+			self._on_sync_finished(dlg, error, autoclose)
+
+		self._sync_worker = SyncWorker(dlg.update, on_finish)
+		dlg.set_cancel_handler(self._sync_worker.cancel)
+		self._sync_worker.start(use_dropbox, last_sync_file, on_load)
+
+	def _on_sync_finished(self, dlg, error, autoclose):
+		self._sync_disabler = None
+		if isinstance(error, sync.SyncLockedError):
 			msgbox = wx.MessageDialog(dlg.wnd, _("Sync file is locked."),
 					_("wxGTD"), wx.OK | wx.ICON_HAND)
 			msgbox.ShowModal()
 			msgbox.Destroy()
 			dlg.update(100, _("Sync file is locked."))
 			autoclose = False
-		except sync.OtherSyncError as err:
-			_LOG.exception('FrameMain._on_menu_file_sync error: %r',
-					str(err))
+		elif isinstance(error, sync.SyncCancelledError):
+			dlg.update(100, _("Cancelled"))
+			autoclose = False
+		elif error is not None:
+			_LOG.error('FrameMain._synchronize error: %r', str(error))
 			msgdlg = wx.lib.dialogs.ScrolledMessageDialog(self.wnd,
-					str(err), _("Synchronisation error"))
+					str(error), _("Synchronisation error"))
 			msgdlg.ShowModal()
 			msgdlg.Destroy()
-			dlg.update(100, _("Error: ") + str(err))
+			dlg.update(100, _("Error: ") + str(error))
 			autoclose = False
 		dlg.mark_finished(2 if autoclose else -1)
+		publisher.sendMessage('task.update')
+		publisher.sendMessage('dict.update')
 
 
 class _TasksPopupMenu:
@@ -18,6 +18,7 @@ import wx
 import wx.lib.dialogs
 
 from wxgtd.wxtools.wxpub import publisher
+from wxgtd.wxtools.scheduler import RefreshScheduler
 from wxgtd.wxtools import iconprovider
 from wxgtd.wxtools import wxutils
 from wxgtd.model import objects as OBJ
@@ -146,6 +147,9 @@ class FrameNotebook(BaseFrame):
 		self._refresh_pages()
 
 	def _on_notebook_update(self, _evt):
+		RefreshScheduler().request(self, self._refresh_all)
+
+	def _refresh_all(self, _items=None):
 		self._refresh_folders()
 		self._refresh_pages()
 
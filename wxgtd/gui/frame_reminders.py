@@ -18,9 +18,11 @@ from datetime import datetime
 import wx
 
 from wxgtd.wxtools.wxpub import publisher
+from wxgtd.wxtools.scheduler import RefreshScheduler
 from wxgtd.logic import task as task_logic
 from wxgtd.model import enums
 from wxgtd.model import objects as OBJ
+from wxgtd.model import tasklist
 from wxgtd.gui.task_controller import TaskController
 from . import _tasklistctrl as tlc
 from ._base_frame import BaseFrame
@@ -100,7 +102,8 @@ class FrameReminders(BaseFrame):
 		self._session = session or OBJ.Session()
 
 	def _refresh(self):
-		self._task_list_ctrl.fill(self._reminders)
+		self._task_list_ctrl.fill(tasklist.load_items_by_uuids(
+				[task.uuid for task in self._reminders], self._session))
 
 	def _on_close(self, event):
 		self.__class__.INSTANCE = None
@@ -150,11 +153,20 @@ class FrameReminders(BaseFrame):
 
 	def _on_tasks_update(self, args):
 		_LOG.debug('FrameReminders._on_tasks_update(%r)', args)
-		uuid = args.data['task_uuid']
-		if args.topic == ('task', 'delete'):
-			self._remove_task(uuid)
-		elif args.topic == ('task', 'update'):
+		data = args.data
+		uuids = None
+		if data and data.get('task_uuid'):
+			uuids = data.get('changed_uuids') or [data['task_uuid']]
+		RefreshScheduler().request(self, self._apply_tasks_update, uuids)
+
+	def _apply_tasks_update(self, uuids):
+		if uuids is None:
+			uuids = [task.uuid for task in self._reminders]
+		now = datetime.utcnow()
+		for uuid in uuids:
 			task = OBJ.Task.get(self._session, uuid=uuid)
-			if task.completed or not task.alarm or task.alarm > datetime.utcnow():
+			if (not task or task.deleted or task.completed or not task.alarm
+					or task.alarm > now):
 				self._remove_task(uuid)
-		self._refresh()
+		if self._reminders:
+			self._refresh()
@@ -16,9 +16,14 @@ import logging
 
 import wx
 
+from wxgtd.wxtools.wxpub import publisher
+from wxgtd.wxtools.scheduler import RefreshScheduler
+from wxgtd.wxtools.worker import BackgroundWorker
 from wxgtd.model import objects as OBJ
+from wxgtd.model import search
 from wxgtd.gui._base_frame import BaseFrame
 from wxgtd.gui import _tasklistctrl as TLC
+from wxgtd.gui import message_boxes as mbox
 from wxgtd.gui.task_controller import TaskController
 
 _ = gettext.gettext
@@ -26,6 +31,22 @@ ngettext = gettext.ngettext  # pylint: disable=C0103
 _LOG = logging.getLogger(__name__)
 
 
+def _search_tasks(text, active_only):
+	""" Search tasks; called in background thread.
+
+	Returns:
+		(text, active_only, candidates for IncrementalSearch, dict uuid -> list
+		key)
+	"""
+	session = OBJ.Session()
+	try:
+		candidates = search.load_candidates(text, active_only, session)
+	finally:
+		session.close()
+	keys = dict((row.uuid, TLC.make_key(row)) for row, _hay in candidates)
+	return text, active_only, candidates, keys
+
+
 class FrameSeach(BaseFrame):
 	""" Search tasks window class. """
 	# pylint: disable=R0903, R0902
@@ -52,12 +73,16 @@ class FrameSeach(BaseFrame):
 		self._searchbox.ShowCancelButton(True)
 		self._searchbox.ShowSearchButton(True)
 		self._session = OBJ.Session()
+		self._searcher = search.IncrementalSearch()
+		self._keys = {}  # uuid -> list key for tasks in searcher result
+		self._worker = BackgroundWorker('search', self._on_worker_busy,
+				self._on_worker_error)
 
 	def _load_controls(self):
 		# pylint: disable=W0201
 		BaseFrame._load_controls(self)
 		tasklist_panel = self['panel_tasks']
-		self._items_list_ctrl = TLC.TaskListControl(tasklist_panel)
+		self._items_list_ctrl = TLC.VirtualTaskListControl(tasklist_panel)
 		box = wx.BoxSizer()
 		box.Add(self._items_list_ctrl, 1, wx.EXPAND)
 		self['panel_tasks'].SetSizer(box)
@@ -65,20 +90,25 @@ class FrameSeach(BaseFrame):
 
 	def _create_bindings(self, wnd):
 		BaseFrame._create_bindings(self, wnd)
-		#self.wnd.Bind(wx.EVT_TEXT, self._on_search, self._searchbox)
+		self.wnd.Bind(wx.EVT_TEXT, self._on_search, self._searchbox)
 		self.wnd.Bind(wx.EVT_SEARCHCTRL_SEARCH_BTN, self._on_search,
 				self._searchbox)
 		self.wnd.Bind(wx.EVT_SEARCHCTRL_CANCEL_BTN, self._on_search_cancel,
 				self._searchbox)
 		self.wnd.Bind(wx.EVT_TEXT_ENTER, self._on_search, self._searchbox)
 		self.wnd.Bind(wx.EVT_BUTTON, self._on_search, id=wx.ID_FIND)
+		self.wnd.Bind(wx.EVT_CHECKBOX, self._on_search,
+				self['cb_search_finished'])
 		wnd.Bind(wx.EVT_LIST_ITEM_ACTIVATED, self._on_items_list_activated,
 				self._items_list_ctrl)
+		publisher.subscribe(self._on_tasks_update, ('task', 'update'))
+		publisher.subscribe(self._on_tasks_update, ('task', 'delete'))
 
 	# events
 
 	def _on_close(self, event):
 		FrameSeach._instance = None
+		self._worker.cancel()
 		self._session.close()
 		BaseFrame._on_close(self, event)
 
@@ -91,20 +121,60 @@ class FrameSeach(BaseFrame):
 		self._refresh_list()
 
 	def _on_items_list_activated(self, evt):
-		task_uuid, _task_type = self._items_list_ctrl.items[evt.GetData()]
+		task_uuid, _task_type = self._items_list_ctrl.items[evt.GetIndex()]
 		if task_uuid:
 			TaskController.open_task(self.wnd, task_uuid)
 
+	def _on_tasks_update(self, _args):
+		RefreshScheduler().request(self, self._on_tasks_changed)
+
+	def _on_tasks_changed(self, _uuids):
+		# cached result is not valid any more
+		self._searcher.reset()
+		self._refresh_list()
+
+	def _on_worker_busy(self, busy):
+		if busy:
+			self.wnd.SetStatusText(_("Searching..."), 1)
+
+	def _on_worker_error(self, error):
+		self.wnd.SetStatusText(_("Search error"), 1)
+		mbox.message_box_error_ex(self.wnd, _("Error searching tasks."),
+				str(error))
+
 	def _refresh_list(self):
-		wx.SetCursor(wx.HOURGLASS_CURSOR)
-		self.wnd.Freeze()
+		""" Search tasks.
+
+		When searched text only extends previous one, previous result is
+		filtered in memory; otherwise database is queried in background.
+		"""
 		text = self._searchbox.GetValue()
-		tasks = []
 		active_only = not self['cb_search_finished'].GetValue()
-		if text:
-			tasks = OBJ.Task.search(text, active_only, self._session)
-		self._items_list_ctrl.fill(tasks, active_only=active_only)
+		if not text:
+			self._worker.cancel()
+			self._searcher.reset()
+			self._show_keys([], active_only)
+		elif self._searcher.can_narrow(text, active_only):
+			# result of running query is not needed any more
+			self._worker.cancel()
+			rows = self._searcher.narrow(text)
+			self._show_keys([self._keys[row.uuid] for row in rows],
+					active_only)
+		else:
+			self._worker.submit(_search_tasks, self._on_search_finished,
+					text, active_only)
+
+	def _on_search_finished(self, result):
+		text, active_only, candidates, keys = result
+		self._keys = keys
+		rows = self._searcher.set_result(text, active_only, candidates)
+		self._show_keys([keys[row.uuid] for row in rows], active_only)
+
+	def _show_keys(self, keys, active_only):
+		self.wnd.Freeze()
+		self._session.expire_all()  # pylint: disable=E1101
+		self._items_list_ctrl.set_keys(keys, self._session,
+				active_only=active_only)
 		showed = self._items_list_ctrl.GetItemCount()
 		self.wnd.SetStatusText(ngettext("%d item", "%d items", showed) % showed, 1)
 		self.wnd.Thaw()
-		wx.SetCursor(wx.STANDARD_CURSOR)
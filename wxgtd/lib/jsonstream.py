@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+""" Reading top-level sections of big json documents from stream.
+
+Document (object) is read in chunks; raw json of each value of top-level
+object is copied to separate file-like object, so whole document is never
+kept in memory nor decoded at once.
+
+Copyright (c) Karol Będkowski, 2013
+
+This file is part of wxGTD
+Licence: GPLv2+
+"""
+
+__author__ = "Karol Będkowski"
+__copyright__ = "Copyright (c) Karol Będkowski, 2013"
+__version__ = "2013-06-02"
+
+import re
+import io
+import json
+import logging
+
+_LOG = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+_RE_NOT_WS = re.compile(r'\S')
+_RE_STRING_SPECIAL = re.compile(r'["\\]')
+_RE_STRUCT = re.compile(r'["{}\[\]]')
+_RE_SCALAR_END = re.compile(r'[\s,}\]]')
+
+
+class SectionsReader(object):
+	""" Iterate over (key, raw value) of top-level json object.
+
+	Args:
+		fileobj: file-like object with json (utf-8) document
+		sink_factory: function called with key that return file-like object
+			for raw value (default: io.BytesIO)
+		chunk_size: size of data read at once
+
+	Iterator yields (key, sink) for each section; after each section
+	`bytes_read` contains number of bytes read from fileobj.
+	"""
+
+	def __init__(self, fileobj, sink_factory=None, chunk_size=CHUNK_SIZE):
+		self._file = fileobj
+		self._sink_factory = sink_factory or (lambda _key: io.BytesIO())
+		self._chunk_size = chunk_size
+		self._buf = ''
+		self._pos = 0
+		self._sink = None  # where consumed data are copied
+		self._start = 0  # position of not copied data in buf
+		self.bytes_read = 0
+
+	def __iter__(self):
+		self._skip_ws()
+		if self._next_char() != '{':
+			raise ValueError('json object expected')
+		self._skip_ws()
+		self._ensure()
+		if self._buf[self._pos] == '}':
+			return
+		while True:
+			self._skip_ws()
+			key = self._read_string()
+			self._skip_ws()
+			if self._next_char() != ':':
+				raise ValueError('":" expected after %r' % key)
+			self._skip_ws()
+			sink = self._sink_factory(key)
+			self._copy_value(sink)
+			yield key, sink
+			self._skip_ws()
+			char = self._next_char()
+			if char == '}':
+				return
+			if char != ',':
+				raise ValueError('"," expected after %r' % key)
+
+	def _fill(self):
+		""" Read next chunk; return False on end of data. """
+		if self._sink is not None:
+			self._sink.write(self._buf[self._start:self._pos])
+			self._start = 0
+		data = self._file.read(self._chunk_size)
+		if not data:
+			return False
+		self.bytes_read += len(data)
+		self._buf = self._buf[self._pos:] + data
+		self._pos = 0
+		return True
+
+	def _ensure(self, count=1):
+		while len(self._buf) - self._pos < count:
+			if not self._fill():
+				raise ValueError('unexpected end of data')
+
+	def _next_char(self):
+		self._ensure()
+		char = self._buf[self._pos]
+		self._pos += 1
+		return char
+
+	def _skip_ws(self):
+		while True:
+			match = _RE_NOT_WS.search(self._buf, self._pos)
+			if match:
+				self._pos = match.start()
+				return
+			self._pos = len(self._buf)
+			if not self._fill():
+				return
+
+	def _find(self, regex):
+		""" Move after next char matching regex; return this char. """
+		while True:
+			match = regex.search(self._buf, self._pos)
+			if match:
+				self._pos = match.end()
+				return match.group()
+			self._pos = len(self._buf)
+			if not self._fill():
+				raise ValueError('unexpected end of data')
+
+	def _skip_string(self):
+		""" Move after end of string (opening quote is already consumed). """
+		while self._find(_RE_STRING_SPECIAL) != '"':
+			# skip escaped char
+			self._ensure()
+			self._pos += 1
+
+	def _start_copy(self, sink):
+		self._sink = sink
+		self._start = self._pos
+
+	def _end_copy(self):
+		self._sink.write(self._buf[self._start:self._pos])
+		self._sink = None
+
+	def _read_string(self):
+		if self._next_char() != '"':
+			raise ValueError('string expected')
+		sink = io.BytesIO()
+		self._pos -= 1
+		self._start_copy(sink)
+		self._pos += 1
+		self._skip_string()
+		self._end_copy()
+		return json.loads(sink.getvalue())
+
+	def _copy_value(self, sink):
+		self._ensure()
+		self._start_copy(sink)
+		char = self._next_char()
+		if char == '"':
+			self._skip_string()
+		elif char in '{[':
+			depth = 1
+			while depth:
+				char = self._find(_RE_STRUCT)
+				if char == '"':
+					self._skip_string()
+				elif char in '{[':
+					depth += 1
+				else:
+					depth -= 1
+		else:
+			# number, true, false, null
+			while True:
+				match = _RE_SCALAR_END.search(self._buf, self._pos)
+				if match:
+					self._pos = match.start()
+					break
+				self._pos = len(self._buf)
+				if not self._fill():
+					break
+		self._end_copy()
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=R0904, C0103
+""" Tests for jsonstream module.
+"""
+
+__author__ = "Karol Będkowski"
+__copyright__ = "Copyright (c) Karol Będkowski, 2013"
+__version__ = "2013-06-02"
+
+import io
+import json
+from unittest import main, TestCase
+
+from . import jsonstream
+
+
+class TestSectionsReader(TestCase):
+
+	def _check(self, data, chunk_size):
+		raw = json.dumps(data, indent=1)
+		reader = jsonstream.SectionsReader(io.BytesIO(raw),
+				chunk_size=chunk_size)
+		result = dict((key, json.loads(sink.getvalue()))
+				for key, sink in reader)
+		self.assertEqual(result, data)
+		self.assertEqual(reader.bytes_read, len(raw))
+
+	def test_sections(self):
+		data = {u'task': [{u'title': u'a "quoted" } ] { [ \\ tąsk',
+				u'note': u'\\"', u'id': 1}, {}, []],
+				u'empty': [], u'version': 2, u'flag': True, u'none': None,
+				u'str': u'x\\', u'k\\"ey': {u'a': [1.5, -2]}}
+		for chunk_size in (1, 2, 3, 7, 64, 10000):
+			self._check(data, chunk_size)
+
+	def test_empty(self):
+		self._check({}, 1)
+
+	def test_errors(self):
+		for raw in ('[]', '{"a": [1, 2}', '{"a" 1}', '{"a": "b'):
+			reader = jsonstream.SectionsReader(io.BytesIO(raw), chunk_size=2)
+			self.assertRaises(ValueError, list, reader)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+""" Conversion of timestamps used in GTD sync files.
+
+Timestamps have format "YYYY-MM-DDTHH:MM:SS.mmmZ" (UTC); strings in this
+format are converted by slicing; other are parsed by dateutil.
+
+Copyright (c) Karol Będkowski, 2013
+
+This file is part of wxGTD
+Licence: GPLv2+
+"""
+
+__author__ = "Karol Będkowski"
+__copyright__ = "Copyright (c) Karol Będkowski, 2013"
+__version__ = "2013-06-02"
+
+import logging
+import datetime
+
+from dateutil import parser, tz
+
+_LOG = logging.getLogger(__name__)
+_TZ_UTC = tz.tzutc()
+
+
+def decode(string):
+	""" Convert string like "2013-03-22T21:27:46.461Z" into datetime.
+
+	Args:
+		string: string to convert
+
+	Returns:
+		Datetime (in UTC, without timezone) or None if error.
+	"""
+	if string and len(string) == 24 and string[23] == 'Z' and \
+			string[10] == 'T' and string[4] == string[7] == '-' and \
+			string[13] == string[16] == ':' and string[19] == '.':
+		try:
+			return datetime.datetime(int(string[:4]), int(string[5:7]),
+					int(string[8:10]), int(string[11:13]), int(string[14:16]),
+					int(string[17:19]), int(string[20:23]) * 1000)
+		except ValueError:
+			pass
+	return _decode_other(string)
+
+
+def encode(date):
+	""" Format datetime (in UTC) to format used in sync files.
+
+	Returns:
+		formatted date or empty string when date is None
+	"""
+	if not date:
+		return ""
+	return "%04d-%02d-%02dT%02d:%02d:%02d.%03dZ" % (date.year, date.month,
+			date.day, date.hour, date.minute, date.second,
+			date.microsecond // 1000)
+
+
+def _decode_other(string):
+	""" Convert timestamp in any format with timezone to datetime. """
+	if string and len(string) > 18:
+		try:
+			value = parser.parse(string)
+			# convert to UTC
+			value = value.astimezone(_TZ_UTC)
+			# remove timezone
+			return value.replace(tzinfo=None)
+		except ValueError:
+			_LOG.exception("decode %r", string)
+	_LOG.error("Wrong string %r", string)
+	return None
+
+
+def benchmark(count=100000):
+	""" Compare decode/encode with dateutil/strftime. """
+	import timeit
+	setup = ('from wxgtd.lib import timestamp_codec as C; '
+			'import datetime; '
+			's = "2013-03-22T21:27:46.461Z"; '
+			'd = datetime.datetime(2013, 3, 22, 21, 27, 46, 461000)')
+	for name, stmt in (
+			('decode', 'C.decode(s)'),
+			('dateutil', 'C._decode_other(s)'),
+			('encode', 'C.encode(d)'),
+			('strftime', 'd.strftime("%Y-%m-%dT%H:%M:%S.") + '
+				'd.strftime("%f")[:3] + "Z"')):
+		time = timeit.timeit(stmt, setup, number=count)
+		print "%-10s %8.2f us" % (name, time * 1000000 / count)
+
+
+if __name__ == '__main__':
+	benchmark()
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=R0904, C0103
+""" Tests for timestamp_codec module.
+"""
+
+__author__ = "Karol Będkowski"
+__copyright__ = "Copyright (c) Karol Będkowski, 2013"
+__version__ = "2013-06-02"
+
+from unittest import main, TestCase
+from datetime import datetime
+
+from . import timestamp_codec as codec
+
+
+class TestTimestampCodec(TestCase):
+
+	def test_decode(self):
+		self.assertEqual(codec.decode("2013-03-22T21:27:46.461Z"),
+				datetime(2013, 3, 22, 21, 27, 46, 461000))
+		# other formats - by dateutil
+		self.assertEqual(codec.decode("2013-03-22T21:27:46Z"),
+				datetime(2013, 3, 22, 21, 27, 46))
+		self.assertEqual(codec.decode("2013-03-22T23:27:46.461+02:00"),
+				datetime(2013, 3, 22, 21, 27, 46, 461000))
+		self.assertEqual(codec.decode("2013-13-22T21:27:46.461Z"), None)
+		self.assertEqual(codec.decode(""), None)
+		self.assertEqual(codec.decode(None), None)
+
+	def test_encode(self):
+		self.assertEqual(codec.encode(datetime(2013, 3, 2, 1, 7, 6, 461999)),
+				"2013-03-02T01:07:06.461Z")
+		self.assertEqual(codec.encode(None), "")
+
+	def test_roundtrip(self):
+		date = datetime(2013, 12, 31, 23, 59, 59, 999000)
+		self.assertEqual(codec.decode(codec.encode(date)), date)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,110 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+""" Queue of upcoming tasks alarms.
+
+This file is part of wxGTD.
+Copyright (c) Karol Będkowski, 2013
+License: GPLv2+
+"""
+__author__ = "Karol Będkowski"
+__copyright__ = "Copyright (c) Karol Będkowski, 2013"
+__version__ = "2013-06-02"
+
+import heapq
+import logging
+import datetime
+
+from wxgtd.model import objects as OBJ
+
+_LOG = logging.getLogger(__name__)
+
+
+class AlarmQueue(object):
+	""" Min-heap of alarms of not completed, not deleted tasks.
+
+	Alarms are loaded once (`load`) and then updated only for changed tasks
+	(`update`), so finding next alarm don't require database queries.
+
+	Heap entries are not removed when alarm is changed; invalid entries
+	(not matching current alarm of task) are skipped.
+
+	Due alarms are kept (`due`) until task is changed (alarm dismissed,
+	snoozed, task completed etc).
+	"""
+
+	def __init__(self):
+		self._heap = []  # (alarm, task uuid)
+		self._alarms = {}  # task uuid -> alarm; not yet due
+		self._due = {}  # task uuid -> alarm; due, not acknowledged
+
+	def __len__(self):
+		return len(self._alarms) + len(self._due)
+
+	@property
+	def due(self):
+		""" Uuids of tasks with due, not acknowledged alarms. """
+		return sorted(self._due, key=self._due.get)
+
+	def load(self, session=None):
+		""" Load all alarms from database. """
+		self._due = {}
+		self._alarms = dict(_query_alarms(session))
+		self._heap = [(alarm, uuid) for uuid, alarm in self._alarms.iteritems()]
+		heapq.heapify(self._heap)
+		_LOG.debug('AlarmQueue.load: %d alarms', len(self._alarms))
+
+	def update(self, uuids, session=None):
+		""" Reload alarms for given tasks.
+
+		Args:
+			uuids: list of changed (or deleted) tasks uuid
+			session: optional sqlalchemy session
+		"""
+		uuids = list(uuids)
+		for uuid in uuids:
+			self._alarms.pop(uuid, None)
+			self._due.pop(uuid, None)
+		for idx in xrange(0, len(uuids), OBJ.MAX_IN_VALUES):
+			chunk = uuids[idx:idx + OBJ.MAX_IN_VALUES]
+			for uuid, alarm in _query_alarms(session,
+					OBJ.Task.uuid.in_(chunk)):
+				self._alarms[uuid] = alarm
+				heapq.heappush(self._heap, (alarm, uuid))
+		if len(self._heap) > 2 * len(self._alarms) + 100:
+			# too many invalid entries
+			self._heap = [(alarm, uuid) for uuid, alarm
+					in self._alarms.iteritems()]
+			heapq.heapify(self._heap)
+
+	def next_alarm(self):
+		""" Get time of nearest not yet due alarm or None. """
+		heap = self._heap
+		while heap and self._alarms.get(heap[0][1]) != heap[0][0]:
+			heapq.heappop(heap)
+		return heap[0][0] if heap else None
+
+	def check_due(self, now=None):
+		""" Move alarms before `now` to due alarms.
+
+		Returns:
+			Uuids of tasks with due alarms (also previously found, not
+			acknowledged).
+		"""
+		now = now or datetime.datetime.utcnow()
+		while True:
+			alarm = self.next_alarm()
+			if alarm is None or alarm > now:
+				break
+			_alarm, uuid = heapq.heappop(self._heap)
+			self._due[uuid] = self._alarms.pop(uuid)
+		return self.due
+
+
+def _query_alarms(session, *filters):
+	session = session or OBJ.Session()
+	query = session.query(OBJ.Task.uuid, OBJ.Task.alarm).filter(
+			OBJ.Task.alarm.isnot(None), OBJ.Task.completed.is_(None),
+			OBJ.Task.deleted.is_(None))
+	if filters:
+		query = query.filter(*filters)
+	return query.all()
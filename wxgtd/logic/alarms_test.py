@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=R0904, C0103
+""" Tests for alarms module.
+"""
+
+__author__ = "Karol Będkowski"
+__copyright__ = "Copyright (c) Karol Będkowski, 2013"
+__version__ = "2013-06-02"
+
+from unittest import main, TestCase
+from datetime import datetime, timedelta
+
+from wxgtd.model import db
+from wxgtd.model import objects as OBJ
+from . import alarms
+
+
+class TestAlarmQueue(TestCase):
+
+	def setUp(self):
+		db.connect(':memory:')
+		self.session = session = OBJ.Session()
+		self.now = now = datetime.utcnow()
+		self.task1 = OBJ.Task(title='t1', alarm=now - timedelta(minutes=1))
+		self.task2 = OBJ.Task(title='t2', alarm=now + timedelta(hours=1))
+		self.task3 = OBJ.Task(title='t3', alarm=now + timedelta(hours=2),
+				completed=now)
+		self.task4 = OBJ.Task(title='t4')
+		session.add_all([self.task1, self.task2, self.task3, self.task4])
+		session.commit()
+
+	def tearDown(self):
+		self.session.close()
+
+	def test_load(self):
+		queue = alarms.AlarmQueue()
+		queue.load(self.session)
+		self.assertEqual(len(queue), 2)
+		self.assertEqual(queue.next_alarm(), self.task1.alarm)
+		self.assertEqual(queue.check_due(self.now), [self.task1.uuid])
+		# not acknowledged alarms are still due
+		self.assertEqual(queue.check_due(self.now), [self.task1.uuid])
+		self.assertEqual(queue.next_alarm(), self.task2.alarm)
+		self.assertEqual(len(queue), 2)
+		# snooze
+		self.task1.alarm = self.now + timedelta(minutes=5)
+		self.session.commit()
+		queue.update([self.task1.uuid], self.session)
+		self.assertEqual(queue.due, [])
+		self.assertEqual(queue.next_alarm(), self.task1.alarm)
+		# dismiss
+		self.assertEqual(queue.check_due(self.now + timedelta(minutes=6)),
+				[self.task1.uuid])
+		self.task1.alarm = None
+		self.session.commit()
+		queue.update([self.task1.uuid], self.session)
+		self.assertEqual(queue.check_due(self.now + timedelta(minutes=6)), [])
+		self.assertEqual(len(queue), 1)
+
+	def test_update(self):
+		queue = alarms.AlarmQueue()
+		queue.load(self.session)
+		self.task1.alarm = None
+		self.task2.alarm = self.now + timedelta(minutes=5)
+		self.task4.alarm = self.now + timedelta(minutes=3)
+		self.session.commit()
+		queue.update([self.task1.uuid, self.task2.uuid, self.task4.uuid],
+				self.session)
+		self.assertEqual(len(queue), 2)
+		self.assertEqual(queue.next_alarm(), self.task4.alarm)
+		self.assertEqual(queue.check_due(self.now + timedelta(hours=3)),
+				[self.task4.uuid, self.task2.uuid])
+		self.assertEqual(queue.next_alarm(), None)
+
+
+if __name__ == '__main__':
+	main()
@@ -16,6 +16,7 @@ import datetime
 import logging
 import gettext
 import re
+import itertools
 
 from dateutil.relativedelta import relativedelta
 
@@ -23,6 +24,7 @@ from wxgtd.wxtools.wxpub import publisher
 
 from wxgtd.model import objects as OBJ
 from wxgtd.model import enums
+from wxgtd.model import hierarchy
 
 _LOG = logging.getLogger(__name__)
 _ = gettext.gettext
@@ -572,8 +574,10 @@ def save_modified_task(task, session=None):
 					session) + 1
 	task.update_modify_time()
 	session.add(task)
+	changed_uuids = _flush_changed_tasks(session)
 	session.commit()  # pylint: disable=E1101
-	publisher.sendMessage('task.update', data={'task_uuid': task.uuid})
+	publisher.sendMessage('task.update', data={'task_uuid': task.uuid,
+		'changed_uuids': changed_uuids})
 	return True
 
 
@@ -604,6 +608,16 @@ def save_modified_tasks(tasks, session=None):
 	return True
 
 
+def _flush_changed_tasks(session):
+	""" Flush session and return uuids of all added, modified and deleted
+	tasks (i.e. repeated task, parent with updated due date).
+	"""
+	tasks = [obj for obj in itertools.chain(session.new, session.dirty,
+			session.deleted) if isinstance(obj, OBJ.Task)]
+	session.flush()
+	return [task.uuid for task in tasks]
+
+
 def adjust_task_type(task, session):
 	""" Update task type when moving task to project/change type.
 	Args:
@@ -612,6 +626,12 @@ def adjust_task_type(task, session):
 	Returns:
 		True if ok.
 	"""
+	# load all subtasks at once
+	hierarchy.preload_subtree(task, session)
+	return _adjust_task_type(task, session)
+
+
+def _adjust_task_type(task, session):
 	if task.parent:
 		# zadanie ma rodzica - ustalenie typu na podstawie parenta
 		if task.parent.type == enums.TYPE_CHECKLIST:
@@ -628,14 +648,15 @@ def adjust_task_type(task, session):
 		# aktualizacja potomków
 		if task.type in (enums.TYPE_CHECKLIST, enums.TYPE_PROJECT):
 			for subtask in task.children:
-				adjust_task_type(subtask, session)
+				_adjust_task_type(subtask, session)
 		else:
 			# jeżeli to nie projakt ani checliksta to nie powinna mieć podzadań
-			for subtask in task.children:
+			# kopia - zmiana rodzica usuwa element z task.children
+			for subtask in list(task.children):
 				# przesuniecie na poziom parenta
 				subtask.parent = task.parent
 				# poprawa typu
-				adjust_task_type(subtask, session)
+				_adjust_task_type(subtask, session)
 	return True
 
 
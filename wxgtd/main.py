@@ -118,7 +118,8 @@ def run():
 
 	# connect to databse
 	from wxgtd.model import db
-	db.connect(db.find_db_file(config), options.debug_sql)
+	db.connect(db.find_db_file(config), options.debug_sql,
+			config.get('database', 'profile'))
 
 	if options.quick_task_dialog:
 		from wxgtd.gui import quicktask
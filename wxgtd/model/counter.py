@@ -0,0 +1,65 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+""" Counting tasks in many query groups at once.
+
+Copyright (c) Karol Będkowski, 2013
+
+This file is part of wxGTD
+Licence: GPLv2+
+"""
+__author__ = "Karol Będkowski"
+__copyright__ = "Copyright (c) Karol Będkowski, 2013"
+__version__ = "2013-06-02"
+
+import logging
+import datetime
+
+from sqlalchemy import select, func, case, and_
+
+from wxgtd.model import objects as OBJ
+
+_LOG = logging.getLogger(__name__)
+
+
+def count_tasks(params_list, session=None):
+	""" Count tasks matching each of given query params in one query.
+
+	Filters shared by all params are put in WHERE clause; rest of filters
+	are evaluated for each params by conditional aggregates, so database
+	is scanned only once.
+
+	Args:
+		params_list: list of query params (see queries.build_query_params)
+		session: optional sqlalchemy session
+
+	Returns:
+		List of numbers of tasks; one for each params.
+	"""
+	if not params_list:
+		return []
+	session = session or OBJ.Session()
+	now = datetime.datetime.utcnow()
+	filters = [OBJ.Task.build_filters(params, now) for params in params_list]
+	common = [flt for flt in filters[0]
+			if all(_contains(group_filters, flt)
+				for group_filters in filters[1:])]
+	columns = []
+	for group_filters in filters:
+		rest = [flt for flt in group_filters if not _contains(common, flt)]
+		if rest:
+			columns.append(func.sum(case([(and_(*rest), 1)],  # pylint: disable=W0142
+					else_=0)))
+		else:
+			columns.append(func.count(OBJ.Task.uuid))
+	query = select(columns).select_from(OBJ.Task.__table__)
+	if common:
+		query = query.where(and_(*common))  # pylint: disable=W0142
+	_LOG.debug('count_tasks: %d groups, %d common filters', len(filters),
+			len(common))
+	row = session.execute(query).first()
+	return [cnt or 0 for cnt in row]
+
+
+def _contains(filters, flt):
+	""" Check is `flt` expression is equal to any of `filters`. """
+	return any(flt.compare(other) for other in filters)
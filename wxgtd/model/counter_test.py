@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=R0904, C0103
+""" Tests for counter module.
+"""
+
+__author__ = "Karol Będkowski"
+__copyright__ = "Copyright (c) Karol Będkowski, 2013"
+__version__ = "2013-06-02"
+
+from unittest import main, TestCase
+from datetime import datetime, timedelta
+
+from . import db
+from . import objects as OBJ
+from . import queries
+from . import counter
+from . import enums
+
+
+class TestCountTasks(TestCase):
+
+	def setUp(self):
+		db.connect(':memory:')
+		self.session = session = OBJ.Session()
+		now = datetime.utcnow()
+		self.context = OBJ.Context(title='ctx')
+		session.add(self.context)
+		session.flush()
+		for idx in xrange(40):
+			session.add(OBJ.Task(title='task %d' % idx,
+				starred=idx % 2,
+				type=(enums.TYPE_PROJECT if idx % 5 == 0
+					else enums.TYPE_TASK),
+				completed=(now if idx % 7 == 0 else None),
+				due_date=(now + timedelta(days=idx % 3 - 1)),
+				context_uuid=(self.context.uuid if idx % 3 == 0 else None)))
+		session.commit()
+
+	def tearDown(self):
+		self.session.close()
+
+	def _check(self, params_list):
+		expected = [OBJ.Task.select_by_filters(params, self.session).count()
+				for params in params_list]
+		self.assertEqual(counter.count_tasks(params_list, self.session),
+				expected)
+
+	def test_groups(self):
+		for options in (0, queries.OPT_SHOW_FINISHED,
+				queries.OPT_SHOW_FINISHED | queries.OPT_SHOW_SUBTASKS):
+			self._check([queries.build_query_params(group, options, None, '')
+				for group in (0, 2, 3, 4, 5, 6, 7, 8)])
+
+	def test_common_filters(self):
+		params_list = [queries.build_query_params(group, 0, None, '')
+				for group in (0, 3, 6)]
+		for params in params_list:
+			queries.query_params_append_contexts(params, [self.context.uuid])
+		self._check(params_list)
+
+	def test_empty(self):
+		self.assertEqual(counter.count_tasks([], self.session), [])
+
+
+if __name__ == '__main__':
+	main()
@@ -20,13 +20,32 @@ import logging
 import datetime
 
 import sqlalchemy
+from sqlalchemy import pool
 from sqlalchemy.engine import Engine
 
 from wxgtd.model import sqls
 from wxgtd.model import objects
+from wxgtd.model import migrations
 
 _LOG = logging.getLogger(__name__)
 
+# Storage profiles - pragmas set on each new connection.
+# "wal" allow reading database (gui, reminders, cli) while sync write data;
+# "rollback" is classic sqlite journal (one connection per session).
+STORAGE_PROFILES = {
+	'rollback': (),
+	'wal': (
+		"PRAGMA journal_mode=WAL",
+		# in wal mode NORMAL is safe (only last transactions may be lost
+		# on power failure)
+		"PRAGMA synchronous=NORMAL",
+		"PRAGMA cache_size=-8192",  # 8MB
+		"PRAGMA mmap_size=67108864",  # 64MB
+		"PRAGMA busy_timeout=10000",
+	),
+}
+DEFAULT_PROFILE = 'wal'
+
 
 @sqlalchemy.event.listens_for(Engine, "connect")
 def _set_sqlite_pragma(dbapi_connection, _connection_record):
@@ -35,25 +54,52 @@ def _set_sqlite_pragma(dbapi_connection, _connection_record):
 	cursor.close()
 
 
-def connect(filename, debug=False, *args, **kwargs):
+def _create_engine(filename, debug, profile):
+	""" Create engine for given storage profile. """
+	connect_args = {'detect_types': sqlite3.PARSE_DECLTYPES |
+			sqlite3.PARSE_COLNAMES}
+	pragmas = STORAGE_PROFILES.get(profile)
+	if pragmas is None:
+		_LOG.warn('unknown storage profile %r; using %r', profile,
+				DEFAULT_PROFILE)
+		pragmas = STORAGE_PROFILES[DEFAULT_PROFILE]
+	if filename == ':memory:' or not pragmas:
+		# default pool: SingletonThreadPool for memory db, NullPool for files
+		return sqlalchemy.create_engine("sqlite:///" + filename, echo=debug,
+				connect_args=connect_args, native_datetime=True)
+	# Keep connections open between sessions; connection may be used by
+	# various threads (one at the time), so same-thread check is disabled.
+	connect_args['check_same_thread'] = False
+	engine = sqlalchemy.create_engine("sqlite:///" + filename, echo=debug,
+			connect_args=connect_args, native_datetime=True,
+			poolclass=pool.QueuePool, pool_size=5, max_overflow=10)
+
+	@sqlalchemy.event.listens_for(engine, "connect")
+	def set_profile_pragmas(dbapi_connection,  # pylint: disable=W0612
+			_connection_record):
+		cursor = dbapi_connection.cursor()
+		for pragma in pragmas:
+			cursor.execute(pragma)
+		cursor.close()
+
+	return engine
+
+
+def connect(filename, debug=False, profile=None):
 	""" Create connection  to database  & initiate it.
 
 	Args:
 		filename: path to sqlite database file
 		debug: (bool) turn on  debugging
-		args, kwargs: other arguments for sqlalachemy engine
+		profile: name of storage profile (see STORAGE_PROFILES); default
+			DEFAULT_PROFILE
 
 	Return:
 		Sqlalchemy Session class
 	"""
-	_LOG.info('connect %r', (filename, args, kwargs))
-	engine = sqlalchemy.create_engine("sqlite:///" + filename, echo=debug,
-			connect_args={'detect_types': sqlite3.PARSE_DECLTYPES |
-				sqlite3.PARSE_COLNAMES}, native_datetime=True)
-	for schema in sqls.SCHEMA_DEF:
-		for sql in schema:
-			engine.execute(sql)
-	sqls.fix_synclog(engine)
+	profile = profile or DEFAULT_PROFILE
+	_LOG.info('connect %r', (filename, profile))
+	engine = _create_engine(filename, debug, profile)
 	objects.Session.configure(bind=engine)  # pylint: disable=E1120
 
 	if debug:
@@ -68,9 +114,10 @@ def connect(filename, debug=False, *args, **kwargs):
 			_LOG.debug("Query time: %.02fms",
 					(time.time() - context.app_query_start) * 1000)
 
-	_LOG.info('Database create_all START')
-	objects.Base.metadata.create_all(engine)
-	_LOG.info('Database create_all COMPLETED')
+	_LOG.info('Database upgrade START')
+	version = migrations.upgrade(engine)
+	_LOG.info('Database upgrade COMPLETED; schema version: %d', version)
+	objects.FTS_MODULE = sqls.get_fts_module(engine)
 	# bootstrap
 	_LOG.info('Database bootstrap START')
 	session = objects.Session()
@@ -138,3 +185,64 @@ def find_db_file(config):
 	if not os.path.isdir(db_dirname):
 		os.mkdir(db_dirname)
 	return db_filename
+
+
+def benchmark(tasks=10000):
+	""" Measure read latency while sync load `tasks` into database.
+
+	For each storage profile: load tasks in background thread and in
+	meantime query task list (like gui) in main thread.
+	"""
+	import json
+	import shutil
+	import tempfile
+	import threading
+	from wxgtd.model import loader
+
+	modified = '2013-06-01T10:00:00.000Z'
+	data = json.dumps({'syncLog': [], 'task': [
+		{'_id': idx, 'parent_id': 0, 'uuid': 'task%d' % idx,
+			'title': 'task %d' % idx, 'created': modified,
+			'modified': modified, 'completed': '', 'deleted': '',
+			'due_date': '', 'start_date': '', 'due_date_project': '',
+			'hide_until': '', 'hide_pattern': '', 'type': 0}
+		for idx in xrange(1, tasks + 1)]})
+	for profile in sorted(STORAGE_PROFILES):
+		tmpdir = tempfile.mkdtemp()
+		try:
+			connect(os.path.join(tmpdir, 'wxgtd.db'), profile=profile)
+			session = objects.Session()
+			session.add(objects.Task(title='first'))
+			session.commit()
+			session.close()
+			load = threading.Thread(target=loader.load_json,
+					args=(data, loader._fake_update_func, True))
+			load_start = time.time()
+			load.start()
+			latencies, errors = [], 0
+			while load.is_alive():
+				start = time.time()
+				session = objects.Session()
+				try:
+					session.query(objects.Task).order_by(
+							objects.Task.title).limit(50).all()
+				except sqlalchemy.exc.OperationalError:
+					errors += 1
+				finally:
+					session.close()
+				latencies.append(time.time() - start)
+				time.sleep(0.01)
+			load_time = time.time() - load_start
+			objects.Session().bind.dispose()
+		finally:
+			shutil.rmtree(tmpdir)
+		latencies.sort()
+		print ("%-8s load %6.2fs  reads %4d  errors %2d  "
+				"median %7.1fms  max %7.1fms" % (profile, load_time,
+				len(latencies), errors,
+				latencies[len(latencies) // 2] * 1000 if latencies else 0,
+				latencies[-1] * 1000 if latencies else 0))
+
+
+if __name__ == '__main__':
+	benchmark()
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=R0904, C0103
+""" Tests for db module.
+"""
+
+__author__ = "Karol Będkowski"
+__copyright__ = "Copyright (c) Karol Będkowski, 2013"
+__version__ = "2013-06-02"
+
+import os
+import shutil
+import tempfile
+import threading
+from unittest import main, TestCase
+
+from . import db
+from . import objects as OBJ
+
+
+class TestStorageProfile(TestCase):
+
+	def setUp(self):
+		self.tmpdir = tempfile.mkdtemp()
+		self.filename = os.path.join(self.tmpdir, 'wxgtd.db')
+
+	def tearDown(self):
+		OBJ.Session().bind.dispose()
+		shutil.rmtree(self.tmpdir)
+
+	def test_wal(self):
+		db.connect(self.filename, profile='wal')
+		session = OBJ.Session()
+		self.assertEqual(session.execute("PRAGMA journal_mode").scalar(),
+				'wal')
+		session.add(OBJ.Task(uuid='t1', title='task'))
+		session.flush()
+		# uncommitted changes don't block readers in other threads
+		result = []
+
+		def read():
+			rsess = OBJ.Session()
+			result.append(rsess.query(OBJ.Task).count())
+			rsess.close()
+
+		thread = threading.Thread(target=read)
+		thread.start()
+		thread.join(5)
+		self.assertEqual(result, [0])
+		session.commit()
+		session.close()
+
+	def test_rollback(self):
+		db.connect(self.filename, profile='rollback')
+		session = OBJ.Session()
+		self.assertEqual(session.execute("PRAGMA journal_mode").scalar(),
+				'delete')
+		session.close()
+
+
+if __name__ == '__main__':
+	main()
@@ -50,6 +50,8 @@ _ = gettext.gettext
 
 SYNC_PATH = '/Apps/DGT-GTD/sync/GTD_SYNC.zip'
 LOCK_PATH = '/Apps/DGT-GTD/sync/sync.locked'
+# key in Conf with fingerprint of last loaded or uploaded sync file
+CONF_FINGERPRINT = 'dropbox_sync_fingerprint'
 
 
 def is_available():
@@ -70,15 +72,35 @@ def _create_session():
 
 
 def download_file(fileobj, source, dbclient):
+	""" Download file from dropbox.
+
+	Returns:
+		Metadata of downloaded file or None if file not exists.
+	"""
 	_LOG.info('download_file')
 	try:
 		remote_file, metadata = dbclient.get_file_and_metadata(source)
 		if metadata and metadata['bytes'] > 0:
 			fileobj.write(remote_file.read())
-			return True
+			return metadata
 	except dropbox.rest.ErrorResponse:
 		_LOG.warn("download_file: %r not found", source)
-	return False
+	return None
+
+
+def _get_fingerprint(metadata):
+	""" Create fingerprint of file from dropbox metadata. """
+	if not metadata or metadata.get('is_deleted') or not metadata.get('rev'):
+		return None
+	return {'rev': metadata['rev'], 'size': metadata.get('bytes')}
+
+
+def _get_remote_fingerprint(dbclient, path):
+	try:
+		return _get_fingerprint(dbclient.metadata(path))
+	except dropbox.rest.ErrorResponse:
+		_LOG.info("_get_remote_fingerprint: %r not found", path)
+	return None
 
 
 def _delete_file(dbclient, path):
@@ -105,37 +127,69 @@ def sync(load_only=False, notify_cb=_notify_progress):
 	if not appconfig.AppConfig().get('dropbox', 'oauth_secret'):
 		raise SYNC.OtherSyncError(_("Dropbox is not configured."))
 	notify_cb(0, _("Sync via Dropbox API...."))
-	notify_cb(1, _("Creating backup"))
-	SYNC.create_backup()
-	notify_cb(25, _("Checking sync lock"))
 	try:
 		dbclient = _create_session()
+		fingerprint = _get_remote_fingerprint(dbclient, SYNC_PATH)
 	except dropbox.rest.ErrorResponse as error:
 		raise SYNC.OtherSyncError(_("Dropbox: connection failed: %s") %
 				str(error))
+	last_fingerprint = SYNC.get_fingerprint(CONF_FINGERPRINT)
+	file_changed = not SYNC.is_same_fingerprint(fingerprint,
+			last_fingerprint)
+	if not file_changed and (load_only or not SYNC.get_journal_last_id()):
+		_LOG.info("sync: file and database not changed; skipping")
+		notify_cb(100, _("No changes"))
+		return
+	notify_cb(1, _("Creating backup"))
+	SYNC.create_backup()
+	notify_cb(25, _("Checking sync lock"))
 	temp_file = tempfile.NamedTemporaryFile(suffix='.zip', delete=False)
 	temp_filename = temp_file.name
 	if create_sync_lock(dbclient):
 		notify_cb(2, _("Downloading..."))
 		try:
-			loaded = download_file(temp_file, SYNC_PATH, dbclient)
-			temp_file.close()
-			if loaded:
-				loader.load_from_file(temp_filename, notify_cb)
-			if not load_only:
-				exporter.save_to_file(temp_filename, notify_cb, 'GTD_SYNC.json')
-				_delete_file(dbclient, SYNC_PATH)
-				notify_cb(20, _("Uploading..."))
-				with open(temp_filename) as temp_file:
-					dbclient.put_file(SYNC_PATH, temp_file)
+			local_changes_id = SYNC.get_journal_last_id()
+			# file may be changed before lock was created
+			fingerprint = _get_remote_fingerprint(dbclient, SYNC_PATH)
+			file_changed = not SYNC.is_same_fingerprint(fingerprint,
+					last_fingerprint)
+			if file_changed:
+				metadata = download_file(temp_file, SYNC_PATH, dbclient)
+				temp_file.close()
+				fingerprint = _get_fingerprint(metadata)
+				if metadata:
+					loader.load_from_file(temp_filename, notify_cb)
+			else:
+				temp_file.close()
+				notify_cb(10, _("Sync file not changed; skipping download"))
+			loaded_id = SYNC.get_journal_last_id()
+			if load_only:
+				# keep local changes for next sync
+				SYNC.clear_journal(local_changes_id, loaded_id)
+			else:
+				if local_changes_id or fingerprint is None:
+					exporter.save_to_file(temp_filename, notify_cb,
+							'GTD_SYNC.json')
+					_delete_file(dbclient, SYNC_PATH)
+					notify_cb(20, _("Uploading..."))
+					with open(temp_filename) as temp_file:
+						fingerprint = _get_fingerprint(
+								dbclient.put_file(SYNC_PATH, temp_file))
+				else:
+					notify_cb(80, _("No local changes; skipping upload"))
+				SYNC.clear_journal(0, loaded_id)
+			SYNC.store_fingerprint(CONF_FINGERPRINT, fingerprint)
+		except SYNC.SyncCancelledError:
+			_LOG.info("sync cancelled")
+			raise
 		except Exception as err:
 			_LOG.exception("file sync error")
 			raise SYNC.OtherSyncError(err)
 		finally:
-			notify_cb(90, _("Removing sync lock"))
 			_delete_file(dbclient, LOCK_PATH)
 			with ignore_exceptions(IOError):
 				os.unlink(temp_filename)
+			notify_cb(90, _("Sync lock removed"))
 		notify_cb(100, _("Completed"))
 	else:
 		notify_cb(100, _("Synchronization file is locked. "
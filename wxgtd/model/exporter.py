@@ -14,10 +14,12 @@ __copyright__ = "Copyright (c) Karol Będkowski, 2013"
 __version__ = '2013-04-21'
 
 import os
+import io
 import logging
 import zipfile
 import datetime
 import gettext
+import tempfile
 import csv
 import sys
 try:
@@ -29,7 +31,10 @@ except ImportError:
 	_JSON_DECODER = json.loads
 	_JSON_ENCODER = json.dumps
 
+from sqlalchemy import select, func, literal_column, Integer
+
 from wxgtd.lib import fmt
+from wxgtd.lib import timestamp_codec
 from wxgtd.model import objects
 from wxgtd.model import enums
 
@@ -53,54 +58,139 @@ def save_to_file(filename, notify_cb=_fake_update_func, internal_fname=None):
 			without ".zip" extension.
 	"""
 	if filename.endswith('.zip'):
-		with zipfile.ZipFile(filename, 'w', zipfile.ZIP_DEFLATED) as zfile:
-			fname = internal_fname or os.path.basename(filename[:-4])
-			if not fname.endswith('.json'):
-				fname += '.json'
-			data = dump_database_to_json(notify_cb)
+		fname = internal_fname or os.path.basename(filename[:-4])
+		if not fname.endswith('.json'):
+			fname += '.json'
+		# zipfile can't write member from stream, so json is dumped into
+		# temporary file; ZipFile.write compress it in chunks
+		tmpfile = tempfile.NamedTemporaryFile(suffix='.json', delete=False)
+		try:
+			with tmpfile:
+				dump_database(tmpfile, notify_cb)
 			notify_cb(85, _("Writing..."))
-			zfile.writestr(fname, data)
+			with zipfile.ZipFile(filename, 'w', zipfile.ZIP_DEFLATED) as zfile:
+				zfile.write(tmpfile.name, fname)
+		finally:
+			os.unlink(tmpfile.name)
 	else:
-		with open(filename, 'w') as ifile:
-			ifile.write(dump_database_to_json(notify_cb))
+		with open(filename, 'wb') as ifile:
+			dump_database(ifile, notify_cb)
 	notify_cb(99, _("Saved"))
 
 
-def fmt_date(date):
-	""" Format date to format required by GTD.
+# Format date to format required by GTD; empty string when date is None.
+fmt_date = timestamp_codec.encode
+
+
+def _rowid(table):
+	""" Rowid of rows in table (or alias); used as object id in sync file. """
+	return literal_column(table.name + ".rowid", Integer)
+
+
+def _select_items(session, table, columns, where=None):
+	""" Select columns from table together with row id and id of parent.
 
 	Args:
-		date: date & time as datetime.datetime object
+		session: sqlalchemy session
+		table: table to query
+		columns: columns to select
+		where: optional condition
 
 	Returns:
-		formatted date or empty string when date is None
+		Rows with all given columns and "_id" and "parent_id".
 	"""
-	if not date:
-		return ""
-	return date.strftime("%Y-%m-%dT%H:%M:%S.") + date.strftime("%f")[:3] + 'Z'
-
+	parent = table.alias("parent")
+	query = select([_rowid(table).label("_id"),
+			func.coalesce(_rowid(parent), 0).label("parent_id")] + columns,
+			from_obj=[table.outerjoin(parent,
+				parent.c.uuid == table.c.parent_uuid)])
+	if where is not None:
+		query = query.where(where)
+	return session.execute(query)
 
-def _build_uuid_map(session, objclass):
-	""" Create cache "object uuid" -> "object id" from object in database.
 
-	Object id is generated from sequence for all object given class.
+def _select_relations(session, table, key, reltable, relkey, columns=None,
+		where=None):
+	""" Select row ids pairs for relation between tables.
 
 	Args:
 		session: sqlalchemy session
-		objclass: class of objects to query
+		table: table to query
+		key: column in table referencing reltable
+		reltable: related table
+		relkey: column in reltable referenced by key
+		columns: additional columns to select; default: created & modified
+		where: optional condition
 
 	Returns:
-		Dictionary uuid -> object id
+		Rows with "_id", "rel_id" and columns.
 	"""
-	cache = {}
-	for idx, obj in enumerate(session.query(objclass), 1):
-		cache[obj.uuid] = idx
-	return cache
+	if columns is None:
+		columns = [table.c.created, table.c.modified]
+	query = select([_rowid(table).label("_id"),
+			_rowid(reltable).label("rel_id")] + columns,
+			from_obj=[table.join(reltable, key == relkey)])
+	if where is not None:
+		query = query.where(where)
+	return session.execute(query)
 
 
 _DEFAULT_BG_COLOR = "FFFFFF00"
 
 
+class _JsonWriter(object):
+	""" Write json object to stream section by section.
+
+	Args:
+		stream: file-like object
+	"""
+
+	def __init__(self, stream):
+		self._stream = stream
+		self._first = True
+		stream.write('{')
+
+	def _write_key(self, key):
+		if self._first:
+			self._first = False
+		else:
+			self._stream.write(', ')
+		self._stream.write(_encode(key))
+		self._stream.write(': ')
+
+	def write_value(self, key, value):
+		""" Write one value. """
+		self._write_key(key)
+		self._stream.write(_encode(value))
+
+	def write_list(self, key, items):
+		""" Write items from iterable as list.
+
+		Returns:
+			number of written items
+		"""
+		self._write_key(key)
+		write = self._stream.write
+		write('[')
+		count = 0
+		for count, item in enumerate(items, 1):
+			if count > 1:
+				write(', ')
+			write(_encode(item))
+		write(']')
+		return count
+
+	def close(self):
+		self._stream.write('}')
+
+
+def _encode(value):
+	value = _JSON_ENCODER(value)
+	if isinstance(value, unicode):
+		value = value.encode('utf-8')
+	return value
+
+
 def dump_database_to_json(notify_cb):
 	""" Dump object in database to json string in GTD sync file format.
 
@@ -110,8 +200,21 @@ def dump_database_to_json(notify_cb):
 	Returns:
 		Data encoded in json format.
 	"""
-	res = {'version': 2}
+	output = io.BytesIO()
+	dump_database(output, notify_cb)
+	return output.getvalue()
+
 
+def dump_database(output, notify_cb):
+	""" Dump object in database to file in GTD sync file format.
+
+	Objects are loaded and encoded in batches, so whole database is never
+	kept in memory.
+
+	Args:
+		output: file-like object to write
+		notify_cb: function called on each step.
+	"""
 	session = objects.Session()
 
 	# pylint: disable=E1101
@@ -124,24 +227,22 @@ def dump_database_to_json(notify_cb):
 	session.commit()  # pylint: disable=E1101
 
 	# dump
-	res['folder'], folders_cache = _dump_folders(session, notify_cb)
-	res['context'], contexts_cache = _dump_contexts(session, notify_cb)
-	res['goal'], goals_cache = _dump_goals(session, notify_cb)
-	res_tasks, tasks_cache = _dump_tasks(session, notify_cb, folders_cache,
-			contexts_cache, goals_cache)
-	res.update(res_tasks)
-	res['tag'], tags_cache = _dump_tags(session, notify_cb)
-	res['tasknote'] = _dump_task_notes(session, notify_cb, tasks_cache)
-	res['task_tag'] = _dump_task_tags(session, notify_cb, tasks_cache,
-			tags_cache)
-	res.update(_dump_notebooks(session, notify_cb, folders_cache))
-	res['syncLog'] = _dump_synclog(session, notify_cb)
+	writer = _JsonWriter(output)
+	writer.write_value('version', 2)
+	_dump_folders(session, notify_cb, writer)
+	_dump_contexts(session, notify_cb, writer)
+	_dump_goals(session, notify_cb, writer)
+	_dump_tasks(session, notify_cb, writer)
+	_dump_tags(session, notify_cb, writer)
+	_dump_task_notes(session, notify_cb, writer)
+	_dump_task_tags(session, notify_cb, writer)
+	_dump_notebooks(session, notify_cb, writer)
+	_dump_synclog(session, notify_cb, writer)
+	writer.close()
 
 	session.commit()  # pylint: disable=E1101
 	notify_cb(80, _("Encoding..."))
 
-	return _JSON_ENCODER(res)
-
 
 def _check_existing_synclock(lock_filename, my_device_id):
 	""" Check if lockfile exists.
@@ -210,226 +311,209 @@ def delete_sync_lock(sync_filename):
 		_LOG.exception('delete_sync_lock error %r', lock_filename)
 
 
-def _dump_folders(session, notify_cb):
+def _dump_dict_items(session, writer, objclass, key, extra_columns=()):
+	""" Dump not deleted folders, contexts, goals or tags.
+
+	Returns:
+		number of dumped items
+	"""
+	cols = objclass.__table__.c
+	rows = _select_items(session, objclass.__table__, [cols.uuid,
+			cols.created, cols.modified, cols.ordinal, cols.title, cols.note,
+			cols.bg_color, cols.visible] + [cols[name] for name
+				in extra_columns],
+			cols.deleted.is_(None))
+
+	def items():
+		for row in rows:
+			item = {'_id': row._id,
+					'parent_id': row.parent_id,
+					'uuid': row.uuid,
+					'created': fmt_date(row.created),
+					'modified': fmt_date(row.modified or row.created),
+					'deleted': '',
+					'ordinal': row.ordinal or 0,
+					'title': row.title or '',
+					'note': row.note or '',
+					'bg_color': row.bg_color or _DEFAULT_BG_COLOR,
+					'visible': row.visible}
+			for name in extra_columns:
+				item[name] = row[name]
+			yield item
+
+	return writer.write_list(key, items())
+
+
+def _dump_relations(writer, key, relkey, rows):
+	""" Dump task_folder, task_context etc. relations.
+
+	Returns:
+		number of dumped relations
+	"""
+	return writer.write_list(key, ({'task_id': row._id,
+			relkey: row.rel_id,
+			'created': fmt_date(row.created),
+			'modified': fmt_date(row.modified or row.created)}
+			for row in rows))
+
+
+def _dump_folders(session, notify_cb, writer):
 	_LOG.info("dump_database_to_json: folders")
 	notify_cb(1, _("Saving folders"))
-	folders_cache = _build_uuid_map(session, objects.Folder)
-	folders = []
-	for obj in session.query(objects.Folder).filter(  # pylint: disable=E1101
-			objects.Folder.deleted.is_(None)):
-		folder = {'_id': folders_cache[obj.uuid],
-				'parent_id': folders_cache[obj.parent_uuid] if obj.parent_uuid
-						else 0,
-				'uuid': obj.uuid,
-				'created': fmt_date(obj.created),
-				'modified': fmt_date(obj.modified or obj.created),
-				'deleted': fmt_date(obj.deleted),
-				'ordinal': obj.ordinal or 0,
-				'title': obj.title or '',
-				'note': obj.note or '',
-				'bg_color': obj.bg_color or _DEFAULT_BG_COLOR,
-				'visible': obj.visible}
-		folders.append(folder)
-	notify_cb(5, _("Saved %d folders") % len(folders))
-	return folders, folders_cache
-
-
-def _dump_contexts(session, notify_cb):
+	count = _dump_dict_items(session, writer, objects.Folder, 'folder')
+	notify_cb(5, _("Saved %d folders") % count)
+
+
+def _dump_contexts(session, notify_cb, writer):
 	_LOG.info("dump_database_to_json: contexts")
 	notify_cb(6, _("Saving contexts"))
-	contexts_cache = _build_uuid_map(session, objects.Context)
-	contexts = []
-	for obj in session.query(objects.Context).filter(  # pylint: disable=E1101
-			objects.Context.deleted.is_(None)):
-		folder = {'_id': contexts_cache[obj.uuid],
-				'parent_id': contexts_cache[obj.parent_uuid] if obj.parent_uuid
-						else 0,
-				'uuid': obj.uuid,
-				'created': fmt_date(obj.created),
-				'modified': fmt_date(obj.modified or obj.created),
-				'deleted': fmt_date(obj.deleted),
-				'ordinal': obj.ordinal or 0,
-				'title': obj.title or '',
-				'note': obj.note or '',
-				'bg_color': obj.bg_color or _DEFAULT_BG_COLOR,
-				'visible': obj.visible}
-		contexts.append(folder)
-	notify_cb(10, _("Saved %d contexts") % len(contexts))
-	return contexts, contexts_cache
-
-
-def _dump_goals(session, notify_cb):
+	count = _dump_dict_items(session, writer, objects.Context, 'context')
+	notify_cb(10, _("Saved %d contexts") % count)
+
+
+def _dump_goals(session, notify_cb, writer):
 	_LOG.info("dump_database_to_json: goals")
 	notify_cb(11, _("Saving goals"))
-	goals_cache = _build_uuid_map(session, objects.Goal)
-	goals = []
-	for obj in session.query(objects.Goal).filter(  # pylint: disable=E1101
-			objects.Goal.deleted.is_(None)):
-		folder = {'_id': goals_cache[obj.uuid],
-				'parent_id': goals_cache[obj.parent_uuid] if obj.parent_uuid
-						else 0,
-				'uuid': obj.uuid,
-				'created': fmt_date(obj.created),
-				'modified': fmt_date(obj.modified or obj.created),
-				'deleted': fmt_date(obj.deleted),
-				'ordinal': obj.ordinal or 0,
-				'title': obj.title or '',
-				'note': obj.note or '',
-				'time_period': obj.time_period,
-				'archived': obj.archived,
-				'bg_color': obj.bg_color or _DEFAULT_BG_COLOR,
-				'visible': obj.visible}
-		goals.append(folder)
-	notify_cb(15, _("Saved %d goals") % len(goals))
-	return goals, goals_cache
-
-
-def _dump_tasks(session, notify_cb, folders_cache, contexts_cache,
-		goals_cache):
+	count = _dump_dict_items(session, writer, objects.Goal, 'goal',
+			('time_period', 'archived'))
+	notify_cb(15, _("Saved %d goals") % count)
+
+
+def _dump_tasks(session, notify_cb, writer):
 	notify_cb(16, _("Saving task, alarms..."))
 	_LOG.info("dump_database_to_json: tasks")
-	tasks_cache = _build_uuid_map(session, objects.Task)
-	tasks = []
-	alarms = []
-	task_folders = []
-	task_contexts = []
-	task_goals = []
-	for task in session.query(objects.Task).filter(  # pylint: disable=E1101
-			objects.Task.deleted.is_(None)):
-		tasks.append({'_id': tasks_cache[task.uuid],
-				'parent_id': tasks_cache[task.parent_uuid] if task.parent_uuid
-						else 0,
-				'uuid': task.uuid,
-				'created': fmt_date(task.created),
-				'modified': fmt_date(task.modified or task.created),
-				'completed': fmt_date(task.completed),
-				'deleted': fmt_date(task.deleted),
-				'ordinal': task.ordinal or 0,
-				'title': task.title or '',
-				'note': task.note or "",
-				'type': task.type or 0,
-				'starred': 1 if task.starred else 0,
-				'status': task.status or 0,
-				'priority': task.priority or 0,
-				'importance': task.importance or 0,
-				'start_date': fmt_date(task.start_date),
-				'start_time_set': task.start_time_set or 0,
-				'due_date': fmt_date(task.due_date),
-				"due_date_project": fmt_date(task.due_date_project),
-				"due_time_set": task.due_time_set or 0,
-				"due_date_mod": task.due_date_mod or 0,
-				"floating_event": task.floating_event,
-				"duration": task.duration or 0,
-				"energy_required": task.energy_required,
-				"repeat_from": task.repeat_from or 0,
-				"repeat_pattern": task.repeat_pattern or "",
-				"repeat_end": task.repeat_end or 0,
-				"hide_pattern": task.hide_pattern or "",
-				"hide_until": fmt_date(task.hide_until),
-				"prevent_auto_purge": task.prevent_auto_purge or 0,
-				"trash_bin": task.trash_bin or 0,
-				"metainf": task.metainf or ''})
-		if task.alarm:
-			alarms.append({'_id': len(alarms),
-					'task_id': tasks_cache[task.uuid],
-					'uuid': objects.generate_uuid(),
-					'created': fmt_date(task.created),
-					'modified': fmt_date(task.modified or task.created),
-					'alarm': fmt_date(task.alarm),
-					'reminder': 0,
-					'active': 1,
-					'note': ""})
-		if task.folder_uuid:
-			task_folders.append({'task_id': tasks_cache[task.uuid],
-					'folder_id': folders_cache[task.folder_uuid],
-					'created': fmt_date(task.created),
-					'modified': fmt_date(task.modified or task.created)})
-		if task.context_uuid:
-			task_contexts.append({'task_id': tasks_cache[task.uuid],
-					'context_id': contexts_cache[task.context_uuid],
-					'created': fmt_date(task.created),
-					'modified': fmt_date(task.modified or task.created)})
-		if task.goal_uuid:
-			task_goals.append({'task_id': tasks_cache[task.uuid],
-					'goal_id': goals_cache[task.goal_uuid],
-					'created': fmt_date(task.created),
-					'modified': fmt_date(task.modified or task.created)})
-	res = {'task': tasks,
-			'alarm': alarms,
-			'task_folder': task_folders,
-			'task_context': task_contexts,
-			'task_goal': task_goals}
-	notify_cb(49, _("Saved %d tasks") % len(tasks))
-	notify_cb(51, _("Saved %d alarms") % len(alarms))
-	notify_cb(52, _("Saved %d task folders") % len(task_folders))
-	notify_cb(53, _("Saved %d task contexts") % len(task_contexts))
-	notify_cb(54, _("Saved %d task goals") % len(task_goals))
-	return res, tasks_cache
-
-
-def _dump_tags(session, notify_cb):
+	tasks = objects.Task.__table__
+	cols = tasks.c
+	not_deleted = cols.deleted.is_(None)
+	rows = _select_items(session, tasks, [cols.uuid, cols.created,
+			cols.modified, cols.completed, cols.ordinal, cols.title,
+			cols.note, cols.type, cols.starred, cols.status, cols.priority,
+			cols.importance, cols.start_date, cols.start_time_set,
+			cols.due_date, cols.due_date_project, cols.due_time_set,
+			cols.due_date_mod, cols.floating_event, cols.duration,
+			cols.energy_required, cols.repeat_from, cols.repeat_pattern,
+			cols.repeat_end, cols.hide_pattern, cols.hide_until,
+			cols.prevent_auto_purge, cols.trash_bin, cols.metainf],
+			not_deleted)
+	count = writer.write_list('task', ({'_id': task._id,
+			'parent_id': task.parent_id,
+			'uuid': task.uuid,
+			'created': fmt_date(task.created),
+			'modified': fmt_date(task.modified or task.created),
+			'completed': fmt_date(task.completed),
+			'deleted': '',
+			'ordinal': task.ordinal or 0,
+			'title': task.title or '',
+			'note': task.note or "",
+			'type': task.type or 0,
+			'starred': 1 if task.starred else 0,
+			'status': task.status or 0,
+			'priority': task.priority or 0,
+			'importance': task.importance or 0,
+			'start_date': fmt_date(task.start_date),
+			'start_time_set': task.start_time_set or 0,
+			'due_date': fmt_date(task.due_date),
+			"due_date_project": fmt_date(task.due_date_project),
+			"due_time_set": task.due_time_set or 0,
+			"due_date_mod": task.due_date_mod or 0,
+			"floating_event": task.floating_event,
+			"duration": task.duration or 0,
+			"energy_required": task.energy_required,
+			"repeat_from": task.repeat_from or 0,
+			"repeat_pattern": task.repeat_pattern or "",
+			"repeat_end": task.repeat_end or 0,
+			"hide_pattern": task.hide_pattern or "",
+			"hide_until": fmt_date(task.hide_until),
+			"prevent_auto_purge": task.prevent_auto_purge or 0,
+			"trash_bin": task.trash_bin or 0,
+			"metainf": task.metainf or ''}
+			for task in rows))
+	notify_cb(49, _("Saved %d tasks") % count)
+	rows = session.execute(select([_rowid(tasks).label("_id"), cols.created,
+			cols.modified, cols.alarm]).where(not_deleted).where(
+				cols.alarm.isnot(None)))
+	count = writer.write_list('alarm', ({'_id': idx,
+			'task_id': row._id,
+			'uuid': objects.generate_uuid(),
+			'created': fmt_date(row.created),
+			'modified': fmt_date(row.modified or row.created),
+			'alarm': fmt_date(row.alarm),
+			'reminder': 0,
+			'active': 1,
+			'note': ""}
+			for idx, row in enumerate(rows)))
+	notify_cb(51, _("Saved %d alarms") % count)
+	folders = objects.Folder.__table__
+	count = _dump_relations(writer, 'task_folder', 'folder_id',
+			_select_relations(session, tasks, cols.folder_uuid, folders,
+				folders.c.uuid, where=not_deleted))
+	notify_cb(52, _("Saved %d task folders") % count)
+	contexts = objects.Context.__table__
+	count = _dump_relations(writer, 'task_context', 'context_id',
+			_select_relations(session, tasks, cols.context_uuid, contexts,
+				contexts.c.uuid, where=not_deleted))
+	notify_cb(53, _("Saved %d task contexts") % count)
+	goals = objects.Goal.__table__
+	count = _dump_relations(writer, 'task_goal', 'goal_id',
+			_select_relations(session, tasks, cols.goal_uuid, goals,
+				goals.c.uuid, where=not_deleted))
+	notify_cb(54, _("Saved %d task goals") % count)
+
+
+def _dump_tags(session, notify_cb, writer):
 	notify_cb(55, _("Saving tags"))
 	# tags
 	_LOG.info("dump_database_to_json: tags")
-	tags_cache = _build_uuid_map(session, objects.Tag)
-	tags = []
-	for obj in session.query(objects.Tag).filter(  # pylint: disable=E1101
-			objects.Tag.deleted.is_(None)):
-		folder = {'_id': tags_cache[obj.uuid],
-				'parent_id': tags_cache[obj.parent_uuid] if obj.parent_uuid
-						else 0,
-				'uuid': obj.uuid,
-				'created': fmt_date(obj.created),
-				'modified': fmt_date(obj.modified or obj.created),
-				'deleted': fmt_date(obj.deleted),
-				'ordinal': obj.ordinal or 0,
-				'title': obj.title or '',
-				'note': obj.note or "",
-				'bg_color': obj.bg_color or _DEFAULT_BG_COLOR,
-				'visible': obj.visible}
-		tags.append(folder)
-	notify_cb(59, _("Saved %d tags") % len(tags))
-	return tags, tags_cache
-
-
-def _dump_task_notes(session, notify_cb, tasks_cache):
+	count = _dump_dict_items(session, writer, objects.Tag, 'tag')
+	notify_cb(59, _("Saved %d tags") % count)
+
+
+def _dump_task_notes(session, notify_cb, writer):
 	notify_cb(60, _("Saving task notes"))
 	# tasknotes
 	_LOG.info("dump_database_to_json: tasknotes")
-	tasknotes_cache = _build_uuid_map(session, objects.Tasknote)
-	tasknotes = []
-	for obj in session.query(objects.Tasknote):  # pylint: disable=E1101
-		folder = {'_id': tasknotes_cache[obj.uuid],
-				'task_id': tasks_cache[obj.task_uuid],
-				'uuid': obj.uuid,
-				'created': fmt_date(obj.created),
-				'modified': fmt_date(obj.modified or obj.created),
-				'ordinal': obj.ordinal or 0,
-				'title': obj.title or '',
-				'bg_color': obj.bg_color or "FFEFFF00",
-				'visible': obj.visible}
-		tasknotes.append(folder)
-	notify_cb(64, _("Saved %d task notes") % len(tasknotes))
-	return tasknotes
-
-
-def _dump_task_tags(session, notify_cb, tasks_cache, tags_cache):
+	tasknotes = objects.Tasknote.__table__
+	tasks = objects.Task.__table__
+	cols = tasknotes.c
+	rows = session.execute(select([_rowid(tasknotes).label("_id"),
+			func.coalesce(_rowid(tasks), 0).label("task_id"), cols.uuid,
+			cols.created, cols.modified, cols.ordinal, cols.title,
+			cols.bg_color, cols.visible],
+			from_obj=[tasknotes.outerjoin(tasks,
+				tasks.c.uuid == cols.task_uuid)]))
+	count = writer.write_list('tasknote', ({'_id': row._id,
+			'task_id': row.task_id,
+			'uuid': row.uuid,
+			'created': fmt_date(row.created),
+			'modified': fmt_date(row.modified or row.created),
+			'ordinal': row.ordinal or 0,
+			'title': row.title or '',
+			'bg_color': row.bg_color or "FFEFFF00",
+			'visible': row.visible} for row in rows))
+	notify_cb(64, _("Saved %d task notes") % count)
+
+
+def _dump_task_tags(session, notify_cb, writer):
 	notify_cb(65, _("Saving task tags"))
-	tasktags = []
-	for obj in session.query(objects.TaskTag):  # pylint: disable=E1101
-		ttag = {'task_id': tasks_cache[obj.task_uuid],
-				'tag_id': tags_cache[obj.tag_uuid],
-				'created': fmt_date(obj.created),
-				'modified': fmt_date(obj.modified or obj.created)}
-		tasktags.append(ttag)
-	notify_cb(69, _("Saved %d task tags") % len(tasktags))
-	return tasktags
-
-
-def _dump_synclog(session, notify_cb):
+	task_tags = objects.TaskTag.__table__
+	tasks = objects.Task.__table__
+	tags = objects.Tag.__table__
+	cols = task_tags.c
+	rows = session.execute(select([_rowid(tasks).label("task_id"),
+			_rowid(tags).label("tag_id"), cols.created, cols.modified],
+			from_obj=[task_tags.join(tasks, tasks.c.uuid == cols.task_uuid)
+				.join(tags, tags.c.uuid == cols.tag_uuid)]))
+	count = writer.write_list('task_tag', ({'task_id': row.task_id,
+			'tag_id': row.tag_id,
+			'created': fmt_date(row.created),
+			'modified': fmt_date(row.modified or row.created)}
+			for row in rows))
+	notify_cb(69, _("Saved %d task tags") % count)
+
+
+def _dump_synclog(session, notify_cb, writer):
 	notify_cb(78, _("Sync log"))
 	# synclog
-	sync_logs = []
 	device_id = session.query(objects.Conf).filter_by(
 			key='deviceId').first().val
 	slog_item = objects.SyncLog.get(session, device_id=device_id)
@@ -441,45 +525,44 @@ def _dump_synclog(session, notify_cb):
 	slog_item.sync_time = datetime.datetime.utcnow()
 	session.add(slog_item)  # pylint: disable=E1101
 
-	for sync_log in session.query(  # pylint: disable=E1101
-			objects.SyncLog).order_by(objects.SyncLog.sync_time):
-		sync_logs.append({
+	writer.write_list('syncLog', ({
 			'deviceId': sync_log.device_id,
 			"prevSyncTime": fmt_date(sync_log.prev_sync_time),
-			"syncTime": fmt_date(sync_log.sync_time)})
-	return sync_logs
+			"syncTime": fmt_date(sync_log.sync_time)}
+			for sync_log in session.query(  # pylint: disable=E1101
+				objects.SyncLog).order_by(objects.SyncLog.sync_time)))
 
 
-def _dump_notebooks(session, notify_cb, folders_cache):
+def _dump_notebooks(session, notify_cb, writer):
 	notify_cb(70, _("Saving notebooks..."))
 	_LOG.info("dump_database_to_json: notebooks")
-	notebooks_cache = _build_uuid_map(session, objects.NotebookPage)
-	notebooks = []
-	notebook_folders = []
-	for notebook in (session.query(objects.NotebookPage)  # pylint: disable=E1101
-			.filter(objects.NotebookPage.deleted.is_(None))):
-		notebooks.append({'_id': notebooks_cache[notebook.uuid],
-				'uuid': notebook.uuid,
-				'created': fmt_date(notebook.created),
-				'modified': fmt_date(notebook.modified or notebook.created),
-				'deleted': fmt_date(notebook.deleted),
-				'ordinal': notebook.ordinal or 0,
-				'title': notebook.title or '',
-				'note': notebook.note or "",
-				'starred': 1 if notebook.starred else 0,
-				'bg_color': notebook.bg_color or "FFEFFF00",
-				'visible': notebook.visible})
-		if notebook.folder_uuid:
-			notebook_folders.append({
-					'notebook_id': notebooks_cache[notebook.uuid],
-					'folder_id': folders_cache[notebook.folder_uuid],
-					'created': fmt_date(notebook.created),
-					'modified': fmt_date(notebook.modified or notebook.created)})
-	res = {'notebook': notebooks,
-			'notebook_folder': notebook_folders}
-	notify_cb(76, _("Saved %d notebooks") % len(notebooks))
-	notify_cb(77, _("Saved %d notebook folders") % len(notebook_folders))
-	return res
+	notebooks = objects.NotebookPage.__table__
+	cols = notebooks.c
+	not_deleted = cols.deleted.is_(None)
+	rows = session.execute(select([_rowid(notebooks).label("_id"), cols.uuid,
+			cols.created, cols.modified, cols.ordinal, cols.title, cols.note,
+			cols.starred, cols.bg_color, cols.visible]).where(not_deleted))
+	count = writer.write_list('notebook', ({'_id': row._id,
+			'uuid': row.uuid,
+			'created': fmt_date(row.created),
+			'modified': fmt_date(row.modified or row.created),
+			'deleted': '',
+			'ordinal': row.ordinal or 0,
+			'title': row.title or '',
+			'note': row.note or "",
+			'starred': 1 if row.starred else 0,
+			'bg_color': row.bg_color or "FFEFFF00",
+			'visible': row.visible} for row in rows))
+	notify_cb(76, _("Saved %d notebooks") % count)
+	folders = objects.Folder.__table__
+	rows = _select_relations(session, notebooks, cols.folder_uuid, folders,
+			folders.c.uuid, where=not_deleted)
+	count = writer.write_list('notebook_folder', ({'notebook_id': row._id,
+			'folder_id': row.rel_id,
+			'created': fmt_date(row.created),
+			'modified': fmt_date(row.modified or row.created)}
+			for row in rows))
+	notify_cb(77, _("Saved %d notebook folders") % count)
 
 
 def dump_tasks_to_csv(tasks, verbose, output=sys.stdout):
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=R0904, C0103
+""" Tests for exporter module.
+"""
+
+__author__ = "Karol Będkowski"
+__copyright__ = "Copyright (c) Karol Będkowski, 2013"
+__version__ = "2013-06-02"
+
+import os
+import json
+import shutil
+import zipfile
+import datetime
+import tempfile
+from unittest import main, TestCase
+
+from . import db
+from . import objects as OBJ
+from . import exporter
+
+
+class TestExport(TestCase):
+
+	def setUp(self):
+		db.connect(':memory:')
+		self.session = OBJ.Session()
+		self.tmpdir = tempfile.mkdtemp()
+
+	def tearDown(self):
+		self.session.close()
+		shutil.rmtree(self.tmpdir)
+
+	def test_save_to_zip(self):
+		session = self.session
+		session.add(OBJ.Folder(uuid='f1', title=u'fołder'))
+		session.add(OBJ.Task(uuid='t1', title=u'tąsk', folder_uuid='f1',
+				alarm=datetime.datetime(2013, 6, 1, 10, 0, 0, 123000)))
+		session.add(OBJ.Task(uuid='t2', title='deleted',
+				deleted=datetime.datetime(2013, 6, 1)))
+		session.commit()
+		filename = os.path.join(self.tmpdir, 'sync.zip')
+		exporter.save_to_file(filename, internal_fname='GTD_SYNC.json')
+		with zipfile.ZipFile(filename) as zfile:
+			self.assertEqual(zfile.namelist(), ['GTD_SYNC.json'])
+			data = json.loads(zfile.read('GTD_SYNC.json'))
+		self.assertEqual(data['version'], 2)
+		self.assertEqual([task['title'] for task in data['task']], [u'tąsk'])
+		self.assertEqual(data['task_folder'][0]['folder_id'],
+				data['folder'][0]['_id'])
+		self.assertEqual(data['alarm'][0]['alarm'], '2013-06-01T10:00:00.123Z')
+		self.assertEqual(data['task_tag'], [])
+		self.assertEqual(len(data['syncLog']), 1)
+
+
+if __name__ == '__main__':
+	main()
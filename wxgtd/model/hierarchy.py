@@ -0,0 +1,156 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+""" Queries for tasks hierarchy.
+
+All functions load whole hierarchy (ancestors, tree, subtree) in one
+recursive query instead of walking tasks one by one.
+
+Copyright (c) Karol Będkowski, 2013
+
+This file is part of wxGTD
+Licence: GPLv2+
+"""
+__author__ = "Karol Będkowski"
+__copyright__ = "Copyright (c) Karol Będkowski, 2013"
+__version__ = "2013-06-02"
+
+import logging
+
+from sqlalchemy import text
+from sqlalchemy import orm
+
+from wxgtd.model import objects as OBJ
+from wxgtd.model import enums
+
+_LOG = logging.getLogger(__name__)
+
+# protection against cycles in hierarchy
+_MAX_DEPTH = 100
+
+# Recursive queries are wrapped in subquery, so each statement begins with
+# SELECT; python sqlite3 module commits current transaction before other
+# statements (like WITH ...) and then don't return rows.
+
+_ANCESTORS_SQL = """SELECT start_uuid, uuid, title FROM (
+WITH RECURSIVE ancestors(start_uuid, uuid, parent_uuid, title, depth) AS (
+	SELECT uuid, uuid, parent_uuid, title, 0 FROM tasks WHERE uuid IN (%s)
+	UNION ALL
+	SELECT a.start_uuid, t.uuid, t.parent_uuid, t.title, a.depth + 1
+	FROM tasks t JOIN ancestors a ON t.uuid = a.parent_uuid
+	WHERE a.depth < :max_depth)
+SELECT start_uuid, uuid, title, depth FROM ancestors)
+WHERE depth >= :min_depth
+ORDER BY start_uuid, depth DESC"""
+
+_PROJECTS_TREE_SQL = """SELECT uuid, parent_uuid, title, type FROM (
+WITH RECURSIVE projects(uuid, parent_uuid, title, type, depth) AS (
+	SELECT uuid, parent_uuid, title, type, 0 FROM tasks
+	WHERE parent_uuid IS NULL AND deleted IS NULL
+		AND type IN (:project, :checklist)
+	UNION ALL
+	SELECT t.uuid, t.parent_uuid, t.title, t.type, p.depth + 1
+	FROM tasks t JOIN projects p ON t.parent_uuid = p.uuid
+	WHERE t.deleted IS NULL AND t.type IN (:project, :checklist)
+		AND p.depth < :max_depth)
+SELECT uuid, parent_uuid, title, type, depth FROM projects)
+ORDER BY depth, title"""
+
+_SUBTREE_SQL = """SELECT uuid, parent_uuid FROM (
+WITH RECURSIVE subtree(uuid, parent_uuid, depth) AS (
+	SELECT uuid, parent_uuid, 0 FROM tasks WHERE uuid = :uuid
+	UNION ALL
+	SELECT t.uuid, t.parent_uuid, s.depth + 1
+	FROM tasks t JOIN subtree s ON t.parent_uuid = s.uuid
+	WHERE s.depth < :max_depth)
+SELECT uuid, parent_uuid, depth FROM subtree)
+WHERE depth >= :min_depth
+ORDER BY depth"""
+
+
+def ancestors(uuids, session=None, include_self=False):
+	""" Find all ancestors of given tasks.
+
+	Args:
+		uuids: list of tasks uuid
+		session: optional sqlalchemy session
+		include_self: include given tasks in result
+
+	Returns:
+		Dict task uuid -> list of (uuid, title) of ancestors; first is root
+		task.
+	"""
+	session = session or OBJ.Session()
+	uuids = list(uuids)
+	result = dict((uuid, []) for uuid in uuids)
+	for idx in xrange(0, len(uuids), OBJ.MAX_IN_VALUES):
+		chunk = uuids[idx:idx + OBJ.MAX_IN_VALUES]
+		params = dict(('uuid%d' % num, uuid) for num, uuid in enumerate(chunk))
+		params['max_depth'] = _MAX_DEPTH
+		params['min_depth'] = 0 if include_self else 1
+		sql = _ANCESTORS_SQL % ", ".join(':uuid%d' % num
+				for num in xrange(len(chunk)))
+		for start_uuid, uuid, title in session.execute(text(sql), params):
+			result[start_uuid].append((uuid, title))
+	return result
+
+
+def projects_tree(session=None):
+	""" Load tree of all not deleted projects and checklists.
+
+	Subprojects of deleted projects are skipped.
+
+	Args:
+		session: optional sqlalchemy session
+
+	Returns:
+		List of (uuid, parent_uuid, title, type) ordered by level in tree
+		and title, so parent is always before its children.
+	"""
+	session = session or OBJ.Session()
+	return [tuple(row) for row in session.execute(text(_PROJECTS_TREE_SQL),
+		{'project': enums.TYPE_PROJECT, 'checklist': enums.TYPE_CHECKLIST,
+			'max_depth': _MAX_DEPTH})]
+
+
+def subtree(uuid, session=None, include_self=False):
+	""" Find all descendants of task.
+
+	Args:
+		uuid: task uuid
+		session: optional sqlalchemy session
+		include_self: include given tasks in result
+
+	Returns:
+		List of (uuid, parent_uuid) ordered by level in tree.
+	"""
+	session = session or OBJ.Session()
+	return [tuple(row) for row in session.execute(text(_SUBTREE_SQL),
+		{'uuid': uuid, 'max_depth': _MAX_DEPTH,
+			'min_depth': 0 if include_self else 1})]
+
+
+def preload_subtree(task, session=None):
+	""" Load all descendants of task and fill its `children` collections.
+
+	Collections already loaded are not changed.
+
+	Args:
+		task: Task object
+		session: optional sqlalchemy session
+	"""
+	if not orm.attributes.instance_state(task).has_identity:
+		# new task; no children in database
+		return
+	session = session or OBJ.Session.object_session(task) or OBJ.Session()
+	query = session.query(OBJ.Task).from_statement(text(
+			"SELECT tasks.* FROM tasks WHERE tasks.uuid IN "
+			"(SELECT uuid FROM (" + _SUBTREE_SQL + "))"))
+	descendants = query.params(uuid=task.uuid, max_depth=_MAX_DEPTH,
+			min_depth=1).all()
+	children = {}
+	for subtask in descendants:
+		children.setdefault(subtask.parent_uuid, []).append(subtask)
+	for obj in [task] + descendants:
+		if 'children' not in orm.attributes.instance_state(obj).dict:
+			orm.attributes.set_committed_value(obj, 'children',
+					children.get(obj.uuid, []))
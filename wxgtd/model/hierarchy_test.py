@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=R0904, C0103
+""" Tests for hierarchy module.
+"""
+
+__author__ = "Karol Będkowski"
+__copyright__ = "Copyright (c) Karol Będkowski, 2013"
+__version__ = "2013-06-02"
+
+import datetime
+from unittest import main, TestCase
+
+from sqlalchemy import or_, orm
+
+from wxgtd.logic import task as task_logic
+
+from . import db
+from . import enums
+from . import objects as OBJ
+from . import hierarchy
+
+
+def _old_projects_tree(session):
+	""" Projects tree loaded like in old Task.root_projects_checklists and
+	Task.sub_project_or_checklists; returns dict parent -> children uuids.
+	"""
+	def query():
+		return session.query(OBJ.Task).filter(OBJ.Task.deleted.is_(None),
+				or_(OBJ.Task.type == enums.TYPE_CHECKLIST,
+					OBJ.Task.type == enums.TYPE_PROJECT)).order_by(
+							OBJ.Task.title)
+
+	result = {}
+
+	def walk(parent_uuid):
+		children = [task.uuid for task in query().filter(
+				OBJ.Task.parent_uuid == parent_uuid)]
+		result[parent_uuid] = children
+		for uuid in children:
+			walk(uuid)
+
+	result[None] = [task.uuid for task in query().filter(
+			OBJ.Task.parent_uuid.is_(None))]
+	for uuid in result[None]:
+		walk(uuid)
+	return dict((key, val) for key, val in result.iteritems() if val)
+
+
+class TestHierarchy(TestCase):
+
+	def setUp(self):
+		db.connect(':memory:')
+		self.session = OBJ.Session()
+		deleted = datetime.datetime(2013, 6, 1)
+		self._add('beta', 'Beta', enums.TYPE_PROJECT)
+		self._add('sub', 'b sub', enums.TYPE_PROJECT, 'beta')
+		self._add('sub_task', 'task in sub', enums.TYPE_TASK, 'sub')
+		self._add('list', 'a checklist', enums.TYPE_CHECKLIST, 'beta')
+		self._add('item', 'item', enums.TYPE_CHECKLIST_ITEM, 'list')
+		self._add('task', 'task', enums.TYPE_TASK, 'beta')
+		self._add('del_sub', 'deleted sub', enums.TYPE_PROJECT, 'beta',
+				deleted=deleted)
+		self._add('del_sub_sub', 'in deleted', enums.TYPE_PROJECT, 'del_sub')
+		self._add('alpha', 'Alpha', enums.TYPE_CHECKLIST)
+		self._add('root_task', 'root task', enums.TYPE_TASK)
+		self._add('gamma', 'Gamma', enums.TYPE_PROJECT, deleted=deleted)
+		self.session.commit()
+
+	def tearDown(self):
+		self.session.close()
+
+	def _add(self, uuid, title, ttype, parent=None, **kwargs):
+		task = OBJ.Task(uuid=uuid, title=title, type=ttype,
+				parent_uuid=parent, **kwargs)
+		self.session.add(task)
+		self.session.flush()
+		return task
+
+	def test_projects_tree(self):
+		tree = hierarchy.projects_tree(self.session)
+		self.assertEqual([row[0] for row in tree],
+				['alpha', 'beta', 'list', 'sub'])
+		self.assertEqual(tree[2], ('list', 'beta', 'a checklist',
+				enums.TYPE_CHECKLIST))
+		# the same items and order of children as in old queries
+		children = {}
+		for uuid, parent_uuid, _title, _type in tree:
+			children.setdefault(parent_uuid, []).append(uuid)
+		self.assertEqual(children, _old_projects_tree(self.session))
+
+	def test_subtree(self):
+		subtree = hierarchy.subtree('beta', self.session)
+		# children before grandchildren
+		self.assertEqual(sorted(subtree[:4]), [('del_sub', 'beta'),
+				('list', 'beta'), ('sub', 'beta'), ('task', 'beta')])
+		self.assertEqual(sorted(subtree[4:]), [('del_sub_sub', 'del_sub'),
+				('item', 'list'), ('sub_task', 'sub')])
+		subtree = hierarchy.subtree('sub', self.session, include_self=True)
+		self.assertEqual(subtree, [('sub', 'beta'), ('sub_task', 'sub')])
+		self.assertEqual(hierarchy.subtree('task', self.session), [])
+
+	def test_preload_subtree_after_flush(self):
+		session = self.session
+		session.expire_all()
+		# pending (flushed, not committed) changes
+		self._add('new', 'new', enums.TYPE_TASK, 'sub')
+		session.query(OBJ.Task).filter_by(uuid='item').one().parent_uuid = \
+				'sub'
+		session.flush()
+		beta = OBJ.Task.get(session, uuid='beta')
+		hierarchy.preload_subtree(beta, session)
+		sub = OBJ.Task.get(session, uuid='sub')
+		for task in (beta, sub):
+			self.assertIn('children', orm.attributes.instance_state(task).dict)
+		self.assertEqual(sorted(task.uuid for task in beta.children),
+				['del_sub', 'list', 'sub', 'task'])
+		self.assertEqual(sorted(task.uuid for task in sub.children),
+				['item', 'new', 'sub_task'])
+		self.assertEqual(OBJ.Task.get(session, uuid='list').children, [])
+		# query don't commit pending changes
+		session.rollback()
+		self.assertEqual(OBJ.Task.get(session, uuid='new'), None)
+		self.assertEqual(OBJ.Task.get(session, uuid='item').parent_uuid,
+				'list')
+
+	def test_adjust_task_type(self):
+		session = self.session
+		session.expire_all()
+		sub = OBJ.Task.get(session, uuid='sub')
+		self._add('sub_list', 'list in sub', enums.TYPE_CHECKLIST, 'sub')
+		session.expire(sub, ['children'])
+		sub.type = enums.TYPE_TASK
+		task_logic.adjust_task_type(sub, session)
+		session.commit()
+		session.expire_all()
+		# children of task moved to parent
+		self.assertEqual(OBJ.Task.get(session, uuid='sub').children, [])
+		sub_task = OBJ.Task.get(session, uuid='sub_task')
+		self.assertEqual(sub_task.parent_uuid, 'beta')
+		self.assertEqual(sub_task.type, enums.TYPE_TASK)
+		self.assertEqual(OBJ.Task.get(session, uuid='sub_list').parent_uuid,
+				'beta')
+		self.assertEqual(sorted(row[0] for row in hierarchy.subtree('beta',
+				session) if row[1] == 'beta'), ['del_sub', 'list', 'sub',
+				'sub_list', 'sub_task', 'task'])
+
+
+if __name__ == '__main__':
+	main()
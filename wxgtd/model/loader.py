@@ -14,10 +14,13 @@ __copyright__ = "Copyright (c) Karol Będkowski, 2013"
 __version__ = "2013-05-20"
 
 import os
+import io
 import logging
 import zipfile
+import tempfile
 import gettext
 import datetime
+import itertools
 try:
 	import cjson
 	_JSON_DECODER = cjson.decode
@@ -27,9 +30,11 @@ except ImportError:
 	_JSON_DECODER = json.loads
 	_JSON_ENCODER = json.dumps
 
-from dateutil import parser, tz
-from sqlalchemy import func
+from sqlalchemy import func, bindparam, and_, select
+from sqlalchemy import Table, MetaData, Column, String
 
+from wxgtd.lib import jsonstream
+from wxgtd.lib import timestamp_codec
 from wxgtd.model import objects
 from wxgtd.model import enums
 from wxgtd.logic import task as task_logic
@@ -37,18 +42,34 @@ from wxgtd.logic import task as task_logic
 _LOG = logging.getLogger(__name__)
 _ = gettext.gettext
 
+# size of data read from file at once
+CHUNK_SIZE = jsonstream.CHUNK_SIZE
+# max size of raw section kept in memory (waiting for load); bigger sections
+# are stored in temporary files
+SECTION_MEMORY_LIMIT = 4 * 1024 * 1024
+
+# uuids of loaded objects; objects not in this table are removed on cleanup
+_LOADED_UUIDS = Table('loaded_uuids', MetaData(),
+		Column('uuid', String(36), primary_key=True),
+		prefixes=['TEMPORARY'])
+
 
 def _fake_update_func(*args, **kwargs):
 	_LOG.info("progress %r %r", args, kwargs)
 
 
-def load_from_file(filename, notify_cb=_fake_update_func, force=False):
+def load_from_file(filename, notify_cb=_fake_update_func, force=False,
+		chunk_size=CHUNK_SIZE, memory_limit=SECTION_MEMORY_LIMIT):
 	"""Load data from (zip)file.
 
+	File is read incrementally (see `load_stream`).
+
 	Args:
 		filename: file to load
 		notify_cb: function called in each step.
 		force: don't check timestamps in synclog; always sync
+		chunk_size: size of data read from file at once
+		memory_limit: max size of raw section kept in memory
 
 	Returns:
 		True if success.
@@ -59,40 +80,234 @@ def load_from_file(filename, notify_cb=_fake_update_func, force=False):
 	notify_cb(2, _("Openning file"))
 	if filename.endswith(".zip"):
 		with zipfile.ZipFile(filename, "r") as zfile:
-			fname = zfile.namelist()[0]
-			return load_json(zfile.read(fname), notify_cb, force)
+			zinfo = zfile.infolist()[0]
+			ifile = zfile.open(zinfo)
+			try:
+				return load_stream(ifile, zinfo.file_size, notify_cb, force,
+						chunk_size, memory_limit)
+			finally:
+				ifile.close()
 	else:
-		with open(filename, "r") as ifile:
-			return load_json(ifile.read(), notify_cb, force)
+		with open(filename, "rb") as ifile:
+			return load_stream(ifile, os.path.getsize(filename), notify_cb,
+					force, chunk_size, memory_limit)
 	return False
 
 
-def _create_or_update(session, cls, datadict):
-	""" Create object given class or update existing with loaded data.
+class _StreamData(object):
+	""" Dict-like, read-only access to sections of sync file.
+
+	Sections are read from stream when requested.  Sections read before are
+	kept as raw json (in memory or temporary files when bigger than
+	memory_limit) and decoded when requested.
+	"""
+
+	def __init__(self, fileobj, memory_limit, chunk_size, progress_cb):
+		self._memory_limit = memory_limit
+		self._progress_cb = progress_cb
+		self._reader = jsonstream.SectionsReader(fileobj, self._create_sink,
+				chunk_size)
+		self._sections = iter(self._reader)
+		self._raw = {}  # key -> file with raw json
+		self._decoded = {}  # key -> decoded value
+		self._eof = False
+
+	def _create_sink(self, _key):
+		return tempfile.SpooledTemporaryFile(max_size=self._memory_limit)
+
+	def _read_until(self, key):
+		""" Read sections from stream until `key` is found. """
+		while not self._eof and key not in self._raw and \
+				key not in self._decoded:
+			try:
+				name, sink = next(self._sections)
+			except StopIteration:
+				self._eof = True
+				break
+			self._raw[name] = sink
+			self._progress_cb(self._reader.bytes_read)
+
+	def get(self, key, default=None):
+		if key not in self._decoded:
+			self._read_until(key)
+			raw = self._raw.pop(key, None)
+			if raw is None:
+				return default
+			raw.seek(0)
+			self._decoded[key] = _JSON_DECODER(raw.read().decode("UTF-8"))
+			raw.close()
+		return self._decoded[key]
+
+	def __getitem__(self, key):
+		if key not in self:
+			raise KeyError(key)
+		return self.get(key)
+
+	def __delitem__(self, key):
+		self._read_until(key)
+		self._decoded.pop(key, None)
+		raw = self._raw.pop(key, None)
+		if raw is not None:
+			raw.close()
+
+	def __contains__(self, key):
+		self._read_until(key)
+		return key in self._decoded or key in self._raw
+
+	def keys(self):
+		self._read_until(None)
+		return self._decoded.keys() + self._raw.keys()
+
+	def __len__(self):
+		return len(self.keys())
+
+	def __repr__(self):
+		return '<_StreamData %r>' % self.keys()
+
+
+class _ProgressByBytes(object):
+	""" Wrapper for notify_cb that report progress (< 80%) of loading
+	by number of bytes read from file. """
+	# pylint: disable=R0903
+
+	def __init__(self, notify_cb, size):
+		self._notify_cb = notify_cb
+		self._size = max(size, 1)
+		self._progress = 2
+		self._msg = None
+
+	def __call__(self, progress, msg=None):
+		if isinstance(progress, (int, long)) and progress >= 80:
+			self._notify_cb(progress, msg)
+			return
+		if msg is not None:
+			self._msg = msg
+			self._notify_cb(self._progress, msg)
+
+	def bytes_read(self, bytes_read):
+		progress = 2 + 77 * min(bytes_read, self._size) / self._size
+		if progress > self._progress:
+			self._progress = progress
+			self._notify_cb(progress, self._msg)
+
+
+def load_stream(fileobj, size, notify_cb, force=False, chunk_size=CHUNK_SIZE,
+		memory_limit=SECTION_MEMORY_LIMIT):
+	""" Load data from file-like object with json data.
+
+	Data are read incrementally; each section (i.e. "task") is decoded
+	when needed and released after load.
+
+	Args:
+		fileobj: file-like object
+		size: size of data (for progress)
+		notify_cb: function called on each step.
+		force: don't check timestamps in synclog; always sync
+		chunk_size: size of data read from file at once
+		memory_limit: max size of raw section kept in memory
+
+	Returns:
+		true if success.
+	"""
+	progress = _ProgressByBytes(notify_cb, size)
+	data = _StreamData(fileobj, memory_limit, chunk_size,
+			progress.bytes_read)
+	return _load_data(data, progress, force)
+
+
+class _Record(object):
+	""" Access to loaded data (dict) by attributes (like to objects). """
+	# pylint: disable=R0903
+
+	def __init__(self, data):
+		self.__dict__['_data'] = data
+
+	def __getattr__(self, key):
+		return self._data.get(key)
+
+	def __setattr__(self, key, value):
+		self._data[key] = value
+
+	def __repr__(self):
+		return '<_Record %r>' % self._data
+
+
+def _bulk_create_or_update(session, cls, records, prepare=None,
+		extra_columns=()):
+	""" Create objects of given class or update existing with loaded data.
+
+	Uuid and modification time of all existing objects are loaded in one
+	query; records newer than existing objects are written by executemany
+	inserts/updates (without creating objects).
 
 	Args:
 		session: sqlalchemy session
-		cls: class object to load/created.
-		datadict: data (dict) to set in object
+		cls: class of objects to load/create.
+		records: list of loaded data (dicts); must be sorted by parent
+		prepare: optional function called with _Record for each created or
+			updated object before write
+		extra_columns: names of additional columns loaded for existing
+			objects (and set to None for new) before calling `prepare`
 
 	Returns:
-		Updated or created object.
+		Index of all objects: dict uuid -> dict with modified and
+		extra_columns values (after load).
 	"""
-	_LOG.debug("_create_or_update(%r, %r)", cls, datadict.get("_id", datadict))
-	uuid = datadict.pop("uuid")
-	obj = session.query(cls).filter_by(uuid=uuid).first()
-	if obj:
-		modified = datadict.get("modified")
-		if not modified or modified > obj.modified:
-			# load only modified objs
-			_LOG.debug('_create_or_update(%r, %r): update', cls, uuid)
-			obj.load_from_dict(datadict)
-	else:
-		_LOG.debug('_create_or_update(%r, %r): create', cls, uuid)
-		obj = cls(uuid=uuid)
-		obj.load_from_dict(datadict)
-		session.add(obj)
-	return obj
+	table = cls.__table__
+	columns = set(table.c.keys())
+	names = ("modified", ) + tuple(extra_columns)
+	query = session.query(cls.uuid, *[getattr(cls, col) for col in names])
+	index = dict((row[0], dict(zip(names, row[1:]))) for row in query)
+	inserts, updates = [], []
+	for record in records:
+		uuid = record.pop("uuid")
+		values = dict((key, val) for key, val in record.iteritems()
+				if key in columns)
+		current = index.get(uuid)
+		if current is None:
+			values['uuid'] = uuid
+			for col in extra_columns:
+				values.setdefault(col, None)
+			rows = inserts
+			current = index[uuid] = {}
+		else:
+			modified = record.get("modified")
+			if modified and current["modified"] and \
+					modified <= current["modified"]:
+				# load only modified objs
+				continue
+			values['_uuid'] = uuid
+			for col in extra_columns:
+				values.setdefault(col, current[col])
+			rows = updates
+		if prepare:
+			prepare(_Record(values))
+		current.update((name, values.get(name, current.get(name)))
+				for name in names)
+		rows.append(values)
+	_LOG.debug('_bulk_create_or_update(%r): insert=%d update=%d skip=%d',
+			cls, len(inserts), len(updates),
+			len(records) - len(inserts) - len(updates))
+	_executemany(session, table.insert(), inserts)
+	_update_by_uuid(session, cls, updates)
+	return index
+
+
+def _update_by_uuid(session, cls, rows):
+	""" Update objects; each row should contain uuid of object in "_uuid"
+	key and values of columns to set. """
+	table = cls.__table__
+	_executemany(session, table.update().where(
+			table.c.uuid == bindparam('_uuid')), rows)
+
+
+def _executemany(session, stmt, rows):
+	""" Execute statement for each group of rows with the same keys.
+
+	Order of rows is preserved.
+	"""
+	for _keys, group in itertools.groupby(rows, lambda row: sorted(row)):
+		session.execute(stmt, list(group))
 
 
 def _replace_ids(objdict, cache, key_id, key_uuid=None):
@@ -125,26 +340,8 @@ def _replace_ids(objdict, cache, key_id, key_uuid=None):
 	return res
 
 
-def str2datetime_utc(string):
-	""" Convert string like "2013-03-22T21:27:46.461Z" into timestamp.
-
-	Args:
-		string: string to convert
-
-	Returns:
-		Timestamp as long or None if error.
-	"""
-	if string and len(string) > 18:
-		try:
-			value = parser.parse(string)
-			# convert to UTC
-			value = value.astimezone(tz.tzutc())
-			# remove timezone
-			return value.replace(tzinfo=None)
-		except ValueError:
-			_LOG.exception("str2datetime_utc %r", string)
-	_LOG.error("Wrong string %r", string)
-	return None
+# Convert string like "2013-03-22T21:27:46.461Z" into datetime (UTC).
+str2datetime_utc = timestamp_codec.decode
 
 
 def _convert_timestamps(dictobj, *fields):
@@ -156,90 +353,94 @@ def _convert_timestamps(dictobj, *fields):
 		dictobj: loaded object as dict
 		fields: list of additional fields to convert
 	"""
-	_LOG.error("fields=%r", fields)
-
-	def convert(fld):
+	decode = timestamp_codec.decode
+	for fld in itertools.chain(("created", "modified", "deleted"), fields):
 		value = dictobj.get(fld)
 		if value is None:
 			_LOG.debug("Missing field %r in %r", fld, dictobj)
-			return
 		elif value:
-			value = str2datetime_utc(value)
-		dictobj[fld] = value or None
+			dictobj[fld] = decode(value)
+		else:
+			dictobj[fld] = None
 
-	for field in ("created", "modified", "deleted"):
-		convert(field)
-	for field in fields:
-		convert(field)
+
+def _store_loaded_uuids(session, *caches):
+	""" Put uuids of all loaded objects into temporary table used by cleanup.
+
+	Args:
+		session: SqlAlchemy session
+		caches: dicts id -> uuid of loaded objects
+	"""
+	conn = session.connection()
+	_LOADED_UUIDS.create(conn, checkfirst=True)
+	conn.execute(_LOADED_UUIDS.delete())
+	uuids = set()
+	for cache in caches:
+		uuids.update(cache.itervalues())
+	uuids.discard(None)
+	if uuids:
+		conn.execute(_LOADED_UUIDS.insert(),
+				[{'uuid': uuid} for uuid in uuids])
+
+
+def _drop_loaded_uuids(session):
+	_LOADED_UUIDS.drop(session.connection(), checkfirst=True)
+
+
+def _delete_not_loaded(objcls, query):
+	""" Mark as deleted (or delete) objects from query that are not in
+	_LOADED_UUIDS table.
+
+	Returns:
+		number of deleted objects.
+	"""
+	query = query.filter(~objcls.uuid.in_(select([_LOADED_UUIDS.c.uuid])))
+	if hasattr(objcls, 'deleted'):
+		return query.filter(objcls.deleted.is_(None)).update(
+				{'deleted': datetime.datetime.now()},
+				synchronize_session=False)
+	return query.delete(synchronize_session=False)
 
 
-def _cleanup_tasks(loaded_tasks, last_sync, session):
+def _cleanup_tasks(last_sync, session):
 	""" Remove old (removed) tasks.
 	Args:
-		loaded_tasks: list of uuids loaded object to keep
 		last_sync: items with modification older that this date will be deleted.
 		session: SqlAlchemy session.
 	Returns:
 		number of deleted tasks.
 	"""
 	_LOG.info("_cleanup_tasks()")
-	idx = 0
-	for task in objects.Task.selecy_by_modified_is_less(last_sync,
-			session=session):
-		if task.uuid not in loaded_tasks and not task.deleted:
-			_LOG.info("_cleanup_tasks: delete task %r", task.uuid)
-			_LOG.debug("_cleanup_tasks: delete task %r", task)
-			task.deleted = datetime.datetime.now()
-			idx += 1
-	return idx
+	return _delete_not_loaded(objects.Task,
+			objects.Task.selecy_by_modified_is_less(last_sync, session=session))
 
 
-def _cleanup_notebooks(loaded_notebooks, last_sync, session):
+def _cleanup_notebooks(last_sync, session):
 	""" Remove old (removed) notebook pages.
 	Args:
-		loaded_tasks: list of uuids loaded object to keep
 		last_sync: items with modification older that this date will be deleted.
 		session: SqlAlchemy session.
 	Returns:
 		number of deleted pages.
 	"""
 	_LOG.info("_cleanup_notebooks()")
-	idx = 0
-	for page in objects.NotebookPage.selecy_by_modified_is_less(last_sync,
-			session=session):
-		if page.uuid not in loaded_notebooks and not page.deleted:
-			_LOG.info("_cleanup_notebooks: delete page %r", page.uuid)
-			_LOG.debug("_cleanup_notebooks: delete page %r", page)
-			page.deleted = datetime.datetime.now()
-			idx += 1
-	return idx
+	return _delete_not_loaded(objects.NotebookPage,
+			objects.NotebookPage.selecy_by_modified_is_less(last_sync,
+				session=session))
 
 
-def _cleanup_unused(objcls, loaded_cache, last_sync, session):
+def _cleanup_unused(objcls, last_sync, session):
 	""" Remove old (removed) and not used folders.
 	Args:
 		objcls: class object to search & delete
-		loaded_cache: cache with uuids loaded object to keep
 		last_sync: items with modification older that this date will be deleted.
 		session: SqlAlchemy session.
 	Returns:
 		number of deleted objects.
 	"""
 	_LOG.info("_cleanup_unused(%r)", objcls)
-	loaded = set(loaded_cache.itervalues())
-	idx = 0
-	for obj in objcls.select_old_usunsed(last_sync,
-			session=session):
-		if obj.uuid not in loaded:
-			_LOG.info("_cleanup_unused: %r delete  %r", objcls, obj.uuid)
-			_LOG.debug("_cleanup_unused: %r delete  %r", objcls, obj)
-			if hasattr(obj, 'deleted'):
-				if obj.deleted:
-					continue
-				obj.deleted = datetime.datetime.now()
-			else:
-				session.delete(obj)
-			idx += 1
+	idx = _delete_not_loaded(objcls,
+			objcls.select_old_usunsed(last_sync, session=session))
 	_LOG.info("_cleanup_unused(%r): deleted=%d", objcls, idx)
 	return idx
 
@@ -317,8 +518,19 @@ def load_json(strdata, notify_cb, force=False):
 	Returns:
 		true if success.
 	"""
-	notify_cb(10, _("Decoding.."))
-	data = _JSON_DECODER(strdata.decode("UTF-8"))
+	return load_stream(io.BytesIO(strdata), len(strdata), notify_cb, force)
+
+
+def _load_data(data, notify_cb, force):
+	""" Load data from dict-like object.
+
+	Args:
+		data: dict or _StreamData
+		notify_cb: function called on each step.
+
+	Returns:
+		true if success.
+	"""
 	session = objects.Session()
 
 	notify_cb(15, _("Checking..."))
@@ -331,17 +543,21 @@ def load_json(strdata, notify_cb, force=False):
 	folders_cache = _load_folders(data, session, notify_cb)
 	contexts_cache = _load_contexts(data, session, notify_cb)
 	goals_cache = _load_goals(data, session, notify_cb)
-	tasks_cache = _load_tasks(data, session, notify_cb)
+	tasks_cache, tasks_index = _load_tasks(data, session, notify_cb)
 	tasknotes_cache = _load_tasknotes(data, session, tasks_cache, notify_cb)
-	_load_alarms(data, session, tasks_cache, notify_cb)
-	_load_task_folders(data, session, tasks_cache, folders_cache, notify_cb)
-	_load_task_contexts(data, session, tasks_cache, contexts_cache, notify_cb)
-	_load_task_goals(data, session, tasks_cache, goals_cache, notify_cb)
+	_load_alarms(data, session, tasks_cache, tasks_index, notify_cb)
+	_load_task_folders(data, session, tasks_cache, tasks_index, folders_cache,
+			notify_cb)
+	_load_task_contexts(data, session, tasks_cache, tasks_index,
+			contexts_cache, notify_cb)
+	_load_task_goals(data, session, tasks_cache, tasks_index, goals_cache,
+			notify_cb)
 	tags_cache = _load_tags(data, session, notify_cb)
 	_load_task_tags(data, session, tasks_cache, tags_cache, notify_cb)
-	notebooks_cache = _load_notebooks(data, session, notify_cb)
-	_load_notebook_folders(data, session, notebooks_cache, folders_cache,
+	notebooks_cache, notebooks_index = _load_notebooks(data, session,
 			notify_cb)
+	_load_notebook_folders(data, session, notebooks_cache, notebooks_index,
+			folders_cache, notify_cb)
 	_load_synclog(data, session, notify_cb)
 
 	my_dev_id = session.query(  # pylint: disable=E1101
@@ -354,24 +570,25 @@ def load_json(strdata, notify_cb, force=False):
 		last_prev_sync_time = last_sync_obj.sync_time
 		notify_cb(80, _("Cleanup"))
 		# pokasowanie staroci
-		deleted_cnt = _cleanup_tasks(set(tasks_cache.itervalues()),
-				last_prev_sync_time, session)
+		_store_loaded_uuids(session, tasks_cache, folders_cache,
+				contexts_cache, tasknotes_cache, goals_cache, notebooks_cache)
+		deleted_cnt = _cleanup_tasks(last_prev_sync_time, session)
 		notify_cb(81, _("Removed tasks: %d") % deleted_cnt)
-		deleted_cnt = _cleanup_unused(objects.Folder, folders_cache,
-				last_prev_sync_time, session)
+		deleted_cnt = _cleanup_unused(objects.Folder, last_prev_sync_time,
+				session)
 		notify_cb(82, _("Removed folders: %d") % deleted_cnt)
-		deleted_cnt = _cleanup_unused(objects.Context, contexts_cache,
-				last_prev_sync_time, session)
+		deleted_cnt = _cleanup_unused(objects.Context, last_prev_sync_time,
+				session)
 		notify_cb(83, _("Removed contexts: %d") % deleted_cnt)
-		deleted_cnt = _cleanup_unused(objects.Tasknote, tasknotes_cache,
-				last_prev_sync_time, session)
+		deleted_cnt = _cleanup_unused(objects.Tasknote, last_prev_sync_time,
+				session)
 		notify_cb(84, _("Removed task notes: %d") % deleted_cnt)
-		deleted_cnt = _cleanup_unused(objects.Goal, goals_cache,
-				last_prev_sync_time, session)
+		deleted_cnt = _cleanup_unused(objects.Goal, last_prev_sync_time,
+				session)
 		notify_cb(85, _("Removed goals %d") % deleted_cnt)
-		deleted_cnt = _cleanup_notebooks(set(notebooks_cache.itervalues()),
-				last_prev_sync_time, session)
+		deleted_cnt = _cleanup_notebooks(last_prev_sync_time, session)
 		notify_cb(86, _("Removed notebook pages: %d") % deleted_cnt)
+		_drop_loaded_uuids(session)
 
 	# 90: after load actions
 	notify_cb(90, _("Global updates"))
@@ -395,11 +612,12 @@ def _load_folders(data, session, notify_cb):
 	notify_cb(6, _("Loading folders"))
 	folders = data.get("folder")
 	folders_cache = _build_id_uuid_map(folders)
-	for folder in sort_objects_by_parent(folders):  # musi być sortowane,
-		# bo nie znajdzie parenta
+	for folder in folders or []:
 		_replace_ids(folder, folders_cache, "parent_id")
 		_convert_timestamps(folder)
-		_create_or_update(session, objects.Folder, folder)
+	# musi być sortowane, bo nie znajdzie parenta
+	_bulk_create_or_update(session, objects.Folder,
+			sort_objects_by_parent(folders))
 	if folders:
 		del data["folder"]
 	notify_cb(10, _("Loaded %d folders") % len(folders_cache))
@@ -411,10 +629,11 @@ def _load_contexts(data, session, notify_cb):
 	notify_cb(11, _("Loading contexts"))
 	contexts = data.get("context")
 	contexts_cache = _build_id_uuid_map(contexts)
-	for context in sort_objects_by_parent(contexts):
+	for context in contexts or []:
 		_replace_ids(context, contexts_cache, "parent_id")
 		_convert_timestamps(context)
-		_create_or_update(session, objects.Context, context)
+	_bulk_create_or_update(session, objects.Context,
+			sort_objects_by_parent(contexts))
 	if contexts:
 		del data["context"]
 	notify_cb(15, _("Loaded %d contexts") % len(contexts_cache))
@@ -426,10 +645,11 @@ def _load_goals(data, session, notify_cb):
 	notify_cb(16, _("Loading goals"))
 	goals = data.get("goal")
 	goals_cache = _build_id_uuid_map(goals)
-	for goal in sort_objects_by_parent(goals):
+	for goal in goals or []:
 		_replace_ids(goal, goals_cache, "parent_id")
 		_convert_timestamps(goal)
-		_create_or_update(session, objects.Goal, goal)
+	_bulk_create_or_update(session, objects.Goal,
+			sort_objects_by_parent(goals))
 	if goals:
 		del data["goal"]
 	notify_cb(20, _("Loaded %d goals") % len(goals_cache))
@@ -441,20 +661,26 @@ def _load_tasks(data, session, notify_cb):
 	notify_cb(21, _("Loading tasks"))
 	tasks = data.get("task")
 	tasks_cache = _build_id_uuid_map(tasks)
-	for task in sort_objects_by_parent(tasks):
+	for task in tasks or []:
 		_replace_ids(task, tasks_cache, "parent_id")
 		_convert_timestamps(task, "completed", "start_date", "due_date",
 				"due_date_project", "hide_until")
 		task["context_uuid"] = None
 		task["folder_uuid"] = None
 		task["goal_uuid"] = None
-		task_obj = _create_or_update(session, objects.Task, task)
-		task_logic.update_task_hide(task_obj)
-		task_logic.update_task_alarm(task_obj)
+	# index is used when loading tasks relations
+	tasks_index = _bulk_create_or_update(session, objects.Task,
+			sort_objects_by_parent(tasks), _prepare_task,
+			("alarm", "alarm_pattern", "due_date"))
 	if tasks:
 		del data["task"]
 	notify_cb(29, _("Loaded %d tasks") % len(tasks_cache))
-	return tasks_cache
+	return tasks_cache, tasks_index
+
+
+def _prepare_task(task):
+	task_logic.update_task_hide(task)
+	task_logic.update_task_alarm(task)
 
 
 def _load_tasknotes(data, session, tasks_cache, notify_cb):
@@ -465,39 +691,45 @@ def _load_tasknotes(data, session, tasks_cache, notify_cb):
 	for tasknote in tasknotes or []:
 		_replace_ids(tasknote, tasks_cache, "task_id")
 		_convert_timestamps(tasknote)
-		_create_or_update(session, objects.Tasknote, tasknote)
+	_bulk_create_or_update(session, objects.Tasknote, tasknotes or [])
 	if tasknotes:
 		del data["tasknote"]
 	notify_cb(34, _("Loaded %d task notes") % len(tasknotes_cache))
 	return tasknotes_cache
 
 
-def _load_alarms(data, session, tasks_cache, notify_cb):
+def _load_alarms(data, session, tasks_cache, tasks_index, notify_cb):
 	_LOG.info("_load_alarms")
 	notify_cb(35, _("Loading alarms"))
 	alarms = data.get("alarm") or []
+	updates = []
 	for alarm in alarms:
 		task_uuid = _replace_ids(alarm, tasks_cache, "task_id")
-		if not task_uuid:
+		task = tasks_index.get(task_uuid)
+		if not task:
 			_LOG.error("load alarm error %r", alarm)
 			continue
 		_convert_timestamps(alarm, "alarm")
-		task = session.query(  # pylint: disable=E1101
-				objects.Task).filter_by(uuid=task_uuid).first()
-		if task.modified <= alarm["modified"]:
-			task.alarm = alarm["alarm"]
-			task_logic.update_task_alarm(task)
+		if task["modified"] <= alarm["modified"]:
+			task_rec = _Record(task)
+			task_rec.alarm = alarm["alarm"]
+			task_logic.update_task_alarm(task_rec)
+			updates.append({'_uuid': task_uuid, 'alarm': task['alarm'],
+					'alarm_pattern': task['alarm_pattern']})
 		else:
 			_LOG.debug("skip %r", alarm)
+	_update_by_uuid(session, objects.Task, updates)
 	if alarms:
 		del data["alarm"]
 	notify_cb(39, _("Loaded %d alarms") % len(alarms))
 
 
-def _load_task_folders(data, session, tasks_cache, folders_cache, notify_cb):
+def _load_task_folders(data, session, tasks_cache, tasks_index,
+		folders_cache, notify_cb):
 	_LOG.info("_load_task_folders")
 	notify_cb(40, _("Loading task folders"))
 	task_folders = data.get("task_folder") or []
+	updates = []
 	for task_folder in task_folders:
 		task_uuid = _replace_ids(task_folder, tasks_cache, "task_id")
 		folder_uuid = _replace_ids(task_folder, folders_cache, "folder_id")
@@ -506,22 +738,23 @@ def _load_task_folders(data, session, tasks_cache, folders_cache, notify_cb):
 					task_uuid, folder_uuid)
 			continue
 		_convert_timestamps(task_folder)
-		task = session.query(  # pylint: disable=E1101
-				objects.Task).filter_by(uuid=task_uuid).first()
-		if task.modified <= task_folder["modified"]:
-			task.folder_uuid = folder_uuid
+		task = tasks_index[task_uuid]
+		if task["modified"] <= task_folder["modified"]:
+			updates.append({'_uuid': task_uuid, 'folder_uuid': folder_uuid})
 		else:
 			_LOG.debug("skip %r", task_folder)
+	_update_by_uuid(session, objects.Task, updates)
 	if task_folders:
 		del data["task_folder"]
 	notify_cb(44, _("Loaded %d task folders") % len(task_folders))
 
 
-def _load_task_contexts(data, session, tasks_cache, contexts_cache,
-		notify_cb):
+def _load_task_contexts(data, session, tasks_cache, tasks_index,
+		contexts_cache, notify_cb):
 	_LOG.info("_load_task_contexts")
 	notify_cb(45, _("Loading task contexts"))
 	task_contexts = data.get("task_context") or []
+	updates = []
 	for task_context in task_contexts:
 		task_uuid = _replace_ids(task_context, tasks_cache, "task_id")
 		context_uuid = _replace_ids(task_context, contexts_cache, "context_id")
@@ -530,21 +763,23 @@ def _load_task_contexts(data, session, tasks_cache, contexts_cache,
 					task_uuid, context_uuid)
 			continue
 		_convert_timestamps(task_context)
-		task = session.query(  # pylint: disable=E1101
-				objects.Task).filter_by(uuid=task_uuid).first()
-		if task.modified <= task_context["modified"]:
-			task.context_uuid = context_uuid
+		task = tasks_index[task_uuid]
+		if task["modified"] <= task_context["modified"]:
+			updates.append({'_uuid': task_uuid, 'context_uuid': context_uuid})
 		else:
 			_LOG.debug("skip %r", task_context)
+	_update_by_uuid(session, objects.Task, updates)
 	if task_contexts:
 		del data["task_context"]
 	notify_cb(49, _("Loaded %d tasks contexts") % len(task_contexts))
 
 
-def _load_task_goals(data, session, tasks_cache, goals_cache, notify_cb):
+def _load_task_goals(data, session, tasks_cache, tasks_index,
+		goals_cache, notify_cb):
 	_LOG.info("_load_task_goals")
 	notify_cb(50, _("Loading task goals"))
 	task_goals = data.get("task_goal") or []
+	updates = []
 	for task_goal in task_goals:
 		task_uuid = _replace_ids(task_goal, tasks_cache, "task_id")
 		goal_uuid = _replace_ids(task_goal, goals_cache, "goal_id")
@@ -553,12 +788,12 @@ def _load_task_goals(data, session, tasks_cache, goals_cache, notify_cb):
 					task_uuid, goal_uuid)
 			continue
 		_convert_timestamps(task_goal)
-		task = session.query(  # pylint: disable=E1101
-				objects.Task).filter_by(uuid=task_uuid).first()
-		if task.modified <= task_goal["modified"]:
-			task.goal_uuid = goal_uuid
+		task = tasks_index[task_uuid]
+		if task["modified"] <= task_goal["modified"]:
+			updates.append({'_uuid': task_uuid, 'goal_uuid': goal_uuid})
 		else:
 			_LOG.debug("skip %r", task_goal)
+	_update_by_uuid(session, objects.Task, updates)
 	if task_goals:
 		del data["task_goal"]
 	notify_cb(54, _("Loaded %d task goals") % len(task_goals))
@@ -569,10 +804,10 @@ def _load_tags(data, session, notify_cb):
 	notify_cb(55, _("Loading tags"))
 	tags = data.get("tag")
 	tags_cache = _build_id_uuid_map(tags)
-	for tag in sort_objects_by_parent(tags):
+	for tag in tags or []:
 		_replace_ids(tag, tags_cache, "parent_id")
 		_convert_timestamps(tag)
-		_create_or_update(session, objects.Tag, tag)
+	_bulk_create_or_update(session, objects.Tag, sort_objects_by_parent(tags))
 	if tags:
 		del data["tag"]
 	notify_cb(59, _("Loaded %d tags") % len(tags_cache))
@@ -583,21 +818,38 @@ def _load_task_tags(data, session, tasks_cache, tags_cache, notify_cb):
 	_LOG.info("_load_task_tags")
 	notify_cb(60, _("Loading task tags"))
 	task_tags = data.get("task_tag") or []
+	table = objects.TaskTag.__table__
+	columns = set(table.c.keys())
+	# (task uuid, tag uuid) -> modified
+	existing = dict(((row.task_uuid, row.tag_uuid), row.modified) for row
+			in session.query(objects.TaskTag.task_uuid,
+				objects.TaskTag.tag_uuid, objects.TaskTag.modified))
+	inserts, updates = [], []
 	for task_tag in task_tags:
 		task_uuid = _replace_ids(task_tag, tasks_cache, "task_id")
 		tag_uuid = _replace_ids(task_tag, tags_cache, "tag_id")
+		if not task_uuid or not tag_uuid:
+			_LOG.error("load task tag error %r; %r; %r", task_tag,
+					task_uuid, tag_uuid)
+			continue
 		_convert_timestamps(task_tag)
-		obj = session.query(  # pylint: disable=E1101
-				objects.TaskTag).filter_by(task_uuid=task_uuid,
-				tag_uuid=tag_uuid).first()
-		if obj:
+		values = dict((key, val) for key, val in task_tag.iteritems()
+				if key in columns)
+		key = (task_uuid, tag_uuid)
+		if key in existing:
 			modified = task_tag.get("modified")
-			if not modified or not obj.modified or modified > obj.modified:
-				obj.load_from_dict(task_tag)
+			obj_modified = existing[key]
+			if not modified or not obj_modified or modified > obj_modified:
+				values['_task_uuid'], values['_tag_uuid'] = key
+				updates.append(values)
+				existing[key] = modified
 		else:
-			obj = objects.TaskTag(task_uuid=task_uuid, tag_uuid=tag_uuid)
-			obj.load_from_dict(task_tag)
-			session.add(obj)  # pylint: disable=E1101
+			inserts.append(values)
+			existing[key] = task_tag.get("modified")
+	_executemany(session, table.insert(), inserts)
+	_executemany(session, table.update().where(and_(
+			table.c.task_uuid == bindparam('_task_uuid'),
+			table.c.tag_uuid == bindparam('_tag_uuid'))), updates)
 	if task_tags:
 		del data["task_tag"]
 	notify_cb(64, _("Loaded %d task tags") % len(task_tags))
@@ -611,18 +863,20 @@ def _load_notebooks(data, session, notify_cb):
 	for notebook in notebooks:
 		_convert_timestamps(notebook)
 		notebook['folder_uuid'] = None
-		_create_or_update(session, objects.NotebookPage, notebook)
+	notebooks_index = _bulk_create_or_update(session, objects.NotebookPage,
+			notebooks)
 	if notebooks:
 		del data["notebook"]
 	notify_cb(69, _("Loaded %d notebook pages") % len(notebooks_cache))
-	return notebooks_cache
+	return notebooks_cache, notebooks_index
 
 
-def _load_notebook_folders(data, session, notebooks_cache, folders_cache,
-		notify_cb):
+def _load_notebook_folders(data, session, notebooks_cache, notebooks_index,
+		folders_cache, notify_cb):
 	_LOG.info("_load_notebook_folders")
 	notify_cb(70, _("Loading notebook pages folders"))
 	notebook_folders = data.get("notebook_folder") or []
+	updates = []
 	for notebook_folder in notebook_folders:
 		notebook_uuid = _replace_ids(notebook_folder, notebooks_cache,
 				"notebook_id")
@@ -632,12 +886,12 @@ def _load_notebook_folders(data, session, notebooks_cache, folders_cache,
 					notebook_uuid, folder_uuid)
 			continue
 		_convert_timestamps(notebook_folder)
-		notebook = session.query(  # pylint: disable=E1101
-				objects.NotebookPage).filter_by(uuid=notebook_uuid).first()
-		if notebook.modified <= notebook_folder["modified"]:
-			notebook.folder_uuid = folder_uuid
+		notebook = notebooks_index[notebook_uuid]
+		if notebook["modified"] <= notebook_folder["modified"]:
+			updates.append({'_uuid': notebook_uuid, 'folder_uuid': folder_uuid})
 		else:
 			_LOG.debug("skip %r", notebook_folder)
+	_update_by_uuid(session, objects.NotebookPage, updates)
 	if notebook_folders:
 		del data["notebook_folder"]
 	notify_cb(75, _("Loaded %d notebook folders") % len(notebook_folders))
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=R0904, C0103
+""" Tests for loader module.
+"""
+
+__author__ = "Karol Będkowski"
+__copyright__ = "Copyright (c) Karol Będkowski, 2013"
+__version__ = "2013-06-02"
+
+import os
+import datetime
+import json
+import shutil
+import zipfile
+import tempfile
+from unittest import main, TestCase
+
+from . import db
+from . import objects as OBJ
+from . import loader
+
+
+def _task(oid, uuid, title, modified, parent_id=0, **kwargs):
+	task = {'_id': oid, 'parent_id': parent_id, 'uuid': uuid, 'title': title,
+			'created': '2013-06-01T10:00:00.000Z', 'modified': modified,
+			'completed': '', 'deleted': '', 'due_date': '', 'start_date': '',
+			'due_date_project': '', 'hide_until': '', 'hide_pattern': '',
+			'type': 0}
+	task.update(kwargs)
+	return task
+
+
+def _load(**data):
+	data.setdefault('syncLog', [])
+	loader.load_json(json.dumps(data), loader._fake_update_func, force=True)
+
+
+class TestBulkLoad(TestCase):
+
+	def setUp(self):
+		db.connect(':memory:')
+		self.session = OBJ.Session()
+
+	def tearDown(self):
+		self.session.close()
+
+	def test_insert_update(self):
+		_load(folder=[{'_id': 1, 'parent_id': 0, 'uuid': 'f1', 'title': 'f',
+				'created': '2013-06-01T10:00:00.000Z',
+				'modified': '2013-06-01T10:00:00.000Z', 'deleted': ''}],
+			task=[_task(2, 't2', 'child', '2013-06-01T10:00:00.000Z',
+					parent_id=1),
+				_task(1, 't1', 'parent', '2013-06-01T10:00:00.000Z',
+					due_date='2013-06-10T10:00:00.000Z',
+					hide_pattern='task is due')])
+		task1 = OBJ.Task.get(self.session, uuid='t1')
+		task2 = OBJ.Task.get(self.session, uuid='t2')
+		self.assertEqual(task2.parent_uuid, 't1')
+		self.assertEqual(task1.hide_until, task1.due_date)
+		self.assertEqual(OBJ.Folder.get(self.session, uuid='f1').title, 'f')
+		self.assertEqual(task1.priority, 0)  # default value
+		self.session.commit()
+		# t1 is newer in db; t2 is updated
+		_load(task=[_task(1, 't1', 'parent old', '2013-05-01T10:00:00.000Z'),
+				_task(2, 't2', 'child new', '2013-06-02T10:00:00.000Z')])
+		self.session.expire_all()
+		self.assertEqual(task1.title, 'parent')
+		self.assertEqual(task2.title, 'child new')
+		self.assertEqual(task2.parent_uuid, None)
+
+	def test_relations(self):
+		modified = '2013-06-01T10:00:00.000Z'
+		_load(folder=[{'_id': 1, 'parent_id': 0, 'uuid': 'f1', 'title': 'f',
+				'created': modified, 'modified': modified, 'deleted': ''}],
+			tag=[{'_id': 1, 'parent_id': 0, 'uuid': 'g1', 'title': 'g',
+				'created': modified, 'modified': modified, 'deleted': ''}],
+			task=[_task(1, 't1', 'task', modified,
+				due_date='2013-06-10T10:00:00.000Z', alarm_pattern='due')],
+			task_folder=[{'task_id': 1, 'folder_id': 1, 'created': modified,
+				'modified': modified}],
+			alarm=[{'_id': 0, 'task_id': 1, 'uuid': 'a1', 'created': modified,
+				'modified': modified, 'alarm': '2013-06-09T10:00:00.000Z'}],
+			task_tag=[{'task_id': 1, 'tag_id': 1, 'created': modified,
+				'modified': modified}] * 2)
+		task = OBJ.Task.get(self.session, uuid='t1')
+		self.assertEqual(task.folder_uuid, 'f1')
+		self.assertEqual(task.alarm, task.due_date)
+		self.assertEqual(task.alarm_pattern, 'due')
+		self.assertEqual([tag.uuid for tag in task.tags], ['g1'])
+
+	def test_cleanup(self):
+		old = datetime.datetime(2013, 1, 1)
+		sync = datetime.datetime(2013, 6, 1)
+		session = self.session
+		for uuid in ('t1', 't2', 't3'):
+			session.add(OBJ.Task(uuid=uuid, title=uuid, modified=old))
+		session.add(OBJ.Task(uuid='t4', title='new', modified=sync))
+		session.add(OBJ.Folder(uuid='f1', title='used', modified=old))
+		session.add(OBJ.Folder(uuid='f2', title='unused', modified=old))
+		session.add(OBJ.Tasknote(uuid='n1', title='note'))
+		session.flush()
+		session.query(OBJ.Task).filter_by(uuid='t2').update(
+				{'folder_uuid': 'f1', 'deleted': old})
+		loader._store_loaded_uuids(session, {1: 't1'})
+		self.assertEqual(loader._cleanup_tasks(sync, session), 1)
+		self.assertEqual(loader._cleanup_unused(OBJ.Folder, sync, session), 1)
+		self.assertEqual(loader._cleanup_unused(OBJ.Tasknote, sync, session),
+				1)
+		loader._drop_loaded_uuids(session)
+		session.expire_all()
+		deleted = dict((task.uuid, task.deleted)
+				for task in session.query(OBJ.Task))
+		self.assertEqual(deleted['t1'], None)
+		self.assertEqual(deleted['t2'], old)
+		self.assertNotEqual(deleted['t3'], None)
+		self.assertEqual(deleted['t4'], None)
+		self.assertEqual(OBJ.Folder.get(session, uuid='f1').deleted, None)
+		self.assertNotEqual(OBJ.Folder.get(session, uuid='f2').deleted, None)
+		self.assertEqual(session.query(OBJ.Tasknote).count(), 0)
+
+	def test_load_from_zip(self):
+		modified = '2013-06-01T10:00:00.000Z'
+		tmpdir = tempfile.mkdtemp()
+		try:
+			filename = os.path.join(tmpdir, 'sync.zip')
+			with zipfile.ZipFile(filename, 'w') as zfile:
+				# relations before tasks
+				zfile.writestr('sync.json', '{"task_folder": ' + json.dumps(
+					[{'task_id': 1, 'folder_id': 1, 'created': modified,
+						'modified': modified}]) + ', "task": ' + json.dumps(
+					[_task(1, 't1', 'task ' * 100, modified)]) +
+					', "folder": ' + json.dumps([{'_id': 1, 'parent_id': 0,
+						'uuid': 'f1', 'title': 'f', 'created': modified,
+						'modified': modified, 'deleted': ''}]) +
+					', "syncLog": []}')
+			progress = []
+			loader.load_from_file(filename,
+					lambda prog, msg: progress.append(prog), force=True,
+					chunk_size=16, memory_limit=64)
+		finally:
+			shutil.rmtree(tmpdir)
+		task = OBJ.Task.get(self.session, uuid='t1')
+		self.assertEqual(task.folder_uuid, 'f1')
+		self.assertEqual(progress, sorted(progress))
+		self.assertEqual(progress[-1], 99)
+
+
+if __name__ == '__main__':
+	main()
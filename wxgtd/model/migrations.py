@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+""" Database schema migrations.
+
+Copyright (c) Karol Będkowski, 2013
+
+This file is part of wxGTD
+Licence: GPLv2+
+"""
+
+__author__ = "Karol Będkowski"
+__copyright__ = "Copyright (c) Karol Będkowski, 2013"
+__version__ = "2013-06-02"
+
+import logging
+
+import sqlalchemy.exc
+
+from wxgtd.model import sqls
+from wxgtd.model import objects
+
+_LOG = logging.getLogger(__name__)
+
+# key in wxgtd (Conf) table
+SCHEMA_VERSION_KEY = 'schema_version'
+
+
+def _migrate_base_schema(engine):
+	""" Create tables and indexes; fix old synclog definition. """
+	sqls.fix_synclog(engine)
+	objects.Base.metadata.create_all(engine)
+	# create_all skip indexes on existing tables
+	existing = set(row[0] for row in engine.execute(
+			"select name from sqlite_master where type='index'"))
+	for table in objects.Base.metadata.sorted_tables:
+		for index in table.indexes:
+			if index.name not in existing:
+				_LOG.info('creating index %s', index.name)
+				index.create(engine)
+
+
+def _migrate_fts(engine):
+	sqls.setup_fts(engine)
+
+
+def _migrate_sync_journal(engine):
+	sqls.setup_sync_journal(engine)
+
+
+# Ordered list of migrations: (version, description, function).
+# Each function get engine and should be safe to run on database that
+# already has given change (databases created before versioning start
+# from version 0). New migration must be added at the end.
+MIGRATIONS = [
+	(1, 'base schema', _migrate_base_schema),
+	(2, 'full text index for tasks', _migrate_fts),
+	(3, 'sync journal', _migrate_sync_journal),
+]
+
+
+def get_version(engine):
+	""" Get schema version stored in database; 0 for new or not versioned
+	database. """
+	try:
+		val = engine.execute("select val from wxgtd where key=?",
+				(SCHEMA_VERSION_KEY, )).scalar()
+	except sqlalchemy.exc.OperationalError:
+		# no wxgtd table
+		return 0
+	return int(val) if val else 0
+
+
+def _set_version(engine, version):
+	engine.execute("insert or replace into wxgtd(key, val) values (?, ?)",
+			(SCHEMA_VERSION_KEY, str(version)))
+
+
+def upgrade(engine):
+	""" Apply all not applied migrations.
+
+	Args:
+		engine: sqlalchemy engine
+
+	Returns:
+		Current schema version.
+	"""
+	version = get_version(engine)
+	last_version = MIGRATIONS[-1][0]
+	if version == last_version:
+		return version
+	if version > last_version:
+		_LOG.warn('database schema version %d is newer than supported %d',
+				version, last_version)
+		return version
+	for mig_version, descr, func in MIGRATIONS:
+		if mig_version <= version:
+			continue
+		_LOG.info('migration %d: %s START', mig_version, descr)
+		func(engine)
+		_set_version(engine, mig_version)
+		_LOG.info('migration %d COMPLETED', mig_version)
+		version = mig_version
+	return version
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=R0904, C0103
+""" Tests for migrations module.
+"""
+
+__author__ = "Karol Będkowski"
+__copyright__ = "Copyright (c) Karol Będkowski, 2013"
+__version__ = "2013-06-02"
+
+import os
+import shutil
+import tempfile
+from unittest import main, TestCase
+
+from . import db
+from . import objects as OBJ
+from . import migrations
+
+
+class TestMigrations(TestCase):
+
+	def setUp(self):
+		self.tmpdir = tempfile.mkdtemp()
+		self.filename = os.path.join(self.tmpdir, 'wxgtd.db')
+		self.migrations = migrations.MIGRATIONS[:]
+
+	def tearDown(self):
+		migrations.MIGRATIONS[:] = self.migrations
+		OBJ.Session().bind.dispose()
+		shutil.rmtree(self.tmpdir)
+
+	def _connect(self):
+		db.connect(self.filename)
+		return OBJ.Session().bind
+
+	def test_new_database(self):
+		engine = self._connect()
+		self.assertEqual(migrations.get_version(engine),
+				migrations.MIGRATIONS[-1][0])
+		self.assertNotEqual(OBJ.FTS_MODULE, None)
+
+	def test_apply_once(self):
+		calls = []
+		migrations.MIGRATIONS.append((migrations.MIGRATIONS[-1][0] + 1,
+				'test', calls.append))
+		engine = self._connect()
+		self._connect()
+		self.assertEqual(calls, [engine])
+		self.assertEqual(migrations.get_version(engine),
+				migrations.MIGRATIONS[-1][0])
+
+	def test_not_versioned_database(self):
+		engine = self._connect()
+		index = next(iter(OBJ.Task.__table__.indexes)).name
+		engine.execute("drop index " + index)
+		engine.execute("delete from wxgtd where key=?",
+				(migrations.SCHEMA_VERSION_KEY, ))
+		self.assertEqual(migrations.get_version(engine), 0)
+		self._connect()
+		self.assertEqual(engine.execute("select count(*) from sqlite_master "
+				"where name=?", (index, )).scalar(), 1)
+		self.assertEqual(migrations.get_version(engine),
+				migrations.MIGRATIONS[-1][0])
+
+
+if __name__ == '__main__':
+	main()
@@ -16,24 +16,63 @@ __version__ = "2013-03-02"
 
 import logging
 import gettext
+import re
 import uuid
 import datetime
+import threading
 
+from sqlalchemy import event
 from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
+from sqlalchemy import Table, MetaData
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.ext.associationproxy import association_proxy
 from sqlalchemy import orm, or_, and_
-from sqlalchemy import select, func
+from sqlalchemy import select, func, case, literal_column
 
 from wxgtd.model import enums
 
 _LOG = logging.getLogger(__name__)
 _ = gettext.gettext
 
+# max number of values in one "IN" clause; sqlite limit number of variables
+# in one query to 999
+MAX_IN_VALUES = 500
+
 # SQLAlchemy
 Base = declarative_base()  # pylint: disable=C0103
 Session = orm.sessionmaker()  # pylint: disable=C0103
 
+# lock held while synchronisation is running; other threads can't flush
+# changes (SyncRunningError is raised)
+WRITE_LOCK = threading.RLock()
+
+
+class SyncRunningError(RuntimeError):
+	""" Changes can't be saved while synchronisation is running. """
+
+	def __init__(self):
+		RuntimeError.__init__(self,
+				_("Synchronisation is running. Please try again later."))
+
+
+@event.listens_for(Session, 'before_flush')
+def _check_write_lock(_session, _flush_context, _instances):
+	# don't wait for lock - waiting session may already hold sqlite lock
+	# (previous flush) and block sync
+	if not WRITE_LOCK.acquire(False):
+		raise SyncRunningError()
+	WRITE_LOCK.release()
+
+# full text search module used by tasks_fts table (fts5, fts4 or None);
+# set by db.connect
+FTS_MODULE = None
+# tasks_fts is managed by sqls.setup_fts, so it is not in Base.metadata
+_TASKS_FTS = Table('tasks_fts', MetaData(),
+		Column('rowid', Integer),
+		Column('tasks_fts', String),
+		Column('rank', Integer))
+_RE_FTS_TOKENS = re.compile(r'\w+', re.UNICODE)
+
 
 def generate_uuid():
 	""" Create uuid identifier.
@@ -280,42 +319,54 @@ class Task(BaseModelMixin, Base):
 		Returns:
 			SqlAlchemy query
 		"""
-		# pylint: disable=R0912
 		_LOG.debug('Task.select_by_filters(%r)', params)
 		session = session or Session()
-		query = session.query(cls)
+		query = session.query(cls).filter(*cls.build_filters(params))
+		query = query.order_by(Task.title)
+		return query
+
+	@classmethod
+	def build_filters(cls, params, now=None):
+		""" Build list of filter expressions according to given criteria.
+
+		Args:
+			params: dict with filter parameters (criteria)
+			now: optional current (utc) time used in time-related filters
+
+		Returns:
+			List of SqlAlchemy expressions; task must match all of them.
+		"""
+		# pylint: disable=R0912
+		now = now or datetime.datetime.utcnow()
+		filters = []
 		if params.get('deleted'):
-			query = query.filter(cls.deleted.isnot(None))
+			filters.append(cls.deleted.isnot(None))
 		else:
-			query = query.filter(cls.deleted.is_(None))
-		query = _append_filter_list(query, Task.context_uuid, params.get('contexts'))
-		query = _append_filter_list(query, Task.folder_uuid, params.get('folders'))
-		query = _append_filter_list(query, Task.goal_uuid, params.get('goals'))
-		query = _append_filter_list(query, Task.status, params.get('statuses'))
-		query = _append_filter_list(query, Task.type, params.get('types'))
+			filters.append(cls.deleted.is_(None))
+		_append_filter_list(filters, Task.context_uuid, params.get('contexts'))
+		_append_filter_list(filters, Task.folder_uuid, params.get('folders'))
+		_append_filter_list(filters, Task.goal_uuid, params.get('goals'))
+		_append_filter_list(filters, Task.status, params.get('statuses'))
+		_append_filter_list(filters, Task.type, params.get('types'))
 		search_str = params.get('search_str', '').strip()
 		if search_str:
-			search_str = '%%' + search_str.lower() + "%%"
-			query = query.filter(or_(func.lower(Task.title).like(search_str),
-					func.lower(Task.note).like(search_str)))
-		now = datetime.datetime.utcnow()
-		query = _query_add_filter_by_tags(query, params)
+			filters.append(_build_search_filter(search_str))
+		_add_filter_by_tags(filters, params)
 		if params.get('hide_until'):
 			# hide task with hide_until value in future
-			query = query.filter(or_(Task.hide_until.is_(None),
+			filters.append(or_(Task.hide_until.is_(None),
 					Task.hide_until <= now))
 		if params.get('max_due_date'):
-			query = query.filter(Task.due_date.isnot(None))
+			filters.append(Task.due_date.isnot(None))
 		elif params.get('no_due_date'):
-			query = query.filter(Task.due_date.is_(None))
-		query = _quert_add_filter_by_hotlist(query, params, now)
-		query = _query_add_filter_by_finished(query, params.get('finished'))
-		query = _query_add_filter_by_parent(query, params.get('parent_uuid'))
+			filters.append(Task.due_date.is_(None))
+		_add_filter_by_hotlist(filters, params, now)
+		_add_filter_by_finished(filters, params.get('finished'))
+		_add_filter_by_parent(filters, params.get('parent_uuid'))
 		# future alarms
 		if params.get('active_alarm'):
-			query = query.filter(Task.alarm >= now)
-		query = query.order_by(Task.title)
-		return query
+			filters.append(Task.alarm >= now)
+		return filters
 
 	@classmethod
 	def search(cls, text, active_only, session=None):
@@ -323,13 +374,17 @@ class Task(BaseModelMixin, Base):
 		_LOG.debug('Task.search(%r, %r)', text, active_only)
 		session = session or Session()
 		query = session.query(cls).filter(cls.deleted.is_(None))
-		search_str = '%%' + text.lower() + "%%"
-		query = query.filter(or_(func.lower(Task.title).like(search_str),
-				func.lower(Task.note).like(search_str)))
 		if active_only:
 			query = query.filter(Task.completed.is_(None))
-		query = query.order_by(Task.title)
-		return query
+		fts_query = _build_fts_query(text)
+		if FTS_MODULE == 'fts5' and fts_query:
+			# best matching first
+			query = query.join(_TASKS_FTS, _TASKS_FTS.c.rowid ==
+					literal_column('tasks.rowid'))
+			query = query.filter(_TASKS_FTS.c.tasks_fts.op('MATCH')(fts_query))
+			return query.order_by(_TASKS_FTS.c.rank, Task.title)
+		query = query.filter(_build_search_filter(text))
+		return query.order_by(Task.title)
 
 	@classmethod
 	def all_projects(cls):
@@ -396,6 +451,41 @@ class Task(BaseModelMixin, Base):
 				.where(and_(Task.parent_uuid == self.uuid,
 					Task.deleted.is_(None))))
 
+	@classmethod
+	def select_child_counts(cls, uuids, session=None):
+		""" Count subtasks for many tasks in one pass.
+
+		Args:
+			uuids: list of parent tasks uuids
+			session: optional sqlalchemy session
+
+		Returns:
+			Dict parent uuid -> (active child count, child count, overdue
+			child count). Tasks without subtasks are omitted.
+		"""
+		session = session or Session()
+		now = datetime.datetime.utcnow()
+		overdue = and_(Task.completed.is_(None), Task.due_date.isnot(None),
+				or_(
+					and_(Task.due_date < now,
+						Task.type != enums.TYPE_PROJECT),
+					and_(Task.due_date_project < now,
+						Task.type == enums.TYPE_PROJECT)))
+		query = (select([Task.parent_uuid,
+					func.sum(case([(Task.completed.is_(None), 1)], else_=0)),
+					func.count(Task.uuid),
+					func.sum(case([(overdue, 1)], else_=0))])
+				.where(Task.deleted.is_(None))
+				.group_by(Task.parent_uuid))
+		uuids = list(uuids)
+		result = {}
+		for idx in xrange(0, len(uuids), MAX_IN_VALUES):
+			chunk = uuids[idx:idx + MAX_IN_VALUES]
+			for parent_uuid, active, total, overdue in session.execute(
+					query.where(Task.parent_uuid.in_(chunk))):
+				result[parent_uuid] = (active or 0, total, overdue or 0)
+		return result
+
 	@property
 	def sub_projects(self):
 		return Session.object_session(self).query(Task).with_parent(self)\
@@ -429,50 +519,79 @@ class Task(BaseModelMixin, Base):
 		return newobj
 
 
-def _append_filter_list(query, param, values):
+def _append_filter_list(filters, param, values):
 	""" Build sqlalachemy filter object from params and values.
 
 	Args:
-		query: current sqlalchemy query object
+		filters: list of filters to update
 		param: field in object (database column) used to filter
 		values: values acceptable for given field
-
-	Returns:
-		Updated query object.
 	"""
 	if not values:
 		# brak filtra
-		return query
+		return
 	if values == [None]:
 		# wyświetlenie tylko bez ustawionej wartości parametru
-		return query.filter(param.is_(None))
+		filters.append(param.is_(None))
 	elif None in values:
 		# lista parametrów zawiera wartość NULL
 		values = values[:]
 		values.remove(None)
-		return query.filter(or_(param.is_(None), param.in_(values)))
-	# lista parametrów bez NULL
-	return query.filter(param.in_(values))
+		filters.append(or_(param.is_(None), param.in_(values)))
+	else:
+		# lista parametrów bez NULL
+		filters.append(param.in_(values))
 
 
-def _query_add_filter_by_tags(query, params):
+def _build_fts_query(text):
+	""" Build MATCH expression for tasks_fts; each word in text is searched
+	as prefix. Return None when there is nothing to search.
+	"""
+	if not FTS_MODULE:
+		return None
+	if isinstance(text, str):
+		text = text.decode('utf-8')
+	tokens = _RE_FTS_TOKENS.findall(text)
+	if not tokens:
+		return None
+	if FTS_MODULE == 'fts5':
+		return ' '.join('"%s"*' % token for token in tokens)
+	return ' '.join(token + '*' for token in tokens)
+
+
+def _build_search_filter(text):
+	""" Build filter for tasks with title or note matching text.
+
+	Use full text index when available; otherwise (or when text contains
+	no words) search by LIKE.
+	"""
+	fts_query = _build_fts_query(text)
+	if fts_query:
+		return literal_column('tasks.rowid').in_(
+				select([_TASKS_FTS.c.rowid]).where(
+					_TASKS_FTS.c.tasks_fts.op('MATCH')(fts_query)))
+	search_str = '%%' + text.lower() + "%%"
+	return or_(func.lower(Task.title).like(search_str),
+			func.lower(Task.note).like(search_str))
+
+
+def _add_filter_by_tags(filters, params):
 	""" Add filters related to tags. """
 	if params.get('tags'):
 		# filter by tags; pylint: disable=E1101
 		tags = set(params.get('tags'))
 		if None in tags:
 			if len(tags) == 1:
-				query = query.filter(~Task.tags.any())
+				filters.append(~Task.tags.any())
 			else:
-				query = query.filter(or_(
+				filters.append(or_(
 						Task.tags.any(TaskTag.tag_uuid.in_(params['tags'])),
 						~Task.tags.any()))
 		else:
-			query = query.filter(Task.tags.any(TaskTag.tag_uuid.in_(params['tags'])))
-	return query
+			filters.append(Task.tags.any(TaskTag.tag_uuid.in_(params['tags'])))
 
 
-def _quert_add_filter_by_hotlist(query, params, now):
+def _add_filter_by_hotlist(filters, params, now):
 	""" Add filters related to hotlist. """
 	opt = []
 	if params.get('starred'):  # show starred task
@@ -494,32 +613,29 @@ def _quert_add_filter_by_hotlist(query, params, now):
 	if opt:
 		# use "or" or "and" operator for hotlist params
 		if params.get('filter_operator', 'and') == 'or':
-			query = query.filter(or_(*opt))  # pylint: disable=W0142
+			filters.append(or_(*opt))  # pylint: disable=W0142
 		else:
-			query = query.filter(*opt)  # pylint: disable=W0142
-	return query
+			filters.extend(opt)
 
 
-def _query_add_filter_by_finished(query, finished):
-	""" Add filters by completed to query. """
+def _add_filter_by_finished(filters, finished):
+	""" Add filters by completed. """
 	if finished is not None:
 		if finished:  # only finished
-			query = query.filter(Task.completed.isnot(None))
+			filters.append(Task.completed.isnot(None))
 		else:  # only not-completed
-			query = query.filter(Task.completed.is_(None))
-	return query
+			filters.append(Task.completed.is_(None))
 
 
-def _query_add_filter_by_parent(query, parent_uuid):
-	""" Add filters by parent to query. """
+def _add_filter_by_parent(filters, parent_uuid):
+	""" Add filters by parent. """
 	if parent_uuid is not None:
 		if parent_uuid == 0:
 			# filter by parent (show only master task (not subtask))
-			query = query.filter(Task.parent_uuid.is_(None))
+			filters.append(Task.parent_uuid.is_(None))
 		elif parent_uuid:
 			# filter by parent (show only subtask)
-			query = query.filter(Task.parent_uuid == parent_uuid)
-	return query
+			filters.append(Task.parent_uuid == parent_uuid)
 
 
 class Folder(BaseModelMixin, Base):
@@ -0,0 +1,160 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+""" Incremental (search-as-you-type) tasks search.
+
+Result of last database query is kept in memory; when user extends searched
+text, result can only shrink, so it is filtered in memory without querying
+database.
+
+Copyright (c) Karol Będkowski, 2013
+
+This file is part of wxGTD
+Licence: GPLv2+
+"""
+__author__ = "Karol Będkowski"
+__copyright__ = "Copyright (c) Karol Będkowski, 2013"
+__version__ = "2013-06-02"
+
+import re
+import logging
+import unicodedata
+
+from wxgtd.model import objects as OBJ
+
+_LOG = logging.getLogger(__name__)
+
+# the same as used for building full text queries in objects
+_RE_TOKENS = re.compile(r'\w+', re.UNICODE)
+
+_COLUMNS = (OBJ.Task.uuid, OBJ.Task.type, OBJ.Task.title, OBJ.Task.priority,
+		OBJ.Task.importance, OBJ.Task.starred, OBJ.Task.due_date,
+		OBJ.Task.note)
+
+
+class IncrementalSearch(object):
+	""" Keep result of last search and narrow it in memory when possible.
+
+	Object should be used only in gui thread; database is queried by
+	`load_candidates` (that may be called in other thread).
+
+	Usage:
+		if searcher.can_narrow(text, active_only):
+			rows = searcher.narrow(text)
+		else:
+			rows = searcher.set_result(text, active_only,
+					load_candidates(text, active_only))
+	"""
+
+	def __init__(self):
+		self._text = None
+		self._active_only = None
+		self._candidates = []  # list of (row, haystack)
+
+	def reset(self):
+		""" Forget last result (i.e. when tasks are changed). """
+		self._text = None
+		self._candidates = []
+
+	def can_narrow(self, text, active_only):
+		""" Check if result for `text` is subset of last result. """
+		if self._text is None or active_only != self._active_only:
+			return False
+		return is_narrowing(self._text, text)
+
+	def narrow(self, text):
+		""" Filter last result in memory.
+
+		Returns:
+			List of rows (uuid, type, title, priority, importance, starred,
+			due_date, note) matching text.
+		"""
+		match = _build_matcher(text)
+		self._candidates = [candidate for candidate in self._candidates
+				if match(candidate[1])]
+		self._text = text
+		_LOG.debug('IncrementalSearch.narrow(%r): %d', text,
+				len(self._candidates))
+		return [row for row, _haystack in self._candidates]
+
+	def set_result(self, text, active_only, candidates):
+		""" Remember result of `load_candidates`.
+
+		Returns:
+			List of rows.
+		"""
+		self._text = text
+		self._active_only = active_only
+		self._candidates = candidates
+		return [row for row, _haystack in candidates]
+
+
+def load_candidates(text, active_only, session=None):
+	""" Search tasks in database.
+
+	Args:
+		text: searched text
+		active_only: search only not completed tasks
+		session: optional sqlalchemy session
+
+	Returns:
+		List of (row, haystack) for `IncrementalSearch.set_result`; row
+		contains only plain values.
+	"""
+	session = session or OBJ.Session()
+	query = OBJ.Task.search(text, active_only, session).with_entities(
+			*_COLUMNS)
+	if _use_fts(text):
+		return [(row, _fts_haystack(row)) for row in query]
+	return [(row, _like_haystack(row)) for row in query]
+
+
+def is_narrowing(old_text, new_text):
+	""" Check if tasks matching `new_text` are always subset of tasks
+	matching `old_text`. """
+	if _use_fts(old_text) != _use_fts(new_text):
+		return False
+	if _use_fts(new_text):
+		# task match when each token is prefix of some word
+		old_tokens = _tokens(old_text)
+		new_tokens = _tokens(new_text)
+		return all(any(new.startswith(old) for new in new_tokens)
+				for old in old_tokens)
+	return old_text.lower() in new_text.lower()
+
+
+def _use_fts(text):
+	return bool(OBJ.FTS_MODULE and _tokens(text))
+
+
+def _fold(text):
+	""" Lower text and remove diacritics (like fts unicode61 tokenizer). """
+	if not text:
+		return u''
+	if isinstance(text, str):
+		text = text.decode('utf-8')
+	text = unicodedata.normalize('NFKD', text.lower())
+	return u''.join(char for char in text if not unicodedata.combining(char))
+
+
+def _tokens(text):
+	return _RE_TOKENS.findall(_fold(text))
+
+
+def _fts_haystack(row):
+	# space before each word, so prefix is found by ' ' + token
+	return u' ' + u' '.join(_tokens(row.title) + _tokens(row.note))
+
+
+def _like_haystack(row):
+	return (row.title or u'').lower() + u'\0' + (row.note or u'').lower()
+
+
+def _build_matcher(text):
+	""" Build function checking haystack against text. """
+	if _use_fts(text):
+		needles = [u' ' + token for token in _tokens(text)]
+		return lambda haystack: all(needle in haystack for needle in needles)
+	text = text.lower()
+	if isinstance(text, str):
+		text = text.decode('utf-8')
+	return lambda haystack: text in haystack
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=R0904, C0103
+""" Tests for search module.
+"""
+
+__author__ = "Karol Będkowski"
+__copyright__ = "Copyright (c) Karol Będkowski, 2013"
+__version__ = "2013-06-02"
+
+from unittest import main, TestCase
+
+from . import db
+from . import objects as OBJ
+from . import search
+
+
+class TestIncrementalSearch(TestCase):
+
+	def setUp(self):
+		db.connect(':memory:')
+		self.session = session = OBJ.Session()
+		session.add_all([OBJ.Task(title=u'work at home'),
+				OBJ.Task(title=u'work', note=u'office'),
+				OBJ.Task(title=u'homework'),
+				OBJ.Task(title=u'żółw'),
+				OBJ.Task(title=u'worry')])
+		session.commit()
+
+	def tearDown(self):
+		self.session.close()
+
+	def _search_db(self, text, active_only=False):
+		return sorted(row.title for row, _haystack
+				in search.load_candidates(text, active_only, self.session))
+
+	def _check(self, searcher, text):
+		self.assertTrue(searcher.can_narrow(text, False))
+		self.assertEqual(sorted(row.title for row in searcher.narrow(text)),
+				self._search_db(text))
+
+	def test_narrow(self):
+		searcher = search.IncrementalSearch()
+		self.assertFalse(searcher.can_narrow(u'wo', False))
+		rows = searcher.set_result(u'wo', False, search.load_candidates(u'wo',
+			False, self.session))
+		self.assertEqual(len(rows), 3)
+		self._check(searcher, u'wor')
+		self._check(searcher, u'work')
+		self._check(searcher, u'work off')
+		self.assertFalse(searcher.can_narrow(u'work', False))
+		self.assertFalse(searcher.can_narrow(u'work off', True))
+
+	def test_diacritics(self):
+		searcher = search.IncrementalSearch()
+		searcher.set_result(u'z', False, search.load_candidates(u'z', False,
+			self.session))
+		self._check(searcher, u'zo')
+		self._check(searcher, u'żół')
+
+	def test_is_narrowing(self):
+		self.assertTrue(search.is_narrowing(u'wo', u'wor'))
+		self.assertTrue(search.is_narrowing(u'wo', u'home wo'))
+		self.assertFalse(search.is_narrowing(u'wor', u'wo'))
+		self.assertFalse(search.is_narrowing(u'wo ho', u'wo'))
+
+
+if __name__ == '__main__':
+	main()
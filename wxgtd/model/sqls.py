@@ -12,6 +12,12 @@ __author__ = "Karol Będkowski"
 __copyright__ = "Copyright (c) Karol Będkowski, 2013"
 __version__ = '2013-04-26'
 
+import logging
+
+import sqlalchemy.exc
+
+_LOG = logging.getLogger(__name__)
+
 
 SCHEMA_DEF = []
 
@@ -155,3 +161,144 @@ def fix_synclog(engine):
 		conn.execute("insert into synclog select device_id, sync_time, "
 				"prev_sync_time from synclog")
 	engine.execute("drop table synclog_old;")
+
+
+# full text index for tasks title & note; rows are identified by tasks rowid
+_FTS_SCHEMES = (
+		('fts5', "CREATE VIRTUAL TABLE tasks_fts USING fts5(title, note, "
+			"tokenize='unicode61')"),
+		('fts4', "CREATE VIRTUAL TABLE tasks_fts USING fts4(title, note, "
+			"tokenize=unicode61)"),
+		('fts4', "CREATE VIRTUAL TABLE tasks_fts USING fts4(title, note)"),
+)
+
+_FTS_TRIGGERS = (
+		"""CREATE TRIGGER IF NOT EXISTS tasks_fts_ai AFTER INSERT ON tasks
+BEGIN
+	INSERT INTO tasks_fts(rowid, title, note)
+		VALUES (new.rowid, new.title, new.note);
+END""",
+		"""CREATE TRIGGER IF NOT EXISTS tasks_fts_ad AFTER DELETE ON tasks
+BEGIN
+	DELETE FROM tasks_fts WHERE rowid = old.rowid;
+END""",
+		"""CREATE TRIGGER IF NOT EXISTS tasks_fts_au
+AFTER UPDATE OF title, note ON tasks
+BEGIN
+	UPDATE tasks_fts SET title = new.title, note = new.note
+		WHERE rowid = old.rowid;
+END""",
+)
+
+
+def setup_fts(engine):
+	""" Create (if not exists) full text index for tasks.
+
+	Must be called after creating "tasks" table.
+
+	Args:
+		engine: sqlalchemy engine
+
+	Returns:
+		Name of used fts module ('fts5' or 'fts4') or None when full text
+		search is not available.
+	"""
+	module = get_fts_module(engine)
+	if not module:
+		module = _create_fts_table(engine)
+		if not module:
+			return None
+	for sql in _FTS_TRIGGERS:
+		engine.execute(sql)
+	cnt_tasks = engine.execute("select count(*) from tasks").scalar()
+	cnt_fts = engine.execute("select count(*) from tasks_fts").scalar()
+	if cnt_tasks != cnt_fts:
+		rebuild_fts(engine)
+	return module
+
+
+def get_fts_module(engine):
+	""" Get name of fts module used by existing tasks_fts table ('fts5',
+	'fts4') or None when table not exists. """
+	res = engine.execute("select sql from sqlite_master "
+			"where name='tasks_fts'").fetchone()
+	if not res:
+		return None
+	return 'fts5' if 'fts5' in res[0].lower() else 'fts4'
+
+
+def rebuild_fts(engine):
+	""" Fill full text index with all tasks. """
+	with engine.begin() as conn:
+		conn.execute("delete from tasks_fts")
+		conn.execute("insert into tasks_fts(rowid, title, note) "
+				"select rowid, title, note from tasks")
+
+
+def _create_fts_table(engine):
+	for module, sql in _FTS_SCHEMES:
+		try:
+			engine.execute(sql)
+		except sqlalchemy.exc.OperationalError, err:
+			_LOG.info('create tasks_fts using %s failed: %s', module, err)
+		else:
+			_LOG.info('created tasks_fts using %s', module)
+			return module
+	_LOG.warn('full text search not available')
+	return None
+
+
+# journal of local changes in synchronized tables; cleared after successful
+# sync; rows are replaced so for each object only last operation is kept
+_SYNC_JOURNAL_SCHEME = """CREATE TABLE sync_journal (
+id INTEGER PRIMARY KEY AUTOINCREMENT,
+tbl VARCHAR(32) NOT NULL,
+uuid VARCHAR(101) NOT NULL,
+op CHAR(1) NOT NULL,
+modified DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+UNIQUE (tbl, uuid))"""
+
+# table -> expression (with {row} placeholder) identifying changed row
+_SYNC_JOURNAL_TABLES = (
+		('tasks', '{row}.uuid'),
+		('folders', '{row}.uuid'),
+		('contexts', '{row}.uuid'),
+		('goals', '{row}.uuid'),
+		('tags', '{row}.uuid'),
+		('tasknotes', '{row}.uuid'),
+		('notebook_pages', '{row}.uuid'),
+		('task_tags', "{row}.task_uuid || '/' || {row}.tag_uuid"),
+)
+
+_SYNC_JOURNAL_TRIGGER = """CREATE TRIGGER IF NOT EXISTS {table}_journal_{op}
+AFTER {event} ON {table}
+BEGIN
+	INSERT OR REPLACE INTO sync_journal(tbl, uuid, op)
+		VALUES ('{table}', {key}, '{op}');
+END"""
+
+# marker inserted into new journal; existing data are not yet synchronized
+_SYNC_JOURNAL_FULL = ('*', '*', 'F')
+
+
+def setup_sync_journal(engine):
+	""" Create (if not exists) sync journal with triggers.
+
+	Must be called after creating synchronized tables.
+
+	Args:
+		engine: sqlalchemy engine
+	"""
+	res = engine.execute("select 1 from sqlite_master "
+			"where name='sync_journal'").fetchone()
+	if not res:
+		_LOG.info('creating sync_journal')
+		with engine.begin() as conn:
+			conn.execute(_SYNC_JOURNAL_SCHEME)
+			conn.execute("insert into sync_journal(tbl, uuid, op) "
+					"values (?, ?, ?)", _SYNC_JOURNAL_FULL)
+	for table, key in _SYNC_JOURNAL_TABLES:
+		for event, row in (('INSERT', 'new'), ('UPDATE', 'new'),
+				('DELETE', 'old')):
+			engine.execute(_SYNC_JOURNAL_TRIGGER.format(table=table,
+					op=event[0], event=event, key=key.format(row=row)))
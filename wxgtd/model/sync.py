@@ -15,19 +15,36 @@ __version__ = '2013-04-26'
 import logging
 import gettext
 import os
+import json
+import shutil
+import sqlite3
+import hashlib
+import zipfile
 import datetime
+import threading
+
+import sqlalchemy.exc
 
 from wxgtd.wxtools.wxpub import publisher
 
 from wxgtd.lib import appconfig
+from wxgtd.lib import ignore_exceptions
 
 from wxgtd.model import exporter
 from wxgtd.model import loader
+from wxgtd.model import objects
 
 
 _LOG = logging.getLogger(__name__)
 _ = gettext.gettext
 
+# key in Conf with fingerprint of last loaded or written sync file
+CONF_FINGERPRINT = 'sync_file_fingerprint'
+_HASH_CHUNK_SIZE = 64 * 1024
+# extensions of backup files: database snapshot & json export
+_SNAPSHOT_EXT = '.db.zip'
+_JSON_EXT = '.json.zip'
+
 
 class SyncLockedError(RuntimeError):
 	""" Sync folder is locked. """
@@ -39,6 +56,16 @@ class OtherSyncError(RuntimeError):
 	pass
 
 
+class SyncCancelledError(RuntimeError):
+	""" Synchronisation cancelled by user (raised by notify callback). """
+	pass
+
+
+class BackupError(RuntimeError):
+	""" Invalid backup file. """
+	pass
+
+
 def _notify_progress(progress, msg):
 	publisher.sendMessage('sync.progress',
 			data=(progress, msg))
@@ -58,6 +85,13 @@ def sync(filename, load_only=False, notify_cb=_notify_progress):
 	"""
 	_LOG.info("sync: %r", filename)
 	notify_cb(0, _("Sync via file %s") % filename)
+	last_fingerprint = get_fingerprint(CONF_FINGERPRINT)
+	fingerprint = file_fingerprint(filename, last_fingerprint)
+	file_changed = not is_same_fingerprint(fingerprint, last_fingerprint)
+	if not file_changed and (load_only or not get_journal_last_id()):
+		_LOG.info("sync: file and database not changed; skipping")
+		notify_cb(100, _("No changes"))
+		return
 	notify_cb(0, _("Creating backup"))
 	create_backup()
 	notify_cb(25, _("Sanity check"))
@@ -66,15 +100,38 @@ def sync(filename, load_only=False, notify_cb=_notify_progress):
 	if exporter.create_sync_lock(filename):
 		notify_cb(1, _("Loading..."))
 		try:
-			if loader.load_from_file(filename, notify_cb):
-				if not load_only:
-					exporter.save_to_file(filename, notify_cb)
+			local_changes_id = get_journal_last_id()
+			# file may be changed before lock was created
+			fingerprint = file_fingerprint(filename, last_fingerprint)
+			file_changed = not is_same_fingerprint(fingerprint,
+					last_fingerprint)
+			if file_changed:
+				loaded = loader.load_from_file(filename, notify_cb)
+			else:
+				notify_cb(50, _("Sync file not changed; skipping load"))
+				loaded = True
+			if loaded:
+				loaded_id = get_journal_last_id()
+				if load_only:
+					# keep local changes for next sync
+					clear_journal(local_changes_id, loaded_id)
+				else:
+					if local_changes_id or fingerprint is None:
+						exporter.save_to_file(filename, notify_cb)
+						fingerprint = file_fingerprint(filename)
+					else:
+						notify_cb(99, _("No local changes; skipping save"))
+					clear_journal(0, loaded_id)
+				store_fingerprint(CONF_FINGERPRINT, fingerprint)
+		except SyncCancelledError:
+			_LOG.info("sync cancelled")
+			raise
 		except Exception as err:
 			_LOG.exception("file sync error")
 			raise OtherSyncError(err)
 		finally:
-			notify_cb(50, _("Removing sync lock"))
 			exporter.delete_sync_lock(filename)
+			notify_cb(50, _("Sync lock removed"))
 		notify_cb(100, _("Completed"))
 	else:
 		notify_cb(100, _("Synchronization file is locked. "
@@ -82,16 +139,111 @@ def sync(filename, load_only=False, notify_cb=_notify_progress):
 		raise SyncLockedError()
 
 
+def get_journal_last_id():
+	""" Get id of last change registered in sync journal.
+
+	Returns:
+		Id of last change; 0 when there is no local changes.
+	"""
+	session = objects.Session()
+	try:
+		return session.execute("select max(id) from sync_journal").scalar() \
+				or 0
+	finally:
+		session.close()
+
+
+def clear_journal(first_id, last_id):
+	""" Remove from sync journal changes with id in (first_id, last_id]. """
+	_LOG.debug("clear_journal(%r, %r)", first_id, last_id)
+	session = objects.Session()
+	session.execute("delete from sync_journal where id > :first and "
+			"id <= :last", {'first': first_id, 'last': last_id})
+	session.commit()
+
+
+def get_fingerprint(key):
+	""" Get fingerprint of sync file stored in Conf under `key`.
+
+	Returns:
+		Fingerprint (dict) or None.
+	"""
+	session = objects.Session()
+	try:
+		conf = session.query(objects.Conf).filter_by(  # pylint: disable=E1101
+				key=key).first()
+		return json.loads(conf.val) if conf and conf.val else None
+	finally:
+		session.close()
+
+
+def store_fingerprint(key, fingerprint):
+	""" Store fingerprint of sync file in Conf under `key`. """
+	_LOG.debug("store_fingerprint(%r, %r)", key, fingerprint)
+	session = objects.Session()
+	conf = session.query(objects.Conf).filter_by(  # pylint: disable=E1101
+			key=key).first()
+	if conf is None:
+		conf = objects.Conf(key=key)
+		session.add(conf)  # pylint: disable=E1101
+	conf.val = json.dumps(fingerprint) if fingerprint else None
+	session.commit()  # pylint: disable=E1101
+
+
+def file_fingerprint(filename, previous=None):
+	""" Compute fingerprint of file: path, size, mtime and sha1 of content.
+
+	Args:
+		filename: path to file
+		previous: previous fingerprint; when path, size and mtime are equal,
+			content hash is not computed
+
+	Returns:
+		Fingerprint (dict) or None when file not exists.
+	"""
+	if not os.path.isfile(filename):
+		return None
+	stat = os.stat(filename)
+	fingerprint = {'path': filename, 'size': stat.st_size,
+			'mtime': stat.st_mtime}
+	if previous and all(previous.get(key) == val
+			for key, val in fingerprint.iteritems()):
+		fingerprint['sha1'] = previous.get('sha1')
+		return fingerprint
+	digest = hashlib.sha1()
+	with open(filename, 'rb') as ifile:
+		while True:
+			data = ifile.read(_HASH_CHUNK_SIZE)
+			if not data:
+				break
+			digest.update(data)
+	fingerprint['sha1'] = digest.hexdigest()
+	return fingerprint
+
+
+def is_same_fingerprint(fingerprint, previous):
+	""" Check if fingerprints describe the same file content. """
+	if not fingerprint or not previous:
+		return False
+	if 'rev' in fingerprint:
+		return fingerprint['rev'] == previous.get('rev')
+	return fingerprint.get('path') == previous.get('path') and \
+			fingerprint.get('size') == previous.get('size') and \
+			fingerprint.get('sha1') == previous.get('sha1')
+
+
 def create_backup():
 	""" Create backup current data in database.
 
-	Format of backup file is identical with synchronization file.
+	Backup is compressed snapshot of database file or (when format is "json"
+	or snapshot failed) file in synchronization file format.
 	Backup are stored for default in ~/.local/share/wxgtd/backups/
 
 	Configuration in wxgtd.conf:
 	[backup]
 	number_copies = 21
 	location = <path to dir>
+	format = snapshot | json
 	"""
 	appcfg = appconfig.AppConfig()
 	backup_dir = appcfg.get('backup', 'location')
@@ -99,17 +251,19 @@ def create_backup():
 		backup_dir = os.path.expanduser(backup_dir)
 	else:
 		backup_dir = os.path.join(appcfg.user_share_dir, 'backups')
-	filename = os.path.join(backup_dir,
-			"BACKUP_" + datetime.date.today().isoformat() + ".json.zip")
-	_LOG.info('create_backup: %s', filename)
-	if os.path.isfile(filename):
+	basename = os.path.join(backup_dir,
+			"BACKUP_" + datetime.date.today().isoformat())
+	_LOG.info('create_backup: %s', basename)
+	if os.path.isfile(basename + _SNAPSHOT_EXT) or \
+			os.path.isfile(basename + _JSON_EXT):
 		_LOG.info("create_backup: today backup already exists; skipping...")
 		return True
 	if os.path.isdir(backup_dir):
 		num_files_to_keep = int(appcfg.get('backup', 'number_copies', 21))
 		# backup dir exists; check number of files and delete if more than 21
 		files = sorted((fname for fname in os.listdir(backup_dir)
-				if fname.startswith('BACKUP') and fname.endswith('.json.zip')),
+				if fname.startswith('BACKUP') and (fname.endswith(_JSON_EXT)
+					or fname.endswith(_SNAPSHOT_EXT))),
 				reverse=True)
 		if len(files) >= num_files_to_keep:
 			for fname in files[num_files_to_keep:]:
@@ -121,13 +275,108 @@ def create_backup():
 		except IOError as error:
 			_LOG.error('create_backup: create dir error: %s', str(error))
 			return False
+	if appcfg.get('backup', 'format', 'snapshot') == 'snapshot':
+		if _create_snapshot(basename + _SNAPSHOT_EXT):
+			return True
 	# backup is regular export (zip)
-	exporter.save_to_file(os.path.join(backup_dir, filename),
-			internal_fname="GDT_SYNC.json")
+	filename = basename + _JSON_EXT
+	exporter.save_to_file(filename, internal_fname="GDT_SYNC.json")
 	_LOG.info('create_backup: COMPLETED %s', filename)
 	return True
 
 
+def _create_snapshot(filename):
+	""" Create consistent copy of database and compress it in background.
+
+	Args:
+		filename: destination file name (zip)
+
+	Returns:
+		Thread compressing snapshot or None when snapshot failed.
+	"""
+	snapshot = filename[:-4] + '.tmp'
+	with ignore_exceptions(OSError):
+		os.unlink(snapshot)
+	engine = objects.Session().get_bind()
+	try:
+		# vacuum into create compacted snapshot in one read transaction
+		engine.execute("VACUUM INTO ?", (snapshot, ))
+	except sqlalchemy.exc.DBAPIError as err:
+		_LOG.warn("_create_snapshot: snapshot failed: %s", err)
+		return None
+	thread = threading.Thread(target=_compress_snapshot,
+			args=(snapshot, filename), name="backup")
+	thread.start()
+	return thread
+
+
+def _compress_snapshot(snapshot, filename):
+	tmp_filename = filename + '.tmp'
+	try:
+		with zipfile.ZipFile(tmp_filename, 'w', zipfile.ZIP_DEFLATED) as zfile:
+			zfile.write(snapshot, 'wxgtd.db')
+		os.rename(tmp_filename, filename)
+		_LOG.info('create_backup: COMPLETED %s', filename)
+	except (IOError, OSError, zipfile.BadZipfile):
+		_LOG.exception('_compress_snapshot %r error', filename)
+		with ignore_exceptions(OSError):
+			os.unlink(tmp_filename)
+	finally:
+		with ignore_exceptions(OSError):
+			os.unlink(snapshot)
+
+
+def is_snapshot_backup(filename):
+	""" Check if filename is database snapshot backup. """
+	return filename.endswith(_SNAPSHOT_EXT)
+
+
+def restore_snapshot(filename, db_filename):
+	""" Replace database file by snapshot from backup.
+
+	Must be called before connecting to database. Current database is
+	renamed to <db_filename>.old.
+
+	Args:
+		filename: backup file (created by `create_backup`)
+		db_filename: database file
+
+	Raises:
+		BackupError when backup is invalid.
+	"""
+	_LOG.info('restore_snapshot %r -> %r', filename, db_filename)
+	tmp_filename = db_filename + '.restore'
+	try:
+		with zipfile.ZipFile(filename, 'r') as zfile:
+			zinfo = zfile.infolist()[0]
+			with zfile.open(zinfo) as ifile, open(tmp_filename, 'wb') as ofile:
+				shutil.copyfileobj(ifile, ofile)
+		conn = sqlite3.connect(tmp_filename)
+		try:
+			check = conn.execute("PRAGMA quick_check").fetchone()[0]
+		finally:
+			conn.close()
+		if check != 'ok':
+			raise BackupError(_("Invalid database in backup: %s") % check)
+	except (IOError, IndexError, zipfile.BadZipfile, sqlite3.Error) as err:
+		with ignore_exceptions(OSError):
+			os.unlink(tmp_filename)
+		raise BackupError(err)
+	except BackupError:
+		with ignore_exceptions(OSError):
+			os.unlink(tmp_filename)
+		raise
+	# keep current database; journal files belongs to it
+	for suffix in ('', '-journal', '-wal', '-shm'):
+		if os.path.isfile(db_filename + suffix):
+			old = db_filename + '.old' + suffix
+			with ignore_exceptions(OSError):
+				os.unlink(old)
+			os.rename(db_filename + suffix, old)
+	os.rename(tmp_filename, db_filename)
+	_LOG.info('restore_snapshot: COMPLETED')
+
+
 def _sync_file_check(filename):
 	directory = os.path.dirname(filename)
 	if not os.path.isdir(directory):
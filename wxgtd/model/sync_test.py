@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=R0904, C0103
+""" Tests for sync module.
+"""
+
+__author__ = "Karol Będkowski"
+__copyright__ = "Copyright (c) Karol Będkowski, 2013"
+__version__ = "2013-06-02"
+
+import os
+import json
+import time
+import datetime
+import shutil
+import tempfile
+import zipfile
+import threading
+from unittest import main, TestCase
+
+from . import db
+from . import objects as OBJ
+from . import sync
+from . import exporter
+
+
+class TestSync(TestCase):
+
+	def setUp(self):
+		self.tmpdir = tempfile.mkdtemp()
+		db.connect(os.path.join(self.tmpdir, 'wxgtd.db'))
+		self.session = OBJ.Session()
+
+	def tearDown(self):
+		self.session.close()
+		shutil.rmtree(self.tmpdir)
+
+	def _journal(self):
+		return self.session.execute("select tbl, uuid, op from sync_journal "
+				"order by id").fetchall()
+
+	def test_journal(self):
+		# new journal require full sync
+		self.assertEqual(self._journal(), [('*', '*', 'F')])
+		sync.clear_journal(0, sync.get_journal_last_id())
+		self.assertEqual(sync.get_journal_last_id(), 0)
+		task = OBJ.Task(uuid='t1', title='task')
+		self.session.add(task)
+		self.session.add(OBJ.Tag(uuid='g1', title='tag'))
+		self.session.add(OBJ.TaskTag(task_uuid='t1', tag_uuid='g1'))
+		self.session.commit()
+		task.title = 'task 2'
+		self.session.commit()
+		self.assertEqual(self._journal(), [('tags', 'g1', 'I'),
+				('task_tags', 't1/g1', 'I'), ('tasks', 't1', 'U')])
+		last_id = sync.get_journal_last_id()
+		self.session.delete(task)
+		self.session.commit()
+		sync.clear_journal(0, last_id)
+		self.assertEqual(self._journal(), [('task_tags', 't1/g1', 'D'),
+				('tasks', 't1', 'D')])
+
+	def test_write_during_sync(self):
+		started, finish = threading.Event(), threading.Event()
+		errors = []
+
+		def run_sync():
+			with OBJ.WRITE_LOCK:
+				session = OBJ.Session()
+				try:
+					session.add(OBJ.Task(uuid='sync', title='sync'))
+					session.flush()
+					started.set()
+					finish.wait(5)
+					session.commit()
+				except Exception as err:  # pylint: disable=W0703
+					errors.append(err)
+				finally:
+					session.close()
+
+		# gui change made before sync started is committed without waiting
+		self.session.add(OBJ.Task(uuid='gui1', title='gui'))
+		self.session.flush()
+		sync_thread = threading.Thread(target=run_sync)
+		sync_thread.start()
+		start = time.time()
+		self.session.commit()
+		self.assertLess(time.time() - start, 1)
+		started.wait(5)
+		# gui can't flush new changes while sync is running
+		self.session.add(OBJ.Task(uuid='gui2', title='gui'))
+		start = time.time()
+		self.assertRaises(OBJ.SyncRunningError, self.session.flush)
+		self.assertLess(time.time() - start, 1)
+		finish.set()
+		sync_thread.join(5)
+		self.assertEqual(errors, [])
+		# after sync
+		self.session.commit()
+		self.assertEqual(sorted(task.uuid for task
+				in self.session.query(OBJ.Task)), ['gui1', 'gui2', 'sync'])
+
+	def test_fingerprint(self):
+		filename = os.path.join(self.tmpdir, 'sync.json')
+		self.assertEqual(sync.file_fingerprint(filename), None)
+		with open(filename, 'w') as ofile:
+			ofile.write('{}')
+		fingerprint = sync.file_fingerprint(filename)
+		sync.store_fingerprint(sync.CONF_FINGERPRINT, fingerprint)
+		stored = sync.get_fingerprint(sync.CONF_FINGERPRINT)
+		self.assertEqual(stored, fingerprint)
+		self.assertTrue(sync.is_same_fingerprint(
+				sync.file_fingerprint(filename, stored), stored))
+		# the same content, other mtime
+		os.utime(filename, (0, 0))
+		self.assertTrue(sync.is_same_fingerprint(
+				sync.file_fingerprint(filename, stored), stored))
+		with open(filename, 'w') as ofile:
+			ofile.write('[]')
+		self.assertFalse(sync.is_same_fingerprint(
+				sync.file_fingerprint(filename, stored), stored))
+		self.assertFalse(sync.is_same_fingerprint(None, stored))
+
+	def test_file_changed_before_lock(self):
+		session = self.session
+		# version of sync file written by other device
+		remote_filename = os.path.join(self.tmpdir, 'remote.zip')
+		session.add(OBJ.Task(uuid='remote', title='remote'))
+		session.commit()
+		exporter.save_to_file(remote_filename, internal_fname='sync.json')
+		with zipfile.ZipFile(remote_filename) as zfile:
+			data = json.loads(zfile.read('sync.json'))
+		data['syncLog'] = [{'deviceId': 'other', 'prevSyncTime': '',
+				'syncTime': exporter.fmt_date(datetime.datetime.utcnow())}]
+		with zipfile.ZipFile(remote_filename, 'w') as zfile:
+			zfile.writestr('sync.json', json.dumps(data))
+		session.delete(OBJ.Task.get(session, uuid='remote'))
+		session.commit()
+		# last sync
+		os.mkdir(os.path.join(self.tmpdir, 'sync'))
+		filename = os.path.join(self.tmpdir, 'sync', 'GTD_SYNC.zip')
+		exporter.save_to_file(filename)
+		sync.store_fingerprint(sync.CONF_FINGERPRINT,
+				sync.file_fingerprint(filename))
+		sync.clear_journal(0, sync.get_journal_last_id())
+		# local change
+		session.add(OBJ.Task(uuid='local', title='local'))
+		session.commit()
+		session.close()
+
+		create_sync_lock = exporter.create_sync_lock
+
+		def change_and_lock(sync_filename):
+			shutil.copy(remote_filename, sync_filename)
+			return create_sync_lock(sync_filename)
+
+		orig_create_backup = sync.create_backup
+		sync.create_backup = lambda: None
+		exporter.create_sync_lock = change_and_lock
+		try:
+			sync.sync(filename, notify_cb=lambda *_args: None)
+		finally:
+			exporter.create_sync_lock = create_sync_lock
+			sync.create_backup = orig_create_backup
+		self.assertNotEqual(OBJ.Task.get(session, uuid='remote'), None)
+		with zipfile.ZipFile(filename) as zfile:
+			data = json.loads(zfile.read(zfile.namelist()[0]))
+		self.assertEqual(sorted(task['uuid'] for task in data['task']),
+				['local', 'remote'])
+
+	def test_snapshot(self):
+		self.session.add(OBJ.Task(uuid='t1', title='task'))
+		self.session.commit()
+		filename = os.path.join(self.tmpdir, 'BACKUP.db.zip')
+		sync._create_snapshot(filename).join()
+		self.assertTrue(sync.is_snapshot_backup(filename))
+		self.assertEqual(os.listdir(self.tmpdir).count('BACKUP.db.tmp'), 0)
+		self.session.query(OBJ.Task).delete()
+		self.session.commit()
+		self.session.close()
+		db_filename = os.path.join(self.tmpdir, 'restored.db')
+		sync.restore_snapshot(filename, db_filename)
+		db.connect(db_filename)
+		self.session = OBJ.Session()
+		self.assertEqual(OBJ.Task.get(self.session, uuid='t1').title, 'task')
+		self.assertRaises(sync.BackupError, sync.restore_snapshot,
+				db_filename, db_filename)
+		self.assertTrue(os.path.isfile(db_filename))
+
+
+if __name__ == '__main__':
+	main()
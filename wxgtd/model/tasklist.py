@@ -0,0 +1,218 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+""" Lightweight tasks data for displaying lists.
+
+Loading full Task objects and accessing its relations (context, folder, goal,
+tags, parent) when drawing list cause many small queries.  Functions in this
+module load all data required to show task on list in few queries.
+
+Copyright (c) Karol Będkowski, 2013
+
+This file is part of wxGTD
+Licence: GPLv2+
+"""
+__author__ = "Karol Będkowski"
+__copyright__ = "Copyright (c) Karol Będkowski, 2013"
+__version__ = "2013-06-02"
+
+import logging
+import datetime
+
+from sqlalchemy import func
+
+from wxgtd.model import objects as OBJ
+from wxgtd.model import enums
+from wxgtd.model import hierarchy
+
+_LOG = logging.getLogger(__name__)
+
+
+class TaskListItem(object):
+	""" Task data required to show it on list.
+
+	Attributes have the same names as in Task; additional:
+		has_note: task has not empty note
+		context_title, folder_title, goal_title: titles of related objects
+		parent_path: titles of all parents joined by "/"
+		tags: list of tags titles
+		child_count, active_child_count, child_overdue: number of subtasks
+	"""
+	# pylint: disable=R0903
+
+	__slots__ = ('uuid', 'parent_uuid', 'type', 'title', 'has_note',
+			'completed', 'priority', 'importance', 'starred', 'status',
+			'due_date', 'due_date_project', 'due_time_set', 'alarm',
+			'repeat_pattern', 'modified', 'context_title', 'folder_title',
+			'goal_title', 'parent_path', 'tags', 'child_count',
+			'active_child_count', 'child_overdue')
+
+	def __init__(self, **kwargs):
+		for key in self.__slots__:
+			setattr(self, key, kwargs.get(key))
+		self.tags = self.tags or []
+		self.child_count = self.child_count or 0
+		self.active_child_count = self.active_child_count or 0
+		self.child_overdue = self.child_overdue or 0
+
+	def __repr__(self):
+		return '<TaskListItem %s %r>' % (self.uuid, self.title)
+
+	@property
+	def overdue(self):
+		""" Is task overdue. """
+		if self.completed:
+			return False
+		now = datetime.datetime.utcnow()
+		if self.type == enums.TYPE_PROJECT:
+			return bool(self.due_date_project and self.due_date_project < now)
+		return bool(self.due_date and self.due_date < now)
+
+
+_COLUMNS = (
+		('uuid', OBJ.Task.uuid),
+		('parent_uuid', OBJ.Task.parent_uuid),
+		('type', OBJ.Task.type),
+		('title', OBJ.Task.title),
+		('has_note', func.coalesce(func.length(OBJ.Task.note), 0) > 0),
+		('completed', OBJ.Task.completed),
+		('priority', OBJ.Task.priority),
+		('importance', OBJ.Task.importance),
+		('starred', OBJ.Task.starred),
+		('status', OBJ.Task.status),
+		('due_date', OBJ.Task.due_date),
+		('due_date_project', OBJ.Task.due_date_project),
+		('due_time_set', OBJ.Task.due_time_set),
+		('alarm', OBJ.Task.alarm),
+		('repeat_pattern', OBJ.Task.repeat_pattern),
+		('modified', OBJ.Task.modified),
+		('context_title', OBJ.Context.title),
+		('folder_title', OBJ.Folder.title),
+		('goal_title', OBJ.Goal.title),
+)
+
+
+def load_items(query, session=None):
+	""" Load data for tasks selected by query.
+
+	Args:
+		query: sqlalchemy query for Task objects (i.e. result of
+			Task.select_by_filters or Task.search)
+		session: optional sqlalchemy session
+
+	Returns:
+		List of TaskListItem in query order.
+	"""
+	session = session or OBJ.Session()
+	names = [name for name, _col in _COLUMNS]
+	query = (query.with_entities(*[col for _name, col in _COLUMNS])
+			.outerjoin(OBJ.Context, OBJ.Task.context_uuid == OBJ.Context.uuid)
+			.outerjoin(OBJ.Folder, OBJ.Task.folder_uuid == OBJ.Folder.uuid)
+			.outerjoin(OBJ.Goal, OBJ.Task.goal_uuid == OBJ.Goal.uuid))
+	items = [TaskListItem(**dict(zip(names, row)))  # pylint: disable=W0142
+			for row in query]
+	_fill_related(items, session)
+	return items
+
+
+def load_items_by_uuids(uuids, session=None):
+	""" Load data for tasks with given uuids.
+
+	Args:
+		uuids: list of tasks uuid
+		session: optional sqlalchemy session
+
+	Returns:
+		List of TaskListItem in order of uuids; not existing tasks are
+		skipped.
+	"""
+	session = session or OBJ.Session()
+	uuids = list(uuids)
+	items = {}
+	for idx in xrange(0, len(uuids), OBJ.MAX_IN_VALUES):
+		query = session.query(OBJ.Task).filter(OBJ.Task.uuid.in_(
+				uuids[idx:idx + OBJ.MAX_IN_VALUES]))
+		for item in load_items(query, session):
+			items[item.uuid] = item
+	return [items[uuid] for uuid in uuids if uuid in items]
+
+
+def load_item(uuid, session=None):
+	""" Load data for one task; return None if task not exists. """
+	items = load_items_by_uuids([uuid], session)
+	return items[0] if items else None
+
+
+def find_affected_uuids(uuids, session=None):
+	""" Find tasks which items depend on given tasks.
+
+	Items show children counters and path of parents, so when task is
+	changed, items of its parent and all its descendants must be reloaded.
+
+	Args:
+		uuids: list of changed tasks uuid
+		session: optional sqlalchemy session
+
+	Returns:
+		Set of uuids: given tasks, their (current) parents and descendants.
+	"""
+	session = session or OBJ.Session()
+	uuids = list(uuids)
+	result = set(uuids)
+	for idx in xrange(0, len(uuids), OBJ.MAX_IN_VALUES):
+		chunk = uuids[idx:idx + OBJ.MAX_IN_VALUES]
+		result.update(parent_uuid for parent_uuid,
+				in session.query(OBJ.Task.parent_uuid)
+				.filter(OBJ.Task.uuid.in_(chunk)) if parent_uuid)
+		# only tasks with children have descendants
+		for uuid, in session.query(OBJ.Task.parent_uuid).filter(
+				OBJ.Task.parent_uuid.in_(chunk)).distinct():
+			result.update(sub_uuid for sub_uuid, _parent
+					in hierarchy.subtree(uuid, session))
+	return result
+
+
+def _fill_related(items, session):
+	""" Load tags, parents and subtasks counters for items. """
+	if not items:
+		return
+	uuids = [item.uuid for item in items]
+	tags = _load_tags(uuids, session)
+	child_counts = OBJ.Task.select_child_counts(uuids, session)
+	parent_paths = _load_parent_paths(set(item.parent_uuid for item in items
+			if item.parent_uuid), session)
+	for item in items:
+		item.tags = tags.get(item.uuid, [])
+		item.active_child_count, item.child_count, item.child_overdue = \
+				child_counts.get(item.uuid, (0, 0, 0))
+		if item.parent_uuid:
+			item.parent_path = parent_paths.get(item.parent_uuid)
+
+
+def _load_tags(uuids, session):
+	""" Load tags titles for tasks.
+
+	Returns:
+		Dict task uuid -> list of tags titles.
+	"""
+	result = {}
+	for idx in xrange(0, len(uuids), OBJ.MAX_IN_VALUES):
+		query = (session.query(OBJ.TaskTag.task_uuid, OBJ.Tag.title)
+				.join(OBJ.Tag, OBJ.TaskTag.tag_uuid == OBJ.Tag.uuid)
+				.filter(OBJ.TaskTag.task_uuid.in_(
+					uuids[idx:idx + OBJ.MAX_IN_VALUES]))
+				.order_by(OBJ.Tag.title))
+		for task_uuid, title in query:
+			result.setdefault(task_uuid, []).append(title)
+	return result
+
+
+def _load_parent_paths(parents_uuids, session):
+	""" Build paths for given parent tasks.
+
+	Returns:
+		Dict parent uuid -> path (titles of parent and all its parents
+		separated by "/").
+	"""
+	return dict((uuid, '/'.join(title or '' for _uuid, title in path))
+			for uuid, path in hierarchy.ancestors(parents_uuids, session,
+				include_self=True).iteritems())
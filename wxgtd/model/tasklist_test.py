@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=R0904, C0103
+""" Tests for tasklist module.
+"""
+
+__author__ = "Karol Będkowski"
+__copyright__ = "Copyright (c) Karol Będkowski, 2013"
+__version__ = "2013-06-02"
+
+from unittest import main, TestCase
+
+from . import db
+from . import objects as OBJ
+from . import queries
+from . import tasklist
+
+
+class TestLoadItems(TestCase):
+
+	def setUp(self):
+		db.connect(':memory:')
+		self.session = session = OBJ.Session()
+		context = OBJ.Context(title='@home')
+		goal = OBJ.Goal(title='goal')
+		tag1, tag2 = OBJ.Tag(title='tag1'), OBJ.Tag(title='tag2')
+		session.add_all([context, goal, tag1, tag2])
+		session.flush()
+		project = OBJ.Task(title='project')
+		session.add(project)
+		session.flush()
+		sub = OBJ.Task(title='sub', parent_uuid=project.uuid)
+		session.add(sub)
+		session.flush()
+		task = OBJ.Task(title='task', parent_uuid=sub.uuid, note='note',
+				context_uuid=context.uuid, goal_uuid=goal.uuid)
+		task.task_tags.append(OBJ.TaskTag(tag=tag2))
+		task.task_tags.append(OBJ.TaskTag(tag=tag1))
+		session.add(task)
+		session.commit()
+		self.project, self.sub, self.task = project, sub, task
+
+	def tearDown(self):
+		self.session.close()
+
+	def test_load_items(self):
+		params = queries.build_query_params(queries.QUERY_ALL_TASK,
+				queries.OPT_SHOW_SUBTASKS, None, '')
+		items = tasklist.load_items(OBJ.Task.select_by_filters(params,
+			self.session), self.session)
+		self.assertEqual([item.title for item in items],
+				['project', 'sub', 'task'])
+		project, sub, task = items
+		self.assertEqual(task.context_title, '@home')
+		self.assertEqual(task.goal_title, 'goal')
+		self.assertEqual(task.folder_title, None)
+		self.assertEqual(task.tags, ['tag1', 'tag2'])
+		self.assertTrue(task.has_note)
+		self.assertEqual(task.parent_path, 'project/sub')
+		self.assertEqual(sub.parent_path, 'project')
+		self.assertEqual(project.parent_path, None)
+		self.assertEqual((project.child_count, sub.child_count,
+			task.child_count), (1, 1, 0))
+		self.assertFalse(project.has_note)
+
+	def test_load_items_by_uuids(self):
+		items = tasklist.load_items_by_uuids([self.task.uuid, 'missing',
+			self.project.uuid], self.session)
+		self.assertEqual([item.uuid for item in items],
+				[self.task.uuid, self.project.uuid])
+		self.assertEqual(tasklist.load_item('missing', self.session), None)
+
+	def test_find_affected_uuids(self):
+		items = dict((item.uuid, item) for item in tasklist.load_items(
+				self.session.query(OBJ.Task), self.session))
+		self.project.title = 'renamed'
+		self.session.commit()
+		affected = tasklist.find_affected_uuids([self.project.uuid],
+				self.session)
+		self.assertEqual(affected, set([self.project.uuid, self.sub.uuid,
+				self.task.uuid]))
+		self.assertEqual(tasklist.find_affected_uuids([self.sub.uuid],
+				self.session), affected)
+		for item in tasklist.load_items_by_uuids(affected, self.session):
+			items[item.uuid] = item
+		self.assertEqual(items[self.task.uuid].parent_path, 'renamed/sub')
+		self.assertEqual(items[self.sub.uuid].parent_path, 'renamed')
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,106 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+""" Coalescing refresh requests.
+
+Copyright (c) Karol Będkowski, 2013
+
+This file is part of wxGTD
+Licence: GPLv2+
+"""
+
+__author__ = "Karol Będkowski"
+__copyright__ = "Copyright (c) Karol Będkowski, 2013"
+__version__ = "2013-06-02"
+
+import logging
+
+import wx
+
+from wxgtd.lib.singleton import Singleton
+
+_LOG = logging.getLogger(__name__)
+
+
+class RefreshScheduler(Singleton):
+	""" Collect refresh requests for views and run each view refresh once.
+
+	Requests are collected for `delay` ms from first request; then for each
+	view its callback is called once with all invalidated items (or None
+	when whole view should be refreshed).
+
+	Usage:
+		RefreshScheduler().request(self, self._refresh, task_uuid)
+	"""
+	# pylint: disable=W0201
+
+	def _init(self, delay=50):
+		self.delay = delay
+		self._pending = {}  # view -> [callback, set of items or None]
+		self._timer = None
+		# callback name -> [number of requests, number of refreshes]
+		self._stats = {}
+
+	def request(self, view, callback, items=None):
+		""" Request refresh of view.
+
+		Args:
+			view: view (key) to refresh
+			callback: function called with set of invalidated items or None
+			items: list of invalidated items; None = refresh whole view
+		"""
+		stats = self._stats.setdefault(_callback_name(callback), [0, 0])
+		stats[0] += 1
+		pending = self._pending.get(view)
+		if pending is None:
+			pending = self._pending[view] = [callback, set()]
+		pending[0] = callback
+		if items is None:
+			pending[1] = None
+		elif pending[1] is not None:
+			pending[1].update(items)
+		if self._timer is None:
+			if self.delay:
+				self._timer = wx.CallLater(self.delay, self._run)
+			else:
+				self._timer = True
+				wx.CallAfter(self._run)
+
+	def cancel(self, view):
+		""" Remove pending requests for view (i.e. when it is closed). """
+		self._pending.pop(view, None)
+
+	def flush(self):
+		""" Run all pending refreshes now. """
+		if self._timer not in (None, True):
+			self._timer.Stop()
+		self._run()
+
+	@property
+	def stats(self):
+		""" Get statistics.
+
+		Returns:
+			Dict callback name -> (number of requests, number of refreshes,
+			number of suppressed refreshes)
+		"""
+		return dict((name, (requests, runs, requests - runs))
+				for name, (requests, runs) in self._stats.iteritems())
+
+	def _run(self):
+		self._timer = None
+		pending, self._pending = self._pending, {}
+		for callback, items in pending.itervalues():
+			self._stats[_callback_name(callback)][1] += 1
+			try:
+				callback(items)
+			except Exception:  # pylint: disable=W0703
+				_LOG.exception('RefreshScheduler: %r failed',
+						_callback_name(callback))
+		_LOG.debug('RefreshScheduler stats: %r', self.stats)
+
+
+def _callback_name(callback):
+	obj = getattr(callback, 'im_self', None)
+	if obj is not None:
+		return obj.__class__.__name__ + '.' + callback.__name__
+	return callback.__name__
@@ -0,0 +1,109 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+""" Running long jobs in background thread.
+
+Copyright (c) Karol Będkowski, 2013
+
+This file is part of wxGTD
+Licence: GPLv2+
+"""
+
+__author__ = "Karol Będkowski"
+__copyright__ = "Copyright (c) Karol Będkowski, 2013"
+__version__ = "2013-06-02"
+
+import logging
+import threading
+import Queue
+
+import wx
+
+_LOG = logging.getLogger(__name__)
+
+
+class BackgroundWorker(object):
+	""" Run jobs in background thread and return results to gui thread.
+
+	Only result of last submitted job is delivered; submitting new job
+	cancels all previous (not started jobs are skipped, results of running
+	ones are dropped).
+
+	Callbacks are called in gui thread (by wx.CallAfter).
+
+	Args:
+		name: name of worker (for logging)
+		on_busy: optional function called (in gui thread) with True when
+			worker starts processing and False when finish.
+		on_error: optional function called (in gui thread) with exception
+			raised by last submitted job.
+	"""
+
+	def __init__(self, name, on_busy=None, on_error=None):
+		self._name = name
+		self._on_busy = on_busy
+		self._on_error = on_error
+		self._queue = Queue.Queue()
+		self._generation = 0
+		self._lock = threading.Lock()
+		self._thread = None
+		self.busy = False
+
+	def submit(self, func, callback, *args, **kwargs):
+		""" Run `func(*args, **kwargs)` in background thread.
+
+		Args:
+			func: function to call; must not use any gui objects nor
+				objects bound to sessions used in gui thread.
+			callback: function called in gui thread with func result.
+		"""
+		with self._lock:
+			self._generation += 1
+			generation = self._generation
+		if self._thread is None:
+			self._thread = threading.Thread(target=self._run,
+					name=self._name)
+			self._thread.daemon = True
+			self._thread.start()
+		self._set_busy(True)
+		self._queue.put((generation, func, callback, args, kwargs))
+
+	def cancel(self):
+		""" Cancel all submitted jobs. """
+		with self._lock:
+			self._generation += 1
+		self._set_busy(False)
+
+	def _is_current(self, generation):
+		with self._lock:
+			return generation == self._generation
+
+	def _set_busy(self, busy):
+		if busy != self.busy:
+			self.busy = busy
+			if self._on_busy:
+				self._on_busy(busy)
+
+	def _run(self):
+		while True:
+			generation, func, callback, args, kwargs = self._queue.get()
+			if not self._is_current(generation):
+				_LOG.debug('BackgroundWorker %s: skip job %d', self._name,
+						generation)
+				continue
+			try:
+				result = func(*args, **kwargs)
+			except Exception as err:  # pylint: disable=W0703
+				_LOG.exception('BackgroundWorker %s: job %d failed',
+						self._name, generation)
+				wx.CallAfter(self._finish, generation, self._on_error, err)
+				continue
+			wx.CallAfter(self._finish, generation, callback, result)
+
+	def _finish(self, generation, callback, result):
+		if not self._is_current(generation):
+			_LOG.debug('BackgroundWorker %s: drop result of job %d',
+					self._name, generation)
+			return
+		self._set_busy(False)
+		if callback is not None:
+			callback(result)